@@ -1,13 +1,81 @@
 # Importações necessárias para Streamlit, OpenCV e processamento de imagem
+import os
+import hashlib
+import threading
 import streamlit as st
 import cv2
 import numpy as np
 from PIL import Image
-from yolo_inference import build_detector_from_env
+from yolo_inference import YoloDetector, resolve_detector_config
+from yolo_metrics import DetectorMetrics, STAGES
+from yolo_tracker import TrackingDetector
 
 # Configuração inicial da página do Streamlit (Título e Layout)
 st.set_page_config(page_title="YOLO Detection - Streamlit", layout="wide", page_icon="🚗")
 
+def render_metrics(placeholder, metrics: DetectorMetrics):
+    """
+    Exibe FPS, tempos médios/p95 por estágio e contagens do último frame no placeholder da sidebar.
+    """
+    snap = metrics.snapshot()
+    lines = [f"**FPS:** {snap['fps']:.1f}"]
+    for stage in STAGES:
+        st_stage = snap["stages"].get(stage)
+        if st_stage is not None:
+            lines.append(f"- `{stage}`: {st_stage['mean_ms']:.1f} ms (p95 {st_stage['p95_ms']:.1f})")
+    last = snap["last"]
+    if "candidates" in last:
+        lines.append(f"- candidatos antes do NMS: {int(last['candidates'])} | detecções: {int(last.get('detections', 0))}")
+    placeholder.markdown("\n".join(lines))
+
+
+@st.cache_resource(show_spinner="Carregando modelo YOLO...")
+def load_detector(cfg_path: str, weights_path: str, names_path: str, use_gpu: bool, model_mtime: float,
+                  backend: str = "opencv", onnx_path=None):
+    """
+    Carrega a rede uma única vez por processo, compartilhada entre reruns e sessões.
+    A chave do cache são os caminhos do modelo, o backend e o mtime dos arquivos (recarrega se mudarem).
+    Retorna o detector e um lock: o cv2.dnn_Net não é seguro para forwards concorrentes.
+    """
+    detector = YoloDetector(cfg_path=cfg_path, weights_path=weights_path, names_path=names_path, use_gpu=use_gpu,
+                            backend=backend, onnx_path=onnx_path)
+    # Forward de aquecimento: a primeira detecção da sessão não paga a inicialização da rede
+    detector.warmup()
+    return detector, threading.Lock()
+
+
+def run_detection(detector, lock, frame, conf_threshold, nms_threshold, instrumentation=None, is_rgb=False):
+    """
+    Executa a detecção na instância compartilhada aplicando os thresholds desta sessão.
+    is_rgb=True aceita o frame em RGB (PIL) sem conversão de cor.
+    """
+    with lock:
+        detector.conf_threshold = conf_threshold
+        detector.nms_threshold = nms_threshold
+        detector.instrumentation = instrumentation
+        return detector.detect(frame, is_rgb=is_rgb)
+
+
+def draw_detections(detector, lock, frame, detections, instrumentation=None):
+    """
+    Desenha as detecções in-place no frame (BGR ou RGB: as cores do desenho são simétricas);
+    o lock garante que a instrumentação usada é a desta sessão.
+    """
+    with lock:
+        detector.instrumentation = instrumentation
+        return detector.draw(frame, detections, in_place=True)
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def detect_image_cached(image_hash, model_key, conf_threshold, nms_threshold,
+                        _detector, _lock, _frame_rgb, _instrumentation=None):
+    """
+    Memoiza o resultado por hash do conteúdo da imagem (+ modelo e thresholds), com LRU limitado.
+    Argumentos com prefixo "_" não entram na chave do cache do Streamlit.
+    """
+    return run_detection(_detector, _lock, _frame_rgb, conf_threshold, nms_threshold, _instrumentation, is_rgb=True)
+
+
 def main():
     """
     Função principal que gerencia a interface Streamlit.
@@ -26,17 +94,35 @@ def main():
     nms_threshold = st.sidebar.slider("NMS Threshold", 0.0, 1.0, 0.4, 0.05,
                                     help="Limiar para supressão de não-máximos (remove bboxes sobrepostas).")
     
+    # Métricas do detector (FPS e tempos por estágio); desligado não adiciona custo ao hot path
+    show_metrics = st.sidebar.checkbox("📊 Mostrar métricas do detector", value=False)
+
     st.sidebar.markdown("---")
     # Seleção do modo de operação
     mode = st.sidebar.radio("📡 Escolha o Modo de Entrada", ["Imagem", "Câmera (Real-time)"])
 
     # Inicializa o detector YOLO
-    # A função build_detector_from_env gerencia o download automático dos pesos se necessário.
+    # resolve_detector_config gerencia o download automático dos pesos se necessário;
+    # a rede é carregada uma vez por processo (cache) e reruns só ajustam os thresholds.
     try:
-        detector = build_detector_from_env(conf_threshold=conf_threshold, nms_threshold=nms_threshold)
+        config = resolve_detector_config(conf_threshold=conf_threshold, nms_threshold=nms_threshold)
+        model_mtime = max(os.path.getmtime(config[k]) for k in ("cfg_path", "weights_path", "names_path"))
+        detector, detector_lock = load_detector(config["cfg_path"], config["weights_path"], config["names_path"],
+                                                config["use_gpu"], model_mtime, config["backend"], config["onnx_path"])
     except Exception as e:
         st.error(f"❌ Erro ao inicializar detector: {e}")
         return
+    conf_threshold = config["conf_threshold"]
+    nms_threshold = config["nms_threshold"]
+    model_key = f"{config['cfg_path']}|{config['weights_path']}|{config['use_gpu']}|{config['backend']}|{model_mtime}"
+
+    # O coletor fica na sessão para acumular histórico entre reruns do Streamlit
+    metrics_placeholder = st.sidebar.empty()
+    metrics = None
+    if show_metrics:
+        if "detector_metrics" not in st.session_state:
+            st.session_state["detector_metrics"] = DetectorMetrics()
+        metrics = st.session_state["detector_metrics"]
 
     # Lista de classes do dataset personalizado para monitoramento especial
     CUSTOM_CLASSES = {"car", "truck", "bus", "motorbike", "bicycle", "van", "threewheel"}
@@ -46,16 +132,17 @@ def main():
         uploaded_file = st.file_uploader("Arraste ou selecione uma imagem...", type=["jpg", "jpeg", "png"])
 
         if uploaded_file is not None:
-            # Converte o arquivo carregado (BytesIO) para uma imagem PIL e depois para array numpy
+            # Hash do conteúdo para memoizar a detecção entre reruns (ex.: mudança em outro widget)
+            image_hash = hashlib.sha1(uploaded_file.getvalue()).hexdigest()
+            # Converte o arquivo carregado (BytesIO) para uma imagem PIL e depois para array numpy.
+            # A rede espera RGB, então o array do PIL vai direto para o detector (sem ida e volta BGR).
             image = Image.open(uploaded_file)
-            image_np = np.array(image)
-            
-            # Streamlit/PIL trabalham em RGB, mas o detector OpenCV espera BGR
-            frame_bgr = cv2.cvtColor(image_np, cv2.COLOR_RGB2BGR)
+            frame_rgb = np.array(image if image.mode == "RGB" else image.convert("RGB"))
 
             # Realiza a detecção de objetos
             with st.spinner('Processando imagem...'):
-                detections = detector.detect(frame_bgr)
+                detections = detect_image_cached(image_hash, model_key, conf_threshold, nms_threshold,
+                                                 detector, detector_lock, frame_rgb, metrics)
             
             # Filtra e exibe classes encontradas que pertencem ao dataset customizado
             hits = sorted({d['class_name'] for d in detections if d['class_name'] in CUSTOM_CLASSES})
@@ -67,12 +154,13 @@ def main():
                 st.image(image, caption="Imagem Original", use_column_width=True)
             
             with col2:
-                # Desenha os retângulos e labels no frame BGR
-                result_bgr = detector.draw(frame_bgr, detections)
-                # Converte de volta para RGB para exibição correta no Streamlit
-                result_rgb = cv2.cvtColor(result_bgr, cv2.COLOR_BGR2RGB)
+                # Desenha os retângulos e labels direto no array RGB (cópia própria, já exibível)
+                result_rgb = draw_detections(detector, detector_lock, frame_rgb, detections, metrics)
                 st.image(result_rgb, caption="Detecções Encontradas", use_column_width=True)
 
+            if metrics is not None:
+                render_metrics(metrics_placeholder, metrics)
+
             # Exibe alertas baseados nas classes detectadas
             if hits:
                 st.success(f"✅ Objetos do dataset detectados: **{', '.join(hits)}**")
@@ -83,6 +171,11 @@ def main():
         st.subheader("🎥 Detecção via Webcam em Tempo Real")
         st.warning("⚠️ Certifique-se de que sua webcam não está sendo usada por outro aplicativo.")
         
+        # Rastreamento: detector completo a cada N frames, boxes propagadas nos intermediários
+        track = st.sidebar.checkbox("🎯 Rastrear objetos (IDs e contagem)", value=False)
+        detect_every = st.sidebar.number_input("Detectar a cada N frames", min_value=1, max_value=30, value=3,
+                                               disabled=not track)
+
         # Checkbox para ligar/desligar o loop da câmera
         run = st.checkbox("Ativar Câmera")
         
@@ -97,6 +190,13 @@ def main():
                 st.error("Não foi possível acessar a câmera. Verifique as permissões.")
                 return
 
+            tracker = None
+            if track:
+                tracker = TrackingDetector(
+                    lambda f: run_detection(detector, detector_lock, f, conf_threshold, nms_threshold, metrics),
+                    detect_every=int(detect_every),
+                )
+
             while run:
                 ret, frame = cap.read()
                 if not ret:
@@ -104,10 +204,13 @@ def main():
                     break
 
                 # Processa o frame atual
-                detections = detector.detect(frame)
+                if tracker is not None:
+                    detections = tracker.process(frame)
+                else:
+                    detections = run_detection(detector, detector_lock, frame, conf_threshold, nms_threshold, metrics)
                 
                 # Renderiza as detecções no frame
-                frame_out = detector.draw(frame, detections)
+                frame_out = draw_detections(detector, detector_lock, frame, detections, metrics)
                 
                 # Adiciona overlay de instrução no frame (estilo solicitado anteriormente)
                 cv2.putText(frame_out, "Desmarque 'Ativar Camera' para sair", (20, 40), 
@@ -115,14 +218,19 @@ def main():
 
                 # Identifica classes do dataset para exibição de status dinâmico
                 hits = sorted({d['class_name'] for d in detections if d['class_name'] in CUSTOM_CLASSES})
-                if hits:
-                    status_placeholder.success(f"Detectado: **{', '.join(hits)}**")
+                counts = tracker.counts() if tracker is not None else {}
+                if hits or counts:
+                    msg = f"Detectado: **{', '.join(hits)}**" if hits else ""
+                    if counts:
+                        msg += "  \nContagem (objetos únicos): " + ", ".join(f"{k}: {v}" for k, v in counts.items())
+                    status_placeholder.success(msg)
                 else:
                     status_placeholder.empty()
 
-                # Conversão BGR -> RGB para o Streamlit renderizar corretamente
-                frame_rgb = cv2.cvtColor(frame_out, cv2.COLOR_BGR2RGB)
-                frame_placeholder.image(frame_rgb, channels="RGB", use_column_width=True)
+                # O Streamlit faz a troca de canais na serialização; sem cvtColor extra aqui
+                frame_placeholder.image(frame_out, channels="BGR", use_column_width=True)
+                if metrics is not None:
+                    render_metrics(metrics_placeholder, metrics)
 
                 # Pequeno delay opcional para sincronia (cv2.waitKey não é necessário aqui para exibição, 
                 # mas ajuda a liberar CPU)
@@ -1,8 +1,11 @@
 import os
 import json
+import time
+import hashlib
 import argparse
 import urllib.request
 import tarfile
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from sklearn.model_selection import train_test_split
 import yaml
@@ -24,6 +27,38 @@ def convert_bbox_to_yolo(size, box):
     h = h * dh
     return (x, y, w, h)
 
+def annotation_to_yolo_lines(data, ann_file):
+    # Converte o JSON de uma anotação Supervisely em linhas YOLO; retorna (linhas, avisos)
+    img_w = data['size']['width']
+    img_h = data['size']['height']
+
+    yolo_annotations = []
+    warnings = []
+    for obj in data['objects']:
+        class_name = obj['classTitle']
+        if class_name in CLASSES:
+            class_id = CLASSES.index(class_name)
+
+            # Coordenadas da bounding box
+            x1 = obj['points']['exterior'][0][0]
+            y1 = obj['points']['exterior'][0][1]
+            x2 = obj['points']['exterior'][1][0]
+            y2 = obj['points']['exterior'][1][1]
+
+            b = (x1, x2, y1, y2) # (x_min, x_max, y_min, y_max)
+            bb = convert_bbox_to_yolo((img_w, img_h), b)
+            yolo_annotations.append(f"{class_id} {bb[0]} {bb[1]} {bb[2]} {bb[3]}")
+        else:
+            warnings.append(f"Aviso: Classe '{class_name}' não encontrada em CLASSES. Pulando anotação em {ann_file}.")
+    return yolo_annotations, warnings
+
+
+def label_path_for(image_dir, ann_file):
+    # '1.jpg.json' -> '<image_dir>/1.txt'
+    image_filename_base = os.path.splitext(ann_file)[0]
+    return os.path.join(image_dir, os.path.splitext(image_filename_base)[0] + '.txt')
+
+
 def process_annotations(image_dir, ann_dir, image_paths_list):
     # Percorre anotações .json, gera .txt no formato YOLO e coleta caminhos de imagem
     for ann_file in os.listdir(ann_dir):
@@ -43,42 +78,146 @@ def process_annotations(image_dir, ann_dir, image_paths_list):
             # Adiciona o caminho da imagem à lista
             image_paths_list.append(os.path.abspath(image_path))
 
-            img_w = data['size']['width']
-            img_h = data['size']['height']
-
-            yolo_annotations = []
-            for obj in data['objects']:
-                class_name = obj['classTitle']
-                if class_name in CLASSES:
-                    class_id = CLASSES.index(class_name)
-                    
-                    # Coordenadas da bounding box
-                    x1 = obj['points']['exterior'][0][0]
-                    y1 = obj['points']['exterior'][0][1]
-                    x2 = obj['points']['exterior'][1][0]
-                    y2 = obj['points']['exterior'][1][1]
-
-                    b = (x1, x2, y1, y2) # (x_min, x_max, y_min, y_max)
-                    bb = convert_bbox_to_yolo((img_w, img_h), b)
-                    yolo_annotations.append(f"{class_id} {bb[0]} {bb[1]} {bb[2]} {bb[3]}")
-                else:
-                    print(f"Aviso: Classe '{class_name}' não encontrada em CLASSES. Pulando anotação em {ann_file}.")
+            yolo_annotations, warnings = annotation_to_yolo_lines(data, ann_file)
+            for w in warnings:
+                print(w)
 
             # Salva as anotações YOLO no mesmo diretório da imagem
-            output_annotation_path = os.path.join(image_dir, os.path.splitext(image_filename_base)[0] + '.txt')
+            output_annotation_path = label_path_for(image_dir, ann_file)
             with open(output_annotation_path, 'w') as f:
                 for line in yolo_annotations:
                     f.write(line + '\n')
 
-def download_dataset_if_needed(base_dir: Path, force_download: bool = False):
+
+def _file_sha1(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _convert_chunk(image_dir, ann_dir, items, manifest_entries):
+    # Worker: converte um lote de anotações, items = [(arquivo .json, imagem existe)] já resolvidos
+    # no processo principal. Pula as que não mudaram desde o último manifest
+    # (mesmo mtime/tamanho, ou mesmo SHA-1 se o mtime mudou) e cujo .txt ainda existe.
+    # Cada .txt é escrito de uma vez (texto completo em um único write).
+    results = []
+    for ann_file, has_image in items:
+        image_filename_base = os.path.splitext(ann_file)[0]
+        image_path = os.path.join(image_dir, image_filename_base)
+        if not has_image:
+            results.append((ann_file, 'missing', None, [f"Aviso: Imagem {image_path} não encontrada. Pulando anotação {ann_file}."], None))
+            continue
+        json_path = os.path.join(ann_dir, ann_file)
+        st = os.stat(json_path)
+        label_path = label_path_for(image_dir, ann_file)
+        prev = manifest_entries.get(ann_file)
+        entry = {'mtime_ns': st.st_mtime_ns, 'size': st.st_size}
+        if prev is not None and os.path.exists(label_path):
+            if prev.get('mtime_ns') == st.st_mtime_ns and prev.get('size') == st.st_size:
+                results.append((ann_file, 'skipped', os.path.abspath(image_path), [], prev))
+                continue
+            if prev.get('size') == st.st_size and prev.get('sha1'):
+                sha1 = _file_sha1(json_path)
+                if sha1 == prev['sha1']:
+                    entry['sha1'] = sha1
+                    results.append((ann_file, 'skipped', os.path.abspath(image_path), [], entry))
+                    continue
+        with open(json_path, 'rb') as f:
+            raw = f.read()
+        data = json.loads(raw)
+        entry['sha1'] = hashlib.sha1(raw).hexdigest()
+        yolo_annotations, warnings = annotation_to_yolo_lines(data, ann_file)
+        with open(label_path, 'w') as f:
+            f.write(''.join(line + '\n' for line in yolo_annotations))
+        results.append((ann_file, 'converted', os.path.abspath(image_path), warnings, entry))
+    return results
+
+
+def default_manifest_path(ann_dir):
+    # Manifest fica ao lado de img/ e ann/ (ex.: train/.yolo_labels_manifest.json)
+    return os.path.join(os.path.dirname(os.path.abspath(ann_dir)), '.yolo_labels_manifest.json')
+
+
+def _load_manifest(path):
+    # Manifest inválido, ausente ou de outra lista de CLASSES força reconversão completa
+    if not path or not os.path.isfile(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get('classes') != CLASSES:
+        return {}
+    return manifest.get('files', {})
+
+
+def _save_manifest(path, files):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'classes': CLASSES, 'files': files}, f)
+    os.replace(tmp_path, path)
+
+
+def process_annotations_parallel(image_dir, ann_dir, image_paths_list, workers=None, manifest_path=None,
+                                 chunk_size=256, progress_every=5000):
+    # Versão paralela/incremental de process_annotations: mesma saída (.txt e ordem de
+    # image_paths_list), mas distribui lotes entre processos e, com manifest, pula anotações inalteradas.
+    start = time.perf_counter()
+    ann_files = [f for f in os.listdir(ann_dir) if f.endswith('.json')]
+    existing_images = set(os.listdir(image_dir)) if os.path.isdir(image_dir) else set()
+    manifest = _load_manifest(manifest_path)
+    # Cada lote leva só as suas anotações com a existência da imagem já resolvida (não o listdir inteiro)
+    items = [(f, os.path.splitext(f)[0] in existing_images) for f in ann_files]
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+    counts = {'converted': 0, 'skipped': 0, 'missing': 0}
+    new_manifest = {}
+    done = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(_convert_chunk, image_dir, ann_dir, chunk,
+                        {f: manifest[f] for f, _ in chunk if f in manifest})
+            for chunk in chunks
+        ]
+        # Consome na ordem de submissão para manter a mesma ordem do modo serial
+        for fut in futures:
+            for ann_file, status, image_path, warnings, entry in fut.result():
+                for w in warnings:
+                    print(w)
+                counts[status] += 1
+                if image_path is not None:
+                    image_paths_list.append(image_path)
+                if entry is not None:
+                    new_manifest[ann_file] = entry
+                done += 1
+                if progress_every and done % progress_every == 0:
+                    elapsed = time.perf_counter() - start
+                    print(f"  {done}/{len(ann_files)} anotações ({done / elapsed:.0f}/s)")
+
+    if manifest_path:
+        _save_manifest(manifest_path, new_manifest)
+    elapsed = time.perf_counter() - start
+    rate = len(ann_files) / elapsed if elapsed > 0 else 0.0
+    print(f"  {len(ann_files)} anotações em {elapsed:.2f}s ({rate:.0f}/s): {counts['converted']} convertidas, "
+          f"{counts['skipped']} inalteradas, {counts['missing']} sem imagem")
+    return counts
+
+DATASET_TAR_NAME = 'vehicle-dataset-for-yolo-DatasetNinja.tar'
+
+
+def download_dataset_if_needed(base_dir: Path, force_download: bool = False, extract: bool = True) -> Path:
     # Baixa o dataset pelo link do README e extrai para o projeto (opcional)
-    tar_name = 'vehicle-dataset-for-yolo-DatasetNinja.tar'
-    tar_path = Path(tar_name)
+    tar_path = Path(DATASET_TAR_NAME)
     if force_download or not tar_path.exists():
         url = ("https://assets.supervisely.com/remote/"
                "eyJsaW5rIjogInMzOi8vc3VwZXJ2aXNlbHktZGF0YXNldHMvMjc4OF9WZWhpY2xlIERhdGFzZXQgZm9yIFlPTE8vdmVoaWNsZS1kYXRhc2V0LWZvci15b2xvLURhdGFzZXROaW5qYS50YXIiLCAic2lnIjogInRtZEFZaXVzQXZPQkNySVc1L1dXZjVicVY0aS9iUVNnOWJaZlFQMlJzWU09In0=?response-content-disposition=attachment%3B%20filename%3D%22vehicle-dataset-for-yolo-DatasetNinja.tar%22")
         print(f"Baixando dataset de {url} ...")
         urllib.request.urlretrieve(url, str(tar_path))
+    if not extract:
+        return tar_path
     # Extrai se necessário
     train_dir = base_dir / 'train'
     valid_dir = base_dir / 'valid'
@@ -88,6 +227,101 @@ def download_dataset_if_needed(base_dir: Path, force_download: bool = False):
             tar.extractall(path=str(base_dir))
     else:
         print("Pastas train/ e valid/ já existem, pulando extração.")
+    return tar_path
+
+
+def _write_label(label_path, yolo_annotations):
+    os.makedirs(os.path.dirname(label_path), exist_ok=True)
+    with open(label_path, 'w') as f:
+        f.write(''.join(line + '\n' for line in yolo_annotations))
+
+
+def _is_within(path, base_dir):
+    # path (já resolvido) fica dentro de base_dir?
+    try:
+        path.relative_to(base_dir)
+        return True
+    except ValueError:
+        return False
+
+
+def stream_convert_tar(tar_path, base_dir, extract_images=True):
+    # Lê o tar uma única vez, em modo streaming, sem extrair tudo para o disco:
+    # - membros '<split>/ann/<img>.json' viram labels YOLO em '<split>/img/<stem>.txt';
+    # - membros '<split>/img/<img>' são extraídos apenas se extract_images=True.
+    # Retorna os caminhos absolutos das imagens que têm anotação (na ordem do tar).
+    base_dir = Path(base_dir)
+    resolved_base = base_dir.resolve()
+    seen_images = set()
+    pending = {}  # anotações cuja imagem ainda não apareceu no stream
+    image_paths = []
+    counts = {'labels': 0, 'images': 0}
+    start = time.perf_counter()
+    extract_kwargs = {'filter': 'data'} if hasattr(tarfile, 'data_filter') else {}
+
+    def accept(image_path, label_path, yolo_annotations):
+        _write_label(label_path, yolo_annotations)
+        image_paths.append(os.path.abspath(image_path))
+        counts['labels'] += 1
+
+    with tarfile.open(str(tar_path), 'r|*') as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            member_name = member.name[2:] if member.name.startswith('./') else member.name
+            parts = member_name.split('/')
+            if len(parts) < 3 or parts[-2] not in ('ann', 'img'):
+                continue
+            # Os caminhos dos labels vêm do nome do membro: recusa nomes absolutos, com '..' ou que
+            # resolvam para fora de base_dir (o filtro 'data' só protege tar.extract)
+            split_dir = base_dir.joinpath(*parts[:-2])
+            if (member_name.startswith('/') or '..' in parts
+                    or not _is_within(split_dir.resolve(), resolved_base)):
+                print(f"Aviso: membro com caminho inseguro no tar ignorado: {member.name}")
+                continue
+            image_dir = split_dir / 'img'
+            name = parts[-1]
+            if parts[-2] == 'ann' and name.endswith('.json'):
+                data = json.load(tar.extractfile(member))
+                yolo_annotations, warnings = annotation_to_yolo_lines(data, name)
+                for w in warnings:
+                    print(w)
+                image_path = image_dir / os.path.splitext(name)[0]
+                label_path = label_path_for(str(image_dir), name)
+                if str(image_path) in seen_images:
+                    accept(image_path, label_path, yolo_annotations)
+                else:
+                    pending[str(image_path)] = (label_path, yolo_annotations)
+            elif parts[-2] == 'img':
+                image_path = str(image_dir / name)
+                seen_images.add(image_path)
+                if extract_images:
+                    tar.extract(member, path=str(base_dir), **extract_kwargs)
+                    counts['images'] += 1
+                if image_path in pending:
+                    label_path, yolo_annotations = pending.pop(image_path)
+                    accept(image_path, label_path, yolo_annotations)
+
+    for image_path in pending:
+        print(f"Aviso: Imagem {image_path} não encontrada no arquivo. Pulando anotação.")
+    elapsed = time.perf_counter() - start
+    print(f"  Stream de {tar_path}: {counts['labels']} labels, {counts['images']} imagens extraídas "
+          f"em {elapsed:.2f}s")
+    return image_paths
+
+
+def write_split_files(base_dir, all_image_paths):
+    # Dividir em treino e validação (80/20) e gravar train.txt/val.txt
+    train_paths, val_paths = train_test_split(all_image_paths, test_size=0.2, random_state=42)
+
+    with open(str(Path(base_dir) / 'train.txt'), 'w') as f:
+        for path in train_paths:
+            f.write(path + '\n')
+
+    with open(str(Path(base_dir) / 'val.txt'), 'w') as f:
+        for path in val_paths:
+            f.write(path + '\n')
+    return train_paths, val_paths
 
 
 def main():
@@ -101,28 +335,41 @@ def main():
 
     parser = argparse.ArgumentParser(description="Preparar dataset em formato YOLO (caminhos relativos)")
     parser.add_argument('--download', action='store_true', help='Baixar e extrair dataset pelo link oficial')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='Processos para a conversão (0 = serial; -1 = nº de CPUs)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Usa manifest (mtime/tamanho/SHA-1) para pular anotações inalteradas (implica modo paralelo)')
+    parser.add_argument('--stream', action='store_true',
+                        help='Converte direto do .tar em uma única passada, sem extrair tudo (usa --tar)')
+    parser.add_argument('--tar', type=str, default=DATASET_TAR_NAME, help='Arquivo .tar do dataset (modo --stream)')
+    parser.add_argument('--labels-only', action='store_true',
+                        help='No modo --stream, gera apenas labels e índices, sem extrair imagens')
     args = parser.parse_args()
 
+    tar_path = Path(args.tar)
     if args.download:
-        download_dataset_if_needed(base_dir)
+        tar_path = download_dataset_if_needed(base_dir, extract=not args.stream)
 
     all_image_paths = []
 
-    print("Processando anotações de treinamento...")
-    process_annotations(str(train_img_dir), str(train_ann_dir), all_image_paths)
-    print("Processando anotações de validação...")
-    process_annotations(str(valid_img_dir), str(valid_ann_dir), all_image_paths)
-
-    # Dividir em treino e validação (80/20)
-    train_paths, val_paths = train_test_split(all_image_paths, test_size=0.2, random_state=42)
-
-    with open(str(base_dir / 'train.txt'), 'w') as f:
-        for path in train_paths:
-            f.write(path + '\n')
+    if args.stream:
+        print(f"Convertendo anotações direto de {tar_path}...")
+        all_image_paths = stream_convert_tar(tar_path, base_dir, extract_images=not args.labels_only)
+    elif args.workers or args.incremental:
+        workers = None if args.workers <= 0 else args.workers
+        for label, img_dir, ann_dir in (("treinamento", train_img_dir, train_ann_dir),
+                                        ("validação", valid_img_dir, valid_ann_dir)):
+            print(f"Processando anotações de {label}...")
+            manifest_path = default_manifest_path(str(ann_dir)) if args.incremental else None
+            process_annotations_parallel(str(img_dir), str(ann_dir), all_image_paths,
+                                         workers=workers, manifest_path=manifest_path)
+    else:
+        print("Processando anotações de treinamento...")
+        process_annotations(str(train_img_dir), str(train_ann_dir), all_image_paths)
+        print("Processando anotações de validação...")
+        process_annotations(str(valid_img_dir), str(valid_ann_dir), all_image_paths)
 
-    with open(str(base_dir / 'val.txt'), 'w') as f:
-        for path in val_paths:
-            f.write(path + '\n')
+    train_paths, val_paths = write_split_files(base_dir, all_image_paths)
 
     print("Dataset preparado com sucesso!")
     print(f"Total de imagens processadas: {len(all_image_paths)}")
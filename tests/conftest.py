@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+# Os módulos do projeto ficam na raiz do repositório (sem pacote instalável)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def tiny_model(tmp_path_factory):
+    # Modelo Darknet minúsculo (cfg, weights, names) com a estrutura de saída do YOLOv3-tiny
+    from yolo_benchmark import write_tiny_darknet_model
+
+    return write_tiny_darknet_model(str(tmp_path_factory.mktemp("modelo")))
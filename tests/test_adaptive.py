@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+
+import yolo_adaptive
+from yolo_adaptive import AdaptiveController, AdaptiveDetector, build_operating_points
+
+
+class _Clock:
+    # Relógio controlado pelo teste (cooldown do controlador)
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = _Clock()
+    monkeypatch.setattr(yolo_adaptive.time, "monotonic", c)
+    return c
+
+
+def _controller(**kwargs):
+    opts = dict(target_ms=30.0, points=build_operating_points([608, 416, 320], max_skip=2), alpha=1.0,
+                patience=3, cooldown_s=2.0, log=None)
+    opts.update(kwargs)
+    return AdaptiveController(**opts)
+
+
+def test_pontos_de_operacao_do_mais_preciso_ao_mais_barato():
+    assert build_operating_points([320, 608, 416, 416], max_skip=2) == \
+        [(608, 0), (416, 0), (320, 0), (320, 1), (320, 2)]
+
+
+def test_desce_so_depois_de_patience_observacoes_acima(clock):
+    ctl = _controller()
+    assert not ctl.observe(40.0)
+    assert not ctl.observe(40.0)
+    assert ctl.observe(40.0)
+    assert ctl.current == (416, 0)
+    # A EWMA é reescalada para o novo tamanho de entrada
+    assert ctl.ewma_ms == pytest.approx(40.0 * (416 / 608) ** 2)
+
+
+def test_pico_isolado_nao_troca(clock):
+    ctl = _controller()
+    for ms in (40.0, 40.0, 20.0, 40.0, 40.0, 20.0):
+        assert not ctl.observe(ms)
+    assert ctl.switches == 0
+
+
+def test_faixa_de_histerese_nao_oscila(clock):
+    # Em 416 a 31 ms (dentro da tolerância de 10%) e com 608 estimado acima do alvo: fica parado
+    ctl = _controller(start_index=1)
+    clock.now = 100.0
+    for _ in range(20):
+        assert not ctl.observe(31.0)
+    assert ctl.current == (416, 0)
+
+
+def test_sobe_so_depois_do_cooldown(clock):
+    ctl = _controller(start_index=2)
+    # 320 a 10 ms: 416 estimado em ~16.9 ms < 24 ms (alvo - margem)
+    for _ in range(10):
+        assert not ctl.observe(10.0)
+    clock.now = 2.5
+    assert ctl.observe(10.0)
+    assert ctl.current == (416, 0)
+    # Logo após a troca, o cooldown vale de novo
+    for _ in range(10):
+        ctl.observe(10.0 * (416 / 320) ** 2)
+    assert ctl.current == (416, 0)
+
+
+def test_pulo_de_frames_depois_do_menor_tamanho(clock):
+    ctl = _controller(start_index=2)
+    for _ in range(3):
+        ctl.observe(70.0)
+    assert ctl.current == (320, 1)
+    # Com skip 1 a latência efetiva é metade da medida
+    for _ in range(3):
+        ctl.observe(70.0)
+    assert ctl.current == (320, 2)
+    for _ in range(10):
+        assert not ctl.observe(500.0)
+    assert ctl.current == (320, 2)
+
+
+def test_converge_com_custo_proporcional_a_area(clock):
+    # Custo simulado da rede: 30 ms em 416, proporcional à área; alvo 25 ms -> estabiliza em 320
+    ctl = _controller(target_ms=25.0)
+    history = []
+    for _ in range(60):
+        size = ctl.input_size[0]
+        ctl.observe(30.0 * (size / 416) ** 2)
+        clock.now += 0.1
+        history.append(ctl.current)
+    assert history[-1] == (320, 0)
+    assert ctl.switches == 2
+    assert len(set(history[-40:])) == 1
+
+
+def test_adaptive_detector_aplica_tamanho_e_pulo(clock):
+    calls = []
+
+    def detect_fn(frame, input_size):
+        calls.append((int(frame[0]), input_size))
+        return [{"frame": int(frame[0])}]
+
+    ctl = _controller(start_index=3)
+    det = AdaptiveDetector(detect_fn, ctl)
+    outputs = [det.process(np.array([i])) for i in range(6)]
+    assert calls == [(1, (320, 320)), (3, (320, 320)), (5, (320, 320))]
+    # Frames pulados reutilizam as últimas detecções (nenhuma antes da primeira detecção)
+    assert [[d["frame"] for d in o] for o in outputs] == [[], [1], [1], [3], [3], [5]]
@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+
+from yolo_backends import compare_backends, export_darknet_to_onnx
+from yolo_benchmark import synthetic_frame, write_darknet_model
+from yolo_inference import YoloDetector, build_detector_from_env
+
+ANCHORS = "10,14, 23,27, 37,58, 81,82, 135,169, 344,319"
+CLASSES = ["car", "motorbike", "threewheel", "van", "bus", "truck"]
+
+
+def _conv(filters, size=3, stride=1, activation="leaky", bn=1):
+    return ("convolutional", {"batch_normalize": bn, "filters": filters, "size": size, "stride": stride, "pad": 1,
+                              "activation": activation})
+
+
+def _yolo(mask):
+    return ("yolo", {"mask": mask, "anchors": ANCHORS, "classes": len(CLASSES), "num": 6})
+
+
+# Cobre as camadas do YOLOv3/YOLOv3-tiny: batchnorm, shortcut, maxpool com stride 1, upsample e route duplo
+RICH_LAYERS = [
+    _conv(8),                                        # 0
+    ("maxpool", {"size": 2, "stride": 2}),           # 1  /2
+    _conv(16, stride=2),                             # 2  /4
+    _conv(16, size=1, activation="linear"),          # 3
+    ("shortcut", {"from": -2, "activation": "linear"}),  # 4
+    ("maxpool", {"size": 2, "stride": 1}),           # 5
+    _conv(32, stride=2),                             # 6  /8
+    ("maxpool", {"size": 2, "stride": 2}),           # 7  /16
+    _conv(32),                                       # 8
+    _conv(33, size=1, activation="linear", bn=0),    # 9
+    _yolo("3,4,5"),                                  # 10
+    ("route", {"layers": -3}),                       # 11
+    _conv(16, size=1),                               # 12
+    ("upsample", {"stride": 2}),                     # 13 /8
+    ("route", {"layers": "-1, 6"}),                  # 14
+    _conv(32),                                       # 15
+    _conv(33, size=1, activation="linear", bn=0),    # 16
+    _yolo("0,1,2"),                                  # 17
+]
+
+
+def _assert_parity(paths, input_size):
+    pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    detectors = {name: YoloDetector(*paths, conf_threshold=0.25, backend=name, input_size=input_size)
+                 for name in ("opencv", "onnxruntime")}
+    images = [synthetic_frame(640, 480, seed=i) for i in range(3)]
+    r = compare_backends(detectors, images, input_size)["opencv vs onnxruntime"]
+    assert r["nonfinite_outputs"] == 0
+    assert r["max_abs_output_diff"] < 1e-3
+    assert r["total_detections"] > 0
+    assert r["matched_detections"] == r["total_detections"]
+
+
+def test_paridade_opencv_onnxruntime_modelo_tiny(tiny_model):
+    _assert_parity(tiny_model, (416, 416))
+
+
+def test_paridade_opencv_onnxruntime_camadas_yolov3(tmp_path):
+    # Objectness alta o bastante para haver detecções acima do thresh das camadas [yolo]
+    paths = write_darknet_model(str(tmp_path), RICH_LAYERS, size=320, classes=CLASSES, objectness_bias=2.0)
+    _assert_parity(paths, (320, 320))
+
+
+def test_onnxruntime_recusa_outro_tamanho_de_entrada(tmp_path, tiny_model):
+    pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    detector = YoloDetector(*tiny_model, backend="onnxruntime", onnx_path=str(tmp_path / "m.onnx"),
+                            input_size=(320, 320))
+    detector.detect(synthetic_frame(640, 480), input_size=(320, 320))
+    with pytest.raises(ValueError, match="320x320"):
+        detector.detect(synthetic_frame(640, 480), input_size=(416, 416))
+
+
+def test_build_detector_from_env_exporta_no_input_size(tmp_path, tiny_model, monkeypatch):
+    pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    cfg, weights, names = tiny_model
+    monkeypatch.setenv("YOLO_CFG_PATH", cfg)
+    monkeypatch.setenv("YOLO_WEIGHTS_PATH", weights)
+    monkeypatch.setenv("YOLO_NAMES_PATH", names)
+    monkeypatch.setenv("YOLO_ONNX_PATH", str(tmp_path / "env.onnx"))
+    detector = build_detector_from_env(backend="onnxruntime", input_size=(320, 256))
+    assert detector.backend.input_hw == (256, 320)
+    detector.detect(synthetic_frame(640, 480), input_size=(320, 256))
+
+
+@pytest.mark.parametrize("layers", [
+    [("dropout", {"probability": 0.5})],
+    [_conv(8, activation="mish")],
+    # route com groups/group_id (yolov4-tiny) não é um concat simples
+    [_conv(8), ("route", {"layers": -1, "groups": 2, "group_id": 1})],
+    [_conv(8), ("route", {"layers": -1, "group_id": 0})],
+])
+def test_exportacao_recusa_camada_ou_ativacao_nao_suportada(tmp_path, layers):
+    pytest.importorskip("onnx")
+    cfg, weights, _ = write_darknet_model(str(tmp_path), layers, classes=CLASSES)
+    with pytest.raises(ValueError, match="não suportada"):
+        export_darknet_to_onnx(cfg, weights, str(tmp_path / "m.onnx"))
+
+
+class _FakeDetector:
+    # Backend falso com saídas fixas, para testar compare_backends sem rede
+    def __init__(self, output):
+        self.output = output
+
+    def forward(self, blob):
+        return [self.output]
+
+    def detect(self, image, input_size):
+        return []
+
+
+def test_compare_backends_conta_valores_nao_finitos():
+    ref = np.ones((1, 10, 11), dtype=np.float32)
+    bad = ref.copy()
+    bad[0, 3, 2] = np.nan
+    bad[0, 4, 1] = np.inf
+    bad[0, 5, 0] = 1.5
+    r = compare_backends({"a": _FakeDetector(ref), "b": _FakeDetector(bad)}, [np.zeros((64, 64, 3), np.uint8)],
+                         (32, 32))["a vs b"]
+    assert r["nonfinite_outputs"] == 2
+    assert r["max_abs_output_diff"] == pytest.approx(0.5)
@@ -0,0 +1,92 @@
+import json
+import os
+
+import cv2
+import pytest
+
+from yolo_batch import JsonlWriter, last_jsonl_record, run_batch
+from yolo_benchmark import synthetic_frame
+
+
+def _record(index: int, num_detections: int = 40):
+    # Registro no formato do yolo_batch; 40 detecções dão ~3 KB por linha
+    det = {"class_id": 1, "class_name": "classe_1", "confidence": 0.123456789, "box": [100, 200, 300, 400]}
+    return {"source": "video.mp4", "frame": index, "index": index, "detections": [det] * num_detections}
+
+
+def _write_lines(path, records, partial: bytes = b""):
+    with open(path, "wb") as f:
+        for r in records:
+            f.write(json.dumps(r).encode() + b"\n")
+        f.write(partial)
+
+
+@pytest.mark.parametrize("chunk_size", [64, 1024, 4096])
+def test_ultimo_registro_maior_que_o_bloco_com_linha_parcial(tmp_path, chunk_size):
+    # Registros maiores que o bloco de leitura e uma linha final truncada (execução interrompida)
+    path = tmp_path / "saida.jsonl"
+    records = [_record(i, 80) for i in range(3)]
+    partial = json.dumps(_record(3, 80)).encode()[:2500]
+    _write_lines(path, records, partial)
+    assert len(json.dumps(records[-1])) > 4096
+    assert last_jsonl_record(str(path), chunk_size=chunk_size) == records[-1]
+
+
+def test_ultimo_registro_com_registros_de_3kb(tmp_path):
+    # Caso do review: ~3.2 KB por registro e 2.5 KB de linha parcial no bloco padrão de 4 KB
+    path = tmp_path / "saida.jsonl"
+    records = [_record(i) for i in range(5)]
+    _write_lines(path, records, json.dumps(_record(5)).encode()[:2500])
+    assert last_jsonl_record(str(path)) == records[-1]
+
+
+def test_ultimo_registro_casos_de_borda(tmp_path):
+    path = tmp_path / "saida.jsonl"
+    assert last_jsonl_record(str(path)) is None
+    _write_lines(path, [])
+    assert last_jsonl_record(str(path)) is None
+    # Só uma linha parcial: nenhum registro completo
+    _write_lines(path, [], b'{"source": "video.mp4", "fra')
+    assert last_jsonl_record(str(path)) is None
+    # Linhas em branco no final são ignoradas
+    _write_lines(path, [_record(0, 1)], b"\n\n")
+    assert last_jsonl_record(str(path)) == _record(0, 1)
+    _write_lines(path, [_record(0, 1)], b"")
+    with open(path, "ab") as f:
+        f.write(b"{nao-e-json}\n")
+    with pytest.raises(ValueError):
+        last_jsonl_record(str(path))
+
+
+def test_resume_apos_interrupcao_igual_a_execucao_completa(tmp_path, tiny_model):
+    from yolo_inference import YoloDetector
+
+    img_dir = tmp_path / "imgs"
+    img_dir.mkdir()
+    paths = []
+    for i in range(6):
+        path = str(img_dir / f"{i}.jpg")
+        cv2.imwrite(path, synthetic_frame(320, 240, seed=i))
+        paths.append(path)
+    cfg_path, weights_path, names_path = tiny_model
+    detector = YoloDetector(cfg_path, weights_path, names_path, conf_threshold=0.25, input_size=(320, 320))
+
+    full = str(tmp_path / "completo.jsonl")
+    writer = JsonlWriter(full)
+    run_batch(detector, paths, writer, input_size=(320, 320))
+    writer.close()
+    with open(full, "rb") as f:
+        lines = f.read().splitlines(keepends=True)
+
+    # Interrompida no meio da escrita do 4º registro
+    partial = str(tmp_path / "parcial.jsonl")
+    with open(partial, "wb") as f:
+        f.write(b"".join(lines[:3]) + lines[3][: len(lines[3]) // 2])
+    last = last_jsonl_record(partial)
+    writer = JsonlWriter(partial, append=True)
+    run_batch(detector, paths, writer, input_size=(320, 320),
+              resume=(last["source"], int(last["frame"]), int(last["index"])))
+    writer.close()
+    with open(partial, "rb") as f:
+        assert f.read() == b"".join(lines)
+    assert os.path.getsize(partial) == os.path.getsize(full)
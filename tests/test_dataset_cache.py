@@ -0,0 +1,97 @@
+import os
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from yolo_dataset_cache import (PAD_VALUE, PackedDataset, is_up_to_date, letterbox, letterbox_labels,
+                                pack_dataset)
+from yolo_eval import iter_samples, label_path_for_image, read_image_list, read_label_rows, write_synthetic_dataset
+
+SIZE = (416, 416)
+
+
+@pytest.fixture
+def paths(tmp_path):
+    paths = read_image_list(write_synthetic_dataset(str(tmp_path / "dados"), num_images=6, size=(1280, 720)))
+    # Uma imagem em retrato e sem objetos (label vazio)
+    extra = str(tmp_path / "dados" / "valid" / "img" / "retrato.jpg")
+    cv2.imwrite(extra, np.full((500, 300, 3), 40, dtype=np.uint8))
+    open(label_path_for_image(extra), "w").close()
+    return paths + [extra]
+
+
+def test_letterbox_mantem_proporcao_e_centraliza():
+    image = np.full((720, 1280, 3), 200, dtype=np.uint8)
+    out, scale, pad_x, pad_y = letterbox(image, SIZE)
+    assert scale == pytest.approx(416 / 1280)
+    assert (pad_x, pad_y) == (0, 91)
+    assert (out[:pad_y] == PAD_VALUE).all() and (out[pad_y + 234:] == PAD_VALUE).all()
+    assert (out[pad_y:pad_y + 234] == 200).all()
+
+
+def test_pacote_igual_a_decodificacao_direta(paths, tmp_path):
+    out_dir = str(tmp_path / "pack")
+    r = pack_dataset(paths, out_dir, SIZE, workers=3)
+    dataset = PackedDataset(out_dir)
+    assert len(dataset) == r["images"] == len(paths)
+    assert dataset.paths == paths and dataset.size == SIZE
+    for i, path in enumerate(paths):
+        raw = cv2.imread(path)
+        expected, scale, pad_x, pad_y = letterbox(raw, SIZE)
+        image, rows = dataset[i]
+        np.testing.assert_array_equal(image, expected)
+        np.testing.assert_allclose(rows, letterbox_labels(read_label_rows(label_path_for_image(path)), raw.shape[1],
+                                                          raw.shape[0], scale, pad_x, pad_y, SIZE))
+        np.testing.assert_allclose(dataset.meta[i], (raw.shape[1], raw.shape[0], scale, pad_x, pad_y))
+    assert len(dataset[len(paths) - 1][1]) == 0
+
+
+def test_samples_preservam_os_boxes_a_menos_de_escala_e_deslocamento(paths, tmp_path):
+    pack_dataset(paths, str(tmp_path / "pack"), SIZE)
+    dataset = PackedDataset(str(tmp_path / "pack"))
+    for (path, _, classes, boxes), (p, _, ref_classes, ref_boxes), meta in zip(
+            dataset.samples(), iter_samples(paths, workers=2), dataset.meta):
+        assert path == p
+        np.testing.assert_array_equal(classes, ref_classes)
+        _, _, scale, pad_x, pad_y = meta
+        expected = ref_boxes * scale + np.array([pad_x, pad_y, 0, 0])
+        np.testing.assert_allclose(boxes, expected, atol=1.0)
+
+
+def test_lotes_sem_shuffle_sao_views_e_com_shuffle_cobrem_tudo(paths, tmp_path):
+    pack_dataset(paths, str(tmp_path / "pack"), SIZE)
+    dataset = PackedDataset(str(tmp_path / "pack"))
+    batches = list(dataset.iter_batches(batch_size=3))
+    assert [len(idx) for _, _, idx in batches] == [3, 3, 1]
+    assert all(np.shares_memory(images, dataset.images) for images, _, _ in batches)
+    shuffled = list(dataset.iter_batches(batch_size=3, shuffle=True, seed=1))
+    seen = np.concatenate([idx for _, _, idx in shuffled])
+    assert sorted(seen.tolist()) == list(range(len(paths)))
+    for images, labels, idx in shuffled:
+        assert list(idx) == sorted(idx)
+        np.testing.assert_array_equal(images, dataset.images[idx])
+        assert all(np.array_equal(lab, dataset[i][1]) for lab, i in zip(labels, idx))
+
+
+def test_pacote_desatualizado_quando_fontes_mudam(paths, tmp_path):
+    out_dir = str(tmp_path / "pack")
+    assert not is_up_to_date(out_dir, paths, SIZE)
+    pack_dataset(paths, out_dir, SIZE)
+    assert is_up_to_date(out_dir, paths, SIZE)
+    assert not is_up_to_date(out_dir, paths, (320, 320))
+    assert not is_up_to_date(out_dir, paths[::-1], SIZE)
+    label = label_path_for_image(paths[0])
+    with open(label, "a", encoding="utf-8") as f:
+        f.write("0 0.5 0.5 0.1 0.1\n")
+    assert not is_up_to_date(out_dir, paths, SIZE)
+
+
+def test_reempacotar_troca_o_diretorio_sem_sobras(paths, tmp_path):
+    out_dir = str(tmp_path / "pack")
+    pack_dataset(paths, out_dir, SIZE)
+    time.sleep(0.01)
+    pack_dataset(paths[:3], out_dir, SIZE)
+    assert len(PackedDataset(out_dir)) == 3
+    assert not [name for name in os.listdir(tmp_path) if name.startswith(".")]
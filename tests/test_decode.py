@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from yolo_benchmark import _decode_outputs_loop, synthetic_frame, synthetic_layer_outputs
+from yolo_inference import YoloDetector, _decode_outputs
+
+
+def assert_decode_equivalent(layer_outputs, img_w, img_h, conf_threshold):
+    # O decode vetorizado precisa reproduzir exatamente o loop de referência
+    ref_boxes, ref_conf, ref_ids = _decode_outputs_loop(layer_outputs, img_w, img_h, conf_threshold)
+    boxes, conf, ids = _decode_outputs(layer_outputs, img_w, img_h, conf_threshold)
+    assert boxes.tolist() == ref_boxes
+    assert ids.tolist() == ref_ids
+    assert np.array_equal(conf, np.asarray(ref_conf, dtype=np.float32))
+
+
+@pytest.mark.parametrize("input_size", [320, 416, 608])
+@pytest.mark.parametrize("frame_size", [(640, 480), (1280, 720), (1920, 1080)])
+@pytest.mark.parametrize("conf_threshold", [0.05, 0.5])
+def test_decode_vetorizado_igual_ao_loop(input_size, frame_size, conf_threshold):
+    outputs = synthetic_layer_outputs(input_size, seed=input_size)
+    assert_decode_equivalent(outputs, frame_size[0], frame_size[1], conf_threshold)
+
+
+def test_decode_centros_negativos_truncam_como_int():
+    # Boxes que passam da borda: int() trunca em direção a zero, inclusive em coordenadas negativas
+    out = np.zeros((4, 7), dtype=np.float32)
+    out[:, :4] = [[0.01, 0.02, 0.5, 0.4], [0.99, 0.98, 0.3, 0.9], [0.5, 0.5, 1.3, 1.1], [0.0, 0.0, 0.07, 0.03]]
+    out[:, 5] = 0.9
+    assert_decode_equivalent([out], 1280, 720, 0.5)
+
+
+def test_decode_descarta_geometria_nao_finita():
+    outputs = synthetic_layer_outputs(416, seed=1)
+    rows = outputs[0]
+    rows[:, 5] = 1.0
+    rows[0, 2] = np.inf
+    rows[1, 3] = np.nan
+    candidates = sum(int((o[:, 5:].max(axis=1) >= 0.5).sum()) for o in outputs)
+    boxes, conf, ids = _decode_outputs(outputs, 640, 480, 0.5)
+    assert len(boxes) == len(conf) == len(ids) == candidates - 2
+    assert np.isfinite(conf).all()
+
+
+def test_decode_sem_deteccoes():
+    outputs = [np.zeros((12, 11), dtype=np.float32)]
+    boxes, conf, ids = _decode_outputs(outputs, 640, 480, 0.5)
+    assert boxes.shape == (0, 4) and conf.shape == (0,) and ids.shape == (0,)
+
+
+def test_detect_igual_ao_loop_de_referencia(tiny_model):
+    # Fim a fim: detect() (decode vetorizado + NMS) == código original (blobFromImage + loop + NMS)
+    import cv2
+
+    detector = YoloDetector(*tiny_model, conf_threshold=0.25, reuse_buffers=False)
+    frame = synthetic_frame(640, 480)
+    detections = detector.detect(frame)
+    blob = cv2.dnn.blobFromImage(frame, 1 / 255.0, (416, 416), swapRB=True, crop=False)
+    boxes, confidences, class_ids = _decode_outputs_loop(detector.backend.forward(blob), 640, 480, 0.25)
+    keep = cv2.dnn.NMSBoxes(boxes, confidences, 0.25, detector.nms_threshold)
+    expected = sorted((class_ids[i], tuple(max(0, v) for v in boxes[i])) for i in np.array(keep).flatten())
+    assert expected
+    assert sorted((d["class_id"], tuple(d["box"])) for d in detections) == expected
+
+
+def test_blob_com_buffers_reaproveitados_equivale_a_blob_from_image(tiny_model):
+    import cv2
+
+    detector = YoloDetector(*tiny_model)
+    frame = synthetic_frame(640, 480)
+    blob = detector._preprocess([frame], (416, 416))
+    expected = cv2.dnn.blobFromImage(frame, 1 / 255.0, (416, 416), swapRB=True, crop=False)
+    np.testing.assert_allclose(blob, expected, atol=1e-6)
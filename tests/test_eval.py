@@ -0,0 +1,102 @@
+import argparse
+
+import numpy as np
+import pytest
+
+from yolo_eval import (IOU_THRESHOLDS, MapAccumulator, detector_kwargs_from_args, evaluate, iter_samples,
+                       match_predictions, read_image_list, write_synthetic_dataset)
+from yolo_tracker import iou_matrix
+
+
+def _match_reference(pred_boxes: np.ndarray, gt_boxes: np.ndarray, threshold: float) -> np.ndarray:
+    # Casamento guloso escalar (um limiar por vez) para conferir a versão vetorizada
+    tp = np.zeros(len(pred_boxes), dtype=bool)
+    used = set()
+    for p, pb in enumerate(pred_boxes):
+        best, best_iou = -1, -1.0
+        for g, gb in enumerate(gt_boxes):
+            if g in used:
+                continue
+            iou = float(iou_matrix(pb[None], gb[None])[0, 0])
+            if iou > best_iou:
+                best, best_iou = g, iou
+        if best >= 0 and best_iou >= threshold:
+            tp[p] = True
+            used.add(best)
+    return tp
+
+
+@pytest.fixture(scope="module")
+def dataset(tmp_path_factory):
+    list_path = write_synthetic_dataset(str(tmp_path_factory.mktemp("dataset")), num_images=32)
+    paths = read_image_list(list_path)
+    return paths, list(iter_samples(paths, workers=4))
+
+
+def test_ordem_das_amostras_preservada(dataset):
+    paths, samples = dataset
+    assert [s[0] for s in samples] == paths
+
+
+def test_map_com_predicoes_de_resultado_conhecido(dataset):
+    # Predição = GT: mAP 1.0. Boxes deslocados com IoU ~0.62: acerta só em 0.5/0.55/0.6 (mAP50:95 = 0.3).
+    # Parte dos GTs sem predição: AP = recall (todas as predições restantes são acertos).
+    _, samples = dataset
+    rng = np.random.default_rng(0)
+    exact, shifted, half = MapAccumulator(), MapAccumulator(), MapAccumulator()
+    for _, _, gt_classes, gt_boxes in samples:
+        scores = rng.random(len(gt_boxes)).astype(np.float32)
+        exact.add(gt_classes, gt_boxes, scores, gt_classes, gt_boxes)
+        moved = gt_boxes.copy()
+        moved[:, 0] += gt_boxes[:, 2] * (1 - 0.62) / (1 + 0.62)
+        shifted.add(gt_classes, moved, scores, gt_classes, gt_boxes)
+        keep = np.arange(len(gt_boxes)) % 2 == 0
+        half.add(gt_classes[keep], gt_boxes[keep], scores[keep], gt_classes, gt_boxes)
+
+    r = exact.compute()
+    assert r["map50"] == pytest.approx(1.0) and r["map50_95"] == pytest.approx(1.0)
+    r = shifted.compute()
+    assert r["map50"] == pytest.approx(1.0) and r["map50_95"] == pytest.approx(0.3)
+    r = half.compute()
+    for c in r["per_class"].values():
+        assert c["ap50"] == pytest.approx(c["predictions"] / c["gt"])
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_casamento_vetorizado_igual_a_referencia(seed):
+    rng = np.random.default_rng(seed)
+    gt = rng.uniform(0, 200, (int(rng.integers(0, 8)), 4)).astype(np.float32)
+    pred = rng.uniform(0, 200, (int(rng.integers(0, 12)), 4)).astype(np.float32)
+    k = min(len(gt) // 2, len(pred))
+    pred[:k] = gt[:k] + rng.normal(0, 8, (k, 4))
+    tp = match_predictions(pred, gt)
+    for t, thr in enumerate(IOU_THRESHOLDS):
+        np.testing.assert_array_equal(tp[t], _match_reference(pred, gt, float(thr)))
+
+
+def test_detector_kwargs_usam_thresholds_da_avaliacao(tiny_model):
+    cfg_path, weights_path, names_path = tiny_model
+    args = argparse.Namespace(cfg=cfg_path, weights=weights_path, names=names_path, conf=0.005, nms=0.45,
+                              gpu=False, backend=None)
+    kwargs = detector_kwargs_from_args(args, (320, 320))
+    assert (kwargs["conf_threshold"], kwargs["nms_threshold"]) == (0.005, 0.45)
+    assert kwargs["input_size"] == (320, 320)
+
+
+def test_pool_igual_ao_processo_local(tiny_model, dataset):
+    # Com --workers a avaliação usa os mesmos kwargs (thresholds incluídos) e chega ao mesmo resultado
+    from yolo_inference import YoloDetector, _load_classes
+    from yolo_pool import DetectorPool
+
+    paths, _ = dataset
+    paths = paths[:8]
+    cfg_path, weights_path, names_path = tiny_model
+    args = argparse.Namespace(cfg=cfg_path, weights=weights_path, names=names_path, conf=0.05, nms=0.45,
+                              gpu=False, backend=None)
+    kwargs = detector_kwargs_from_args(args, (320, 320))
+    local = evaluate(YoloDetector(**kwargs), paths, (320, 320))
+    with DetectorPool(2, kwargs, input_size=(320, 320), max_frame_shape=(480, 640, 3)) as pool:
+        pooled = evaluate(None, paths, (320, 320), pool=pool, classes=_load_classes(names_path))
+    assert pooled["images"] == local["images"] == len(paths)
+    assert pooled["per_class"] == local["per_class"]
+    assert pooled["map50_95"] == pytest.approx(local["map50_95"])
@@ -0,0 +1,107 @@
+import cv2
+import numpy as np
+import pytest
+
+from yolo_motion import (MOTION_METHODS, MotionGate, MotionGatedDetector, _merge_regions, region_input_size,
+                         synthetic_scene)
+
+# Cena sintética reduzida: 60 frames 640x360, o objeto (161x121 px, vermelho) cruza nos frames 24..35
+NUM_FRAMES, WIDTH, HEIGHT = 60, 640, 360
+MOVING = range(24, 36)
+
+
+def _object_box(i):
+    return (int((i - MOVING.start) / (len(MOVING) - 1) * (WIDTH - 200)), HEIGHT // 2 - 60, 161, 121)
+
+
+def _red_boxes(frame):
+    # Detector "perfeito" do objeto vermelho: boxes no sistema de coordenadas da imagem recebida
+    mask = ((frame[:, :, 2] > 180) & (frame[:, :, 0] < 90)).astype(np.uint8)
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    return [{"class_id": 0, "class_name": "car", "confidence": 0.9,
+             "box": tuple(int(v) for v in cv2.boundingRect(c))} for c in contours]
+
+
+def _run(gated, moving_fraction=0.2):
+    processed, outputs = [], []
+    for i, frame in enumerate(synthetic_scene(NUM_FRAMES, WIDTH, HEIGHT, moving_fraction)):
+        skipped = gated.skipped
+        outputs.append(gated.process(frame))
+        if gated.skipped == skipped:
+            processed.append(i)
+    return processed, outputs
+
+
+def test_metodo_desconhecido():
+    with pytest.raises(ValueError):
+        MotionGate("optical-flow")
+
+
+def test_merge_regions_junta_so_as_que_se_sobrepoem():
+    merged = _merge_regions([(0, 0, 10, 10), (5, 5, 10, 10), (12, 12, 10, 10), (100, 100, 5, 5)])
+    assert sorted(merged) == [(0, 0, 22, 22), (100, 100, 5, 5)]
+    # Encostadas não se sobrepõem
+    assert sorted(_merge_regions([(0, 0, 10, 10), (10, 0, 10, 10)])) == [(0, 0, 10, 10), (10, 0, 10, 10)]
+
+
+def test_region_input_size_proporcional_ao_recorte():
+    assert region_input_size(320, 180, 1280, 720, (416, 416)) == (128, 128)
+    assert region_input_size(10, 10, 1280, 720, (416, 416)) == (64, 64)
+    assert region_input_size(1280, 720, 1280, 720, (416, 416)) == (416, 416)
+
+
+@pytest.mark.parametrize("method", MOTION_METHODS)
+def test_cena_estatica_so_detecta_no_primeiro_frame(method):
+    calls = []
+    gated = MotionGatedDetector(lambda frame: calls.append(1) or [], MotionGate(method))
+    processed, _ = _run(gated, moving_fraction=0.0)
+    assert processed == [0] and len(calls) == 1
+    assert gated.skip_ratio() == pytest.approx((NUM_FRAMES - 1) / NUM_FRAMES)
+
+
+@pytest.mark.parametrize("method", MOTION_METHODS)
+def test_detecta_em_todos_os_frames_com_movimento(method):
+    gated = MotionGatedDetector(_red_boxes, MotionGate(method))
+    processed, outputs = _run(gated)
+    assert set(processed) >= {0, *MOVING}
+    # Quando o objeto sai, no máximo um frame a mais é processado e o resto é pulado
+    assert len(processed) <= 1 + len(MOVING) + 1
+    assert gated.skipped == NUM_FRAMES - gated.full
+    for i in MOVING:
+        assert [d["box"] for d in outputs[i]] == [_object_box(i)]
+    # Frames pulados reutilizam as últimas detecções
+    assert outputs[10] is outputs[0]
+
+
+@pytest.mark.parametrize("method", MOTION_METHODS)
+def test_regional_devolve_boxes_em_coordenadas_do_frame(method):
+    sizes = []
+
+    def region_fn(crop, size):
+        sizes.append(size)
+        assert crop.shape[0] < HEIGHT or crop.shape[1] < WIDTH
+        return _red_boxes(crop)
+
+    gated = MotionGatedDetector(_red_boxes, MotionGate(method), region_fn, input_size=(416, 416))
+    processed, outputs = _run(gated)
+    # Só o primeiro frame é completo: o objeto ocupa pouco do frame e todo movimento seguinte é regional
+    assert gated.full == 1 and gated.regional == len(processed) - 1
+    for i in MOVING:
+        assert [d["box"] for d in outputs[i]] == [_object_box(i)]
+    assert sizes and all(w < 416 and w % 32 == 0 and h % 32 == 0 for w, h in sizes)
+
+
+def test_regional_mantem_deteccoes_longe_do_movimento():
+    static = {"class_id": 1, "class_name": "bus", "confidence": 0.8, "box": (600, 10, 30, 30)}
+    gated = MotionGatedDetector(lambda frame: _red_boxes(frame) + [static], MotionGate("diff"),
+                                lambda crop, size: _red_boxes(crop))
+    _, outputs = _run(gated)
+    for i in MOVING:
+        assert static in outputs[i]
+
+
+def test_refresh_every_forca_inferencia_completa():
+    gated = MotionGatedDetector(lambda frame: [], MotionGate("diff"), refresh_every=10)
+    processed, _ = _run(gated, moving_fraction=0.0)
+    assert processed == [0, 11, 22, 33, 44, 55]
+    assert gated.full == len(processed)
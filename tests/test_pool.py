@@ -0,0 +1,76 @@
+import os
+import signal
+import subprocess
+import sys
+import textwrap
+import time
+
+import pytest
+
+from yolo_benchmark import synthetic_frame
+from yolo_pool import DetectorPool
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _kwargs(tiny_model):
+    cfg_path, weights_path, names_path = tiny_model
+    return dict(cfg_path=cfg_path, weights_path=weights_path, names_path=names_path, conf_threshold=0.25,
+                input_size=(320, 320))
+
+
+def _frames_killing_worker(pool, total=200, kill_at=5):
+    # Gera frames e mata um worker com SIGKILL no meio do map
+    frame = synthetic_frame(640, 480)
+    for i in range(total):
+        if i == kill_at:
+            os.kill(pool._procs[0].pid, signal.SIGKILL)
+        yield frame
+
+
+def test_pool_igual_ao_detector_local(tiny_model):
+    from yolo_inference import YoloDetector
+
+    frames = [synthetic_frame(640, 480, seed=i) for i in range(6)]
+    detector = YoloDetector(**_kwargs(tiny_model))
+    expected = [detector.detect(f, input_size=(320, 320)) for f in frames]
+    with DetectorPool(2, _kwargs(tiny_model), input_size=(320, 320), max_frame_shape=(480, 640, 3)) as pool:
+        assert list(pool.map(frames)) == expected
+
+
+def test_worker_morto_falha_map_e_shutdown_termina_rapido(tiny_model):
+    pool = DetectorPool(2, _kwargs(tiny_model), input_size=(320, 320), max_frame_shape=(480, 640, 3))
+    try:
+        with pytest.raises(RuntimeError, match="quebrado"):
+            for _ in pool.map(_frames_killing_worker(pool)):
+                pass
+    finally:
+        t0 = time.monotonic()
+        pool.shutdown()
+        elapsed = time.monotonic() - t0
+    assert elapsed < 5.0
+    assert all(not p.is_alive() for p in pool._procs)
+
+
+def test_processo_encerra_apos_worker_morto(tiny_model):
+    # A saída do interpretador não pode ficar presa nas threads alimentadoras das filas
+    script = textwrap.dedent(f"""
+        import sys
+        sys.path.insert(0, {ROOT!r})
+        sys.path.insert(0, {os.path.join(ROOT, "tests")!r})
+        from test_pool import DetectorPool, _frames_killing_worker, _kwargs
+
+        if __name__ == "__main__":
+            pool = DetectorPool(2, _kwargs({tuple(tiny_model)!r}), input_size=(320, 320),
+                                max_frame_shape=(480, 640, 3))
+            try:
+                for _ in pool.map(_frames_killing_worker(pool)):
+                    pass
+            except RuntimeError:
+                pass
+            pool.shutdown()
+    """)
+    t0 = time.monotonic()
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert time.monotonic() - t0 < 30.0
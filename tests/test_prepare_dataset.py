@@ -0,0 +1,152 @@
+import io
+import json
+import os
+import tarfile
+
+import pytest
+
+from prepare_dataset import (default_manifest_path, process_annotations, process_annotations_parallel,
+                             stream_convert_tar, write_split_files)
+
+
+def _annotation(objects, width=640, height=480):
+    return {"size": {"width": width, "height": height},
+            "objects": [{"classTitle": c, "points": {"exterior": [[x1, y1], [x2, y2]]}}
+                        for c, (x1, y1, x2, y2) in objects]}
+
+
+def _add(tar, name, data):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    tar.addfile(info, io.BytesIO(data))
+
+
+@pytest.fixture
+def dataset_tar(tmp_path):
+    # Tar no layout do Supervisely ('<split>/ann/<img>.json' + '<split>/img/<img>'), com anotação antes e
+    # depois da imagem no stream, prefixo './', classe desconhecida e imagem sem anotação
+    path = tmp_path / "dataset.tar"
+    with tarfile.open(path, "w") as tar:
+        _add(tar, "train/ann/1.jpg.json", json.dumps(_annotation([("car", (10, 20, 110, 220)),
+                                                                  ("bus", (300, 100, 500, 300))])).encode())
+        _add(tar, "train/img/1.jpg", b"imagem-1")
+        _add(tar, "./train/img/2.jpg", b"imagem-2")
+        _add(tar, "./train/ann/2.jpg.json", json.dumps(_annotation([("truck", (0, 0, 640, 480)),
+                                                                    ("aviao", (1, 1, 2, 2))])).encode())
+        _add(tar, "valid/img/3.jpg", b"imagem-3")
+        _add(tar, "valid/ann/3.jpg.json", json.dumps(_annotation([])).encode())
+        _add(tar, "valid/img/sem-anotacao.jpg", b"imagem-4")
+    return path
+
+
+def _labels(base_dir):
+    # {caminho relativo do .txt: conteúdo} de todos os labels gerados
+    out = {}
+    for root, _, files in os.walk(base_dir):
+        for name in files:
+            if name.endswith(".txt"):
+                path = os.path.join(root, name)
+                with open(path, encoding="utf-8") as f:
+                    out[os.path.relpath(path, base_dir)] = f.read()
+    return out
+
+
+def _extract_and_convert(tar_path, base_dir):
+    # Caminho clássico: extrai o tar inteiro e converte split por split
+    with tarfile.open(tar_path) as tar:
+        tar.extractall(base_dir)
+    paths = []
+    for split in ("train", "valid"):
+        process_annotations(os.path.join(base_dir, split, "img"), os.path.join(base_dir, split, "ann"), paths)
+    return paths
+
+
+def test_stream_gera_os_mesmos_labels_que_extrair(dataset_tar, tmp_path):
+    extracted, streamed = tmp_path / "extraido", tmp_path / "stream"
+    expected_paths = _extract_and_convert(dataset_tar, str(extracted))
+    paths = stream_convert_tar(dataset_tar, streamed)
+
+    assert _labels(streamed) == _labels(extracted)
+    assert sorted(os.path.relpath(p, streamed) for p in paths) == \
+        sorted(os.path.relpath(p, extracted) for p in expected_paths)
+    assert all(os.path.isfile(p) for p in paths)
+    assert (streamed / "valid" / "img" / "sem-anotacao.jpg").is_file()
+
+
+def test_stream_labels_only_nao_extrai_imagens(dataset_tar, tmp_path):
+    extracted, streamed = tmp_path / "extraido", tmp_path / "stream"
+    _extract_and_convert(dataset_tar, str(extracted))
+    paths = stream_convert_tar(dataset_tar, streamed, extract_images=False)
+
+    assert _labels(streamed) == _labels(extracted)
+    assert len(paths) == 3
+    assert not any(os.path.isfile(p) for p in paths)
+
+
+def test_stream_recusa_membros_fora_do_diretorio(tmp_path):
+    path = tmp_path / "malicioso.tar"
+    data = json.dumps(_annotation([("car", (10, 10, 50, 50))])).encode()
+    with tarfile.open(path, "w") as tar:
+        _add(tar, "../escape/ann/2.jpg.json", data)
+        _add(tar, "../escape/img/2.jpg", b"x")
+        _add(tar, "/abs/ann/3.jpg.json", data)
+        _add(tar, "train/../../fora/ann/4.jpg.json", data)
+    base_dir = tmp_path / "work"
+    base_dir.mkdir()
+
+    assert stream_convert_tar(path, base_dir) == []
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["malicioso.tar", "work"]
+    assert list(base_dir.iterdir()) == []
+
+
+def _write_dataset_dir(base_dir, num_images=40):
+    # Dataset já extraído ('<split>/img' + '<split>/ann') com classes desconhecidas e anotações sem imagem
+    classes = ["car", "motorbike", "threewheel", "van", "bus", "truck", "aviao"]
+    for split in ("train", "valid"):
+        img_dir, ann_dir = base_dir / split / "img", base_dir / split / "ann"
+        img_dir.mkdir(parents=True)
+        ann_dir.mkdir(parents=True)
+        for i in range(num_images):
+            objects = [(classes[(i + k) % len(classes)], (5 * k, 7 * k, 5 * k + 40 + i, 7 * k + 30 + i))
+                       for k in range(i % 4)]
+            (ann_dir / f"{split}_{i}.jpg.json").write_text(json.dumps(_annotation(objects)))
+            if i % 9 != 5:
+                (img_dir / f"{split}_{i}.jpg").write_bytes(b"imagem")
+
+
+def _split_files(base_dir):
+    out = {}
+    for name in ("train.txt", "val.txt"):
+        with open(base_dir / name, encoding="utf-8") as f:
+            out[name] = [os.path.relpath(line.strip(), base_dir) for line in f]
+    return out
+
+
+def test_paralelo_gera_a_mesma_saida_que_o_serial(tmp_path, capsys):
+    serial, parallel = tmp_path / "serial", tmp_path / "paralelo"
+    for base_dir in (serial, parallel):
+        _write_dataset_dir(base_dir)
+
+    serial_paths = []
+    for split in ("train", "valid"):
+        process_annotations(str(serial / split / "img"), str(serial / split / "ann"), serial_paths)
+    write_split_files(serial, serial_paths)
+
+    for run in range(2):
+        # Segunda execução: incremental, tudo inalterado
+        parallel_paths = []
+        for split in ("train", "valid"):
+            ann_dir = str(parallel / split / "ann")
+            counts = process_annotations_parallel(str(parallel / split / "img"), ann_dir, parallel_paths,
+                                                  workers=2, manifest_path=default_manifest_path(ann_dir),
+                                                  chunk_size=7)
+            assert counts["missing"] == 4
+            assert counts["skipped" if run else "converted"] == 36
+        write_split_files(parallel, parallel_paths)
+
+        assert [os.path.relpath(p, parallel) for p in parallel_paths] == \
+            [os.path.relpath(p, serial) for p in serial_paths]
+        assert _split_files(parallel) == _split_files(serial)
+        # train.txt/val.txt (caminhos absolutos) já foram comparados acima com caminhos relativos
+        assert ({k: v for k, v in _labels(parallel).items() if k not in ("train.txt", "val.txt")} ==
+                {k: v for k, v in _labels(serial).items() if k not in ("train.txt", "val.txt")})
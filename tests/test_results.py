@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+from yolo_results import Detections
+
+CLASSES = ["car", "motorbike", "threewheel", "van", "bus", "truck"]
+
+
+def _frames(num_frames=5, per_frame=4, seed=0):
+    rng = np.random.default_rng(seed)
+    return [Detections(rng.integers(0, 1000, (per_frame, 4)), rng.random(per_frame),
+                       rng.integers(0, len(CLASSES), per_frame), CLASSES) for _ in range(num_frames)]
+
+
+def _assert_same(a, b):
+    for name in ("boxes", "scores", "class_ids", "frame_ids"):
+        np.testing.assert_array_equal(getattr(a, name), getattr(b, name))
+        assert getattr(a, name).dtype == getattr(b, name).dtype
+    assert list(a.classes) == list(b.classes)
+
+
+def test_from_dicts_e_to_dicts_ida_e_volta():
+    dicts = [{"class_id": 1, "class_name": "motorbike", "confidence": 0.5, "box": (1, 2, 3, 4)},
+             {"class_id": 9, "class_name": "9", "confidence": 0.25, "box": (5, 6, 7, 8)}]
+    dets = Detections.from_dicts(dicts, CLASSES, frame_id=7)
+    assert dets.to_dicts() == dicts
+    assert dets.frame_ids.tolist() == [7, 7]
+    assert len(Detections.from_dicts([], CLASSES)) == 0
+
+
+@pytest.mark.parametrize("classes", [CLASSES, [], ["só uma"]])
+def test_to_bytes_from_bytes_ida_e_volta(classes):
+    dets = Detections.concat(_frames(), frame_ids=[10, 11, 12, 13, 14])
+    dets.classes = classes
+    data = dets.to_bytes()
+    loaded = Detections.from_bytes(data)
+    _assert_same(loaded, dets)
+    # Arrays são views alinhadas sobre o buffer, sem cópia
+    buf = np.frombuffer(data, dtype=np.uint8)
+    for arr in (loaded.boxes, loaded.scores, loaded.class_ids, loaded.frame_ids):
+        assert np.shares_memory(arr, buf)
+        assert arr.flags.aligned
+
+
+def test_ida_e_volta_sem_deteccoes():
+    _assert_same(Detections.from_bytes(Detections.empty(CLASSES).to_bytes()), Detections.empty(CLASSES))
+
+
+def test_from_bytes_recusa_outro_formato():
+    data = bytearray(Detections.empty(CLASSES).to_bytes())
+    data[:4] = b"XXXX"
+    with pytest.raises(ValueError):
+        Detections.from_bytes(bytes(data))
+
+
+def test_load_com_mmap_somente_leitura(tmp_path):
+    dets = Detections.concat(_frames(), frame_ids=range(5))
+    path = str(tmp_path / "dets.bin")
+    dets.save(path)
+    for mmap in (False, True):
+        _assert_same(Detections.load(path, mmap=mmap), dets)
+    mapped = Detections.load(path, mmap=True)
+    assert not mapped.boxes.flags.writeable
+    assert isinstance(mapped.boxes.base, np.ndarray)
+
+
+def test_fatias_sao_views_e_mascaras_copiam():
+    dets = Detections.concat(_frames())
+    part = dets[3:7]
+    assert np.shares_memory(part.boxes, dets.boxes) and np.shares_memory(part.scores, dets.scores)
+    assert part.classes is dets.classes
+    masked = dets[dets.scores > 0.5]
+    assert not np.shares_memory(masked.boxes, dets.boxes)
+    assert dets[-1].boxes.tolist() == [dets.boxes[-1].tolist()]
+    assert dets[0].boxes.tolist() == [dets.boxes[0].tolist()]
+
+
+def test_for_frame_e_iter_frames_apos_concat():
+    frames = _frames()
+    dets = Detections.concat(frames, frame_ids=[0, 2, 4, 6, 8])
+    view = dets.for_frame(4)
+    np.testing.assert_array_equal(view.boxes, frames[2].boxes)
+    assert np.shares_memory(view.boxes, dets.boxes)
+    assert len(dets.for_frame(3)) == 0
+    assert [(fid, len(part)) for fid, part in dets.iter_frames()] == [(f, 4) for f in (0, 2, 4, 6, 8)]
+
+
+def test_iter_frames_com_frame_ids_fora_de_ordem():
+    dets = Detections(np.arange(16).reshape(4, 4), [0.1, 0.2, 0.3, 0.4], [0, 1, 2, 3], CLASSES, [3, 1, 3, 1])
+    grouped = {fid: part.class_ids.tolist() for fid, part in dets.iter_frames()}
+    assert grouped == {1: [1, 3], 3: [0, 2]}
+    assert dets.for_frame(3).class_ids.tolist() == [0, 2]
+
+
+def test_comprimentos_diferentes_sao_recusados():
+    with pytest.raises(ValueError):
+        Detections(np.zeros((2, 4)), [0.5], [0, 1])
+    with pytest.raises(ValueError):
+        Detections.concat(_frames(2), frame_ids=[0])
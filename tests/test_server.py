@@ -0,0 +1,169 @@
+import asyncio
+import json
+import threading
+
+import cv2
+import pytest
+
+from yolo_benchmark import synthetic_frame
+from yolo_inference import YoloDetector
+from yolo_server import AsyncClient, DetectionServer, parse_content_length
+
+
+@pytest.fixture(scope="module")
+def image_bytes():
+    ok, jpeg = cv2.imencode(".jpg", synthetic_frame(640, 480))
+    assert ok
+    return jpeg.tobytes()
+
+
+def _detector(tiny_model):
+    cfg_path, weights_path, names_path = tiny_model
+    return YoloDetector(cfg_path, weights_path, names_path, conf_threshold=0.25, input_size=(320, 320))
+
+
+def _serve(detector, scenario, **server_kwargs):
+    # Sobe o servidor em porta livre, roda o cenário (corrotina que recebe a porta) e encerra
+    async def run():
+        server = DetectionServer(detector, "127.0.0.1", 0, input_size=(320, 320), **server_kwargs)
+        await server.start()
+        try:
+            return await scenario(server.port)
+        finally:
+            await server.stop()
+
+    return asyncio.run(run())
+
+
+async def _raw_status(port: int, data: bytes) -> int:
+    # Envia bytes crus (requisições malformadas) e devolve o status HTTP da resposta
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write(data)
+        await writer.drain()
+        status_line = await reader.readline()
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+def test_rotas_health_detect_metrics(tiny_model, image_bytes):
+    async def scenario(port):
+        client = AsyncClient("127.0.0.1", port)
+        try:
+            status, _, data = await client.request("GET", "/health")
+            assert status == 200 and json.loads(data)["status"] == "ok"
+            status, payload = await client.detect(image_bytes)
+            assert status == 200
+            assert (payload["width"], payload["height"]) == (640, 480)
+            assert payload["batch_size"] == 1
+            status, payload = await client.detect(b"nao-e-imagem")
+            assert status == 400
+            status, _, data = await client.request("GET", "/metrics")
+            assert status == 200 and b"yolo_stage_latency_ms" in data
+            status, _, _ = await client.request("GET", "/nao-existe")
+            assert status == 404
+            status, _, _ = await client.request("GET", "/detect")
+            assert status == 405
+        finally:
+            await client.close()
+
+    _serve(_detector(tiny_model), scenario, max_batch_size=1)
+
+
+def test_detect_igual_a_chamada_direta(tiny_model, image_bytes):
+    # A resposta HTTP (imagem crua ou multipart) traz as mesmas detecções que detect() no frame decodificado
+    detector = _detector(tiny_model)
+    frame = cv2.imdecode(cv2.imencode(".jpg", synthetic_frame(640, 480))[1], cv2.IMREAD_COLOR)
+    expected = detector.detect(frame, input_size=(320, 320))
+    boundary = "limite123"
+    multipart = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"a.jpg\"\r\n"
+                 f"Content-Type: image/jpeg\r\n\r\n").encode() + image_bytes + f"\r\n--{boundary}--\r\n".encode()
+
+    async def scenario(port):
+        client = AsyncClient("127.0.0.1", port)
+        try:
+            raw = await client.detect(image_bytes)
+            form = await client.detect(multipart, f"multipart/form-data; boundary={boundary}")
+        finally:
+            await client.close()
+        return raw, form
+
+    for status, payload in _serve(detector, scenario, max_batch_size=1):
+        assert status == 200
+        assert [d["class_id"] for d in payload["detections"]] == [d["class_id"] for d in expected]
+        assert [d["box"] for d in payload["detections"]] == [list(d["box"]) for d in expected]
+
+
+@pytest.mark.parametrize("length", ["abc", "-5", "1e3", "+5", "1_000"])
+def test_content_length_invalido_retorna_400(tiny_model, length):
+    request = f"POST /detect HTTP/1.1\r\nContent-Length: {length}\r\n\r\n".encode()
+    assert _serve(_detector(tiny_model), lambda port: _raw_status(port, request)) == 400
+
+
+def test_corpo_grande_demais_retorna_413(tiny_model):
+    request = b"POST /detect HTTP/1.1\r\nContent-Length: 2048\r\n\r\n"
+    assert _serve(_detector(tiny_model), lambda port: _raw_status(port, request), max_body_bytes=1024) == 413
+
+
+def test_parse_content_length_aceita_so_digitos():
+    assert parse_content_length("") == 0
+    assert parse_content_length(" 42 ") == 42
+    for value in ("abc", "-5", "1e3", "4 2", "٣"):
+        with pytest.raises(ValueError):
+            parse_content_length(value)
+
+
+def test_micro_batching_agrupa_requisicoes_concorrentes(tiny_model, image_bytes):
+    async def scenario(port):
+        clients = [AsyncClient("127.0.0.1", port) for _ in range(8)]
+        try:
+            results = await asyncio.gather(*(c.detect(image_bytes) for c in clients))
+        finally:
+            for c in clients:
+                await c.close()
+        return results
+
+    results = _serve(_detector(tiny_model), scenario, max_batch_size=8, max_wait_ms=200.0)
+    assert all(status == 200 for status, _ in results)
+    assert max(payload["batch_size"] for _, payload in results) > 1
+    # Lote ou imagem avulsa: as detecções são as mesmas
+    first = results[0][1]["detections"]
+    assert all(payload["detections"] == first for _, payload in results)
+
+
+class _BlockingDetector:
+    # Detector que só responde quando liberado: mantém a fila ocupada para testar o backpressure
+    def __init__(self):
+        self.release = threading.Event()
+        self.instrumentation = None
+
+    def detect(self, frame, input_size=None):
+        self.release.wait(timeout=10)
+        return []
+
+    def detect_batch(self, frames, input_size=None):
+        return [self.detect(f) for f in frames]
+
+
+def test_fila_cheia_retorna_503(image_bytes):
+    detector = _BlockingDetector()
+
+    async def scenario(port):
+        clients = [AsyncClient("127.0.0.1", port) for _ in range(3)]
+        try:
+            # 1 em inferência + 1 na fila; a terceira requisição encontra a fila cheia
+            first = [asyncio.ensure_future(c.detect(image_bytes)) for c in clients[:2]]
+            await asyncio.sleep(0.3)
+            status, _, _ = await clients[2].request("POST", "/detect", image_bytes, "image/jpeg")
+            detector.release.set()
+            done = await asyncio.gather(*first)
+        finally:
+            for c in clients:
+                await c.close()
+        return status, [s for s, _ in done]
+
+    status, others = _serve(detector, scenario, max_batch_size=1, max_queue=1)
+    assert status == 503
+    assert others == [200, 200]
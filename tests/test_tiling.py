@@ -0,0 +1,110 @@
+import cv2
+import numpy as np
+import pytest
+
+from yolo_tiling import TiledDetector, merge_detections, tile_grid
+
+# Objetos (x, y, w, h) num frame 1000x600 com tiles de 416 e overlap 0.2 (x: 0/332/584, y: 0/184):
+# um só num tile, um inteiro em dois tiles, um cortado na borda de tiles vizinhos e um no canto
+OBJECTS = [(50, 50, 40, 30), (350, 100, 50, 40), (400, 300, 60, 50), (900, 500, 80, 80)]
+
+
+class _RectDetector:
+    # Detector "perfeito" de retângulos brancos: devolve os boxes no sistema de coordenadas do recorte
+    def __init__(self):
+        self.batches = []
+
+    def detect_batch(self, crops, input_size=None):
+        self.batches.append(len(crops))
+        results = []
+        for crop in crops:
+            mask = (crop[:, :, 0] > 200).astype(np.uint8)
+            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            results.append([{"class_id": 0, "class_name": "car", "confidence": 0.9,
+                             "box": tuple(int(v) for v in cv2.boundingRect(c))} for c in contours])
+        return results
+
+
+def _frame(objects=OBJECTS, size=(1000, 600)):
+    frame = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+    for x, y, w, h in objects:
+        frame[y:y + h, x:x + w] = 255
+    return frame
+
+
+def test_grade_cobre_o_frame_com_o_ultimo_tile_na_borda():
+    tiles = tile_grid(1000, 600, tile_size=416, overlap=0.2)
+    assert sorted({x for x, _, _, _ in tiles}) == [0, 332, 584]
+    assert sorted({y for _, y, _, _ in tiles}) == [0, 184]
+    assert all(w == h == 416 for _, _, w, h in tiles)
+    assert tile_grid(300, 200, tile_size=416) == [(0, 0, 300, 200)]
+
+
+def test_grade_descarta_tiles_fora_da_roi():
+    mask = np.zeros((600, 1000), dtype=np.uint8)
+    mask[:, :300] = 255
+    assert sorted(tile_grid(1000, 600, 416, 0.2, roi_mask=mask)) == [(0, 0, 416, 416), (0, 184, 416, 416)]
+
+
+@pytest.mark.parametrize("merge", ["nms", "wbf"])
+def test_boxes_dos_tiles_voltam_para_o_frame_sem_duplicatas(merge):
+    detector = _RectDetector()
+    tiled = TiledDetector(detector, tile_size=416, overlap=0.2, merge=merge, include_full_frame=False)
+    detections = tiled.detect(_frame())
+    assert detector.batches == [6]
+    boxes = sorted(d["box"] for d in detections)
+    assert len(boxes) == len(OBJECTS)
+    # WBF faz média em float: tolera 1 px de arredondamento
+    np.testing.assert_allclose(boxes, sorted(OBJECTS), atol=0 if merge == "nms" else 1)
+    assert all("_truncated" not in d for d in detections)
+
+
+def test_frame_inteiro_entra_no_mesmo_lote():
+    detector = _RectDetector()
+    tiled = TiledDetector(detector, tile_size=416, overlap=0.2, include_full_frame=True)
+    detections = tiled.detect(_frame())
+    assert detector.batches == [7]
+    assert sorted(d["box"] for d in detections) == sorted(OBJECTS)
+
+
+def test_roi_filtra_deteccoes_pelo_centro():
+    mask = np.zeros((600, 1000), dtype=np.uint8)
+    mask[:, :500] = 255
+    tiled = TiledDetector(_RectDetector(), tile_size=416, overlap=0.2, include_full_frame=False, roi_mask=mask)
+    assert sorted(d["box"] for d in tiled.detect(_frame())) == sorted(OBJECTS[:3])
+
+
+def _d(box, confidence, class_id=0, truncated=False):
+    det = {"class_id": class_id, "class_name": "car", "confidence": confidence, "box": box}
+    if truncated:
+        det["_truncated"] = True
+    return det
+
+
+def test_merge_nms_mantem_a_maior_confianca_por_classe():
+    dets = [_d((0, 0, 100, 100), 0.6), _d((5, 5, 100, 100), 0.9), _d((0, 0, 100, 100), 0.5, class_id=1)]
+    merged = merge_detections(dets, "nms", 0.5)
+    assert [(d["box"], d["confidence"], d["class_id"]) for d in merged] == \
+        [((5, 5, 100, 100), 0.9, 0), ((0, 0, 100, 100), 0.5, 1)]
+
+
+def test_merge_wbf_pondera_pela_confianca():
+    merged = merge_detections([_d((0, 0, 100, 100), 0.75), _d((20, 0, 100, 100), 0.25)], "wbf", 0.5)
+    assert len(merged) == 1
+    assert merged[0]["box"] == (5, 0, 100, 100)
+    assert merged[0]["confidence"] == pytest.approx(0.5)
+
+
+def test_merge_prefere_box_inteiro_ao_cortado_na_borda():
+    # O box cortado tem confiança maior, mas o inteiro do tile vizinho representa o grupo
+    dets = [_d((100, 0, 16, 50), 0.95, truncated=True), _d((100, 0, 60, 50), 0.8)]
+    for method in ("nms", "wbf"):
+        merged = merge_detections(dets, method, 0.5, metric="ios")
+        assert [d["box"] for d in merged] == [(100, 0, 60, 50)]
+    # Com IoU o par fica abaixo do limiar e não é agrupado
+    assert len(merge_detections(dets, "nms", 0.5, metric="iou")) == 2
+
+
+def test_merge_metodo_desconhecido():
+    with pytest.raises(ValueError):
+        merge_detections([], "media")
@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+
+from yolo_tracker import MultiObjectTracker, TrackingDetector, iou_matrix
+
+
+def _det(box, class_id=0, confidence=0.9):
+    return {"class_id": class_id, "class_name": f"classe_{class_id}", "confidence": confidence, "box": box}
+
+
+def _scene(frame_idx):
+    # Dois objetos em movimento retilíneo uniforme (um para a direita, outro para baixo)
+    return [_det((10 + 5 * frame_idx, 50, 40, 30), class_id=0),
+            _det((200, 20 + 4 * frame_idx, 30, 60), class_id=1)]
+
+
+def test_iou_matrix():
+    a = np.array([[0, 0, 10, 10], [100, 100, 10, 10]])
+    b = np.array([[0, 0, 10, 10], [5, 0, 10, 10], [50, 50, 5, 5]])
+    ious = iou_matrix(a, b)
+    assert ious.shape == (2, 3)
+    np.testing.assert_allclose(ious[0], [1.0, 50 / 150, 0.0], rtol=1e-6)
+    np.testing.assert_allclose(ious[1], [0.0, 0.0, 0.0])
+    assert iou_matrix(np.zeros((0, 4)), b).shape == (0, 3)
+
+
+def test_ids_persistem_com_objetos_em_movimento():
+    tracker = MultiObjectTracker(min_hits=3)
+    ids = []
+    for i in range(20):
+        tracker.predict()
+        out = tracker.update(_scene(i))
+        ids.append({d["class_id"]: d["track_id"] for d in out})
+    assert all(frame_ids == ids[0] for frame_ids in ids)
+    assert len(set(ids[0].values())) == 2
+    assert tracker.counts() == {"classe_0": 1, "classe_1": 1}
+
+
+def test_associacao_respeita_a_classe():
+    tracker = MultiObjectTracker()
+    tracker.predict()
+    first = tracker.update([_det((10, 10, 50, 50), class_id=0)])
+    tracker.predict()
+    second = tracker.update([_det((10, 10, 50, 50), class_id=3)])
+    assert first[0]["track_id"] != second[0]["track_id"]
+
+
+def test_track_removido_apos_max_age():
+    tracker = MultiObjectTracker(max_age=2)
+    tracker.predict()
+    track_id = tracker.update([_det((10, 10, 50, 50))])[0]["track_id"]
+    for _ in range(3):
+        tracker.predict()
+        tracker.update([])
+    assert tracker.tracks == []
+    tracker.predict()
+    assert tracker.update([_det((10, 10, 50, 50))])[0]["track_id"] != track_id
+
+
+def test_contagem_so_de_tracks_confirmados():
+    tracker = MultiObjectTracker(min_hits=3)
+    for i in range(2):
+        tracker.predict()
+        tracker.update(_scene(i))
+    assert tracker.counts() == {}
+    tracker.predict()
+    tracker.update(_scene(2))
+    assert tracker.counts() == {"classe_0": 1, "classe_1": 1}
+
+
+def test_propagacao_segue_o_movimento_e_decai_a_confianca():
+    tracker = MultiObjectTracker(min_hits=2)
+    for i in range(10):
+        tracker.predict()
+        tracker.update(_scene(i))
+    # Dois frames sem detecção: o Kalman continua o movimento
+    tracker.predict()
+    tracker.predict()
+    out = {d["class_id"]: d for d in tracker.propagated(confidence_decay=0.5)}
+    expected = {d["class_id"]: d["box"] for d in _scene(11)}
+    for class_id, det in out.items():
+        assert np.abs(np.subtract(det["box"], expected[class_id])).max() <= 2
+        assert det["confidence"] == pytest.approx(0.9 * 0.5 ** 2)
+    assert tracker.propagated(max_staleness=1) == []
+
+
+def test_tracking_detector_detecta_a_cada_n_frames():
+    calls = []
+
+    def detect_fn(frame):
+        calls.append(int(frame[0, 0]))
+        return _scene(int(frame[0, 0]))
+
+    td = TrackingDetector(detect_fn, detect_every=3, min_track_confidence=0.1, confidence_decay=0.95)
+    outputs = [td.process(np.full((4, 4), i, dtype=np.int32)) for i in range(12)]
+    assert calls == [0, 3, 6, 9]
+    assert td.detect_ratio() == pytest.approx(4 / 12)
+    # Frames intermediários trazem os tracks confirmados com os mesmos IDs
+    ids = {d["track_id"] for d in outputs[-1]}
+    assert len(ids) == 2 and all({d["track_id"] for d in out} == ids for out in outputs[4:])
+
+
+def test_tracking_detector_confianca_baixa_forca_deteccao():
+    calls = []
+
+    def detect_fn(frame):
+        calls.append(len(calls))
+        return [_det((10, 10, 40, 40), confidence=0.35)]
+
+    td = TrackingDetector(detect_fn, detect_every=10, min_track_confidence=0.3, confidence_decay=0.5,
+                          tracker=MultiObjectTracker(min_hits=1))
+    for _ in range(4):
+        td.process(np.zeros((4, 4)))
+    # 0.35 * 0.5 < 0.3 já no primeiro frame propagado: detecta em todos
+    assert len(calls) == 4
@@ -0,0 +1,132 @@
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Ponto de operação: (tamanho de entrada da rede, frames pulados entre detecções)
+OperatingPoint = Tuple[int, int]
+
+
+def build_operating_points(input_sizes: List[int], max_skip: int = 2) -> List[OperatingPoint]:
+    # Do mais preciso ao mais barato: primeiro reduz o tamanho de entrada, depois pula frames
+    sizes = sorted(set(input_sizes), reverse=True)
+    points: List[OperatingPoint] = [(size, 0) for size in sizes]
+    points += [(sizes[-1], skip) for skip in range(1, max_skip + 1)]
+    return points
+
+
+class AdaptiveController:
+    # Controlador de latência com histerese: observa o tempo de detect() (média móvel
+    # exponencial) e troca de ponto de operação para manter a latência dentro do alvo.
+    # - Desce (mais barato) se a EWMA passar de target * (1 + tolerance) por `patience` observações.
+    # - Sobe (mais preciso) se a latência estimada do ponto acima ficar abaixo de target * (1 - margin)
+    #   por `patience` observações e já tiver passado `cooldown_s` desde a última troca.
+    def __init__(
+        self,
+        target_ms: float,
+        points: List[OperatingPoint],
+        start_index: int = 0,
+        alpha: float = 0.2,
+        tolerance: float = 0.1,
+        margin: float = 0.2,
+        patience: int = 5,
+        cooldown_s: float = 2.0,
+        log: Optional[Callable[[str], None]] = print,
+    ):
+        if not points:
+            raise ValueError("Lista de pontos de operação vazia")
+        self.target_ms = target_ms
+        self.points = points
+        self.index = min(max(0, start_index), len(points) - 1)
+        self.alpha = alpha
+        self.tolerance = tolerance
+        self.margin = margin
+        self.patience = patience
+        self.cooldown_s = cooldown_s
+        self.log = log
+        self.ewma_ms: Optional[float] = None
+        self.switches = 0
+        self._over = 0
+        self._under = 0
+        self._last_switch = time.monotonic()
+
+    @property
+    def current(self) -> OperatingPoint:
+        return self.points[self.index]
+
+    @property
+    def input_size(self) -> Tuple[int, int]:
+        size = self.current[0]
+        return (size, size)
+
+    @property
+    def skip(self) -> int:
+        return self.current[1]
+
+    def _effective_ms(self, index: int, measured_ms: float) -> float:
+        # Estima a latência média por frame de outro ponto a partir da medida atual:
+        # custo da rede ~ proporcional à área de entrada; pular k frames divide por (k + 1)
+        size, skip = self.points[self.index]
+        other_size, other_skip = self.points[index]
+        per_detect = measured_ms * (other_size / size) ** 2
+        return per_detect / (other_skip + 1)
+
+    def observe(self, detect_ms: float) -> bool:
+        # Registra o tempo de uma chamada a detect(); retorna True se o ponto de operação mudou
+        self.ewma_ms = detect_ms if self.ewma_ms is None else self.alpha * detect_ms + (1 - self.alpha) * self.ewma_ms
+        effective = self.ewma_ms / (self.skip + 1)
+        if effective > self.target_ms * (1 + self.tolerance):
+            self._over += 1
+            self._under = 0
+        elif self.index > 0 and self._effective_ms(self.index - 1, self.ewma_ms) < self.target_ms * (1 - self.margin):
+            self._under += 1
+            self._over = 0
+        else:
+            self._over = self._under = 0
+
+        now = time.monotonic()
+        if self._over >= self.patience and self.index < len(self.points) - 1:
+            return self._switch(self.index + 1, now, "acima")
+        if self._under >= self.patience and now - self._last_switch >= self.cooldown_s:
+            return self._switch(self.index - 1, now, "abaixo")
+        return False
+
+    def _switch(self, new_index: int, now: float, reason: str) -> bool:
+        old = self.current
+        # Reescala a EWMA para o novo tamanho para não reagir de novo com a medida antiga
+        old_size = old[0]
+        self.index = new_index
+        self.ewma_ms = self.ewma_ms * (self.current[0] / old_size) ** 2 if self.ewma_ms is not None else None
+        self._over = self._under = 0
+        self._last_switch = now
+        self.switches += 1
+        if self.log is not None:
+            self.log(f"[adaptativo] latência {reason} do alvo ({self.target_ms:.0f} ms): "
+                     f"{old[0]}px/skip {old[1]} -> {self.current[0]}px/skip {self.current[1]}")
+        return True
+
+    def label(self) -> str:
+        # Texto curto para overlay
+        ewma = f"{self.ewma_ms:.0f}" if self.ewma_ms is not None else "-"
+        return (f"Adaptativo: {self.current[0]}px skip {self.skip} "
+                f"(detect {ewma} ms / alvo {self.target_ms:.0f} ms)")
+
+
+class AdaptiveDetector:
+    # Aplica o ponto de operação escolhido pelo controlador: tamanho de entrada da rede e
+    # pulo de frames (frames pulados reutilizam as últimas detecções).
+    def __init__(self, detect_fn: Callable[[np.ndarray, Tuple[int, int]], List[Dict]], controller: AdaptiveController):
+        self.detect_fn = detect_fn
+        self.controller = controller
+        self.last_detections: List[Dict] = []
+        self._skipped = 0
+
+    def process(self, frame: np.ndarray) -> List[Dict]:
+        if self._skipped < self.controller.skip:
+            self._skipped += 1
+            return self.last_detections
+        self._skipped = 0
+        t0 = time.perf_counter()
+        self.last_detections = self.detect_fn(frame, self.controller.input_size)
+        self.controller.observe((time.perf_counter() - t0) * 1000.0)
+        return self.last_detections
@@ -0,0 +1,481 @@
+import os
+import sys
+import argparse
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Backends suportados pelo YoloDetector (parâmetro backend / variável YOLO_BACKEND)
+BACKENDS = ["opencv", "opencv-fp16", "openvino", "onnxruntime"]
+
+
+def _get_output_layer_names(net: cv2.dnn_Net) -> List[str]:
+    # Extrai nomes das camadas de saída (YOLO) para forward
+    layer_names = net.getLayerNames()
+    out_layers = net.getUnconnectedOutLayers()
+    return [layer_names[i - 1] for i in out_layers.flatten()]
+
+
+class OpenCVBackend:
+    # cv2.dnn com Darknet cfg/weights. target: CPU (padrão), CUDA (use_gpu), CPU FP16 ou OpenVINO.
+    def __init__(self, cfg_path: str, weights_path: str, backend: str = "opencv", use_gpu: bool = False):
+        self.net = cv2.dnn.readNetFromDarknet(cfg_path, weights_path)
+        if use_gpu:
+            self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_CUDA)
+            self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CUDA)
+        elif backend == "openvino":
+            # Requer OpenCV compilado com Inference Engine (ex.: pacote opencv do OpenVINO)
+            self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_INFERENCE_ENGINE)
+            self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        elif backend == "opencv-fp16":
+            if not hasattr(cv2.dnn, "DNN_TARGET_CPU_FP16"):
+                raise RuntimeError("Esta versão do OpenCV não suporta DNN_TARGET_CPU_FP16")
+            self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+            self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU_FP16)
+        else:
+            self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+            self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        self.output_layer_names = _get_output_layer_names(self.net)
+
+    def forward(self, blob: np.ndarray) -> List[np.ndarray]:
+        self.net.setInput(blob)
+        return list(self.net.forward(self.output_layer_names))
+
+
+class OnnxRuntimeBackend:
+    # ONNX Runtime sobre um modelo exportado por export_darknet_to_onnx (saídas já no formato
+    # das camadas YOLO do OpenCV, então o decode é o mesmo). Threads e otimizações de grafo
+    # são escolhidas automaticamente.
+    def __init__(self, onnx_path: str, use_gpu: bool = False, num_threads: Optional[int] = None,
+                 cache_optimized: bool = True):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("Backend onnxruntime requer o pacote onnxruntime (pip install onnxruntime)") from e
+        if not os.path.isfile(onnx_path):
+            raise FileNotFoundError(f"Modelo ONNX não encontrado: {onnx_path}")
+        opts = ort.SessionOptions()
+        model_path = onnx_path
+        tmp_optimized = None
+        if cache_optimized:
+            # Grafo já otimizado em disco: a sessão abre sem repetir as otimizações (inicialização
+            # bem mais rápida). Nível EXTENDED é portável entre CPUs; o cache é por versão do ORT.
+            optimized = optimized_model_path(onnx_path, ort.__version__)
+            if os.path.isfile(optimized) and os.path.getmtime(optimized) >= os.path.getmtime(onnx_path):
+                model_path = optimized
+                opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+            else:
+                tmp_optimized = f"{optimized}.{os.getpid()}.tmp"
+                opts.optimized_model_filepath = tmp_optimized
+                opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+        else:
+            opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        # YOLO_NUM_THREADS permite limitar por processo (ex.: workers do yolo_pool)
+        opts.intra_op_num_threads = num_threads or int(os.getenv("YOLO_NUM_THREADS", "0")) or _physical_cores()
+        opts.inter_op_num_threads = 1
+        available = ort.get_available_providers()
+        providers = []
+        if use_gpu and "CUDAExecutionProvider" in available:
+            providers.append("CUDAExecutionProvider")
+        if "OpenVINOExecutionProvider" in available:
+            providers.append("OpenVINOExecutionProvider")
+        providers.append("CPUExecutionProvider")
+        self.session = ort.InferenceSession(model_path, sess_options=opts, providers=providers)
+        if tmp_optimized is not None and os.path.isfile(tmp_optimized):
+            os.replace(tmp_optimized, optimized_model_path(onnx_path, ort.__version__))
+        inp = self.session.get_inputs()[0]
+        self.input_name = inp.name
+        # Dimensões espaciais fixadas na exportação (N, C, H, W)
+        self.input_hw = (int(inp.shape[2]), int(inp.shape[3]))
+        self.output_layer_names = [o.name for o in self.session.get_outputs()]
+
+    def forward(self, blob: np.ndarray) -> List[np.ndarray]:
+        if tuple(blob.shape[2:]) != self.input_hw:
+            raise ValueError(
+                f"Modelo ONNX exportado para entrada {self.input_hw[1]}x{self.input_hw[0]}; "
+                f"recebido {blob.shape[3]}x{blob.shape[2]} (reexporte com outro --input-size)"
+            )
+        return self.session.run(self.output_layer_names, {self.input_name: blob})
+
+
+def _physical_cores() -> int:
+    # Núcleos físicos quando detectável (hyperthreading costuma não ajudar em GEMM)
+    try:
+        import psutil
+        n = psutil.cpu_count(logical=False)
+        if n:
+            return n
+    except Exception:
+        pass
+    return max(1, (os.cpu_count() or 2) // 2)
+
+
+def create_backend(
+    backend: str,
+    cfg_path: str,
+    weights_path: str,
+    use_gpu: bool = False,
+    onnx_path: Optional[str] = None,
+    input_size: Tuple[int, int] = (416, 416),
+):
+    # Fábrica usada pelo YoloDetector. Para onnxruntime, exporta o .onnx a partir do
+    # cfg/weights se ainda não existir (ao lado dos pesos).
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend desconhecido: {backend} (opções: {', '.join(BACKENDS)})")
+    if backend == "onnxruntime":
+        if onnx_path is None:
+            onnx_path = default_onnx_path(weights_path, input_size)
+        if not os.path.isfile(onnx_path):
+            export_darknet_to_onnx(cfg_path, weights_path, onnx_path, input_size=input_size)
+        return OnnxRuntimeBackend(onnx_path, use_gpu=use_gpu)
+    return OpenCVBackend(cfg_path, weights_path, backend=backend, use_gpu=use_gpu)
+
+
+def optimized_model_path(onnx_path: str, ort_version: Optional[str] = None) -> str:
+    # Arquivo do grafo otimizado pelo onnxruntime, ao lado do .onnx (um por versão do ORT)
+    if ort_version is None:
+        try:
+            import onnxruntime as ort
+            ort_version = ort.__version__
+        except ImportError:
+            ort_version = "na"
+    return f"{os.path.splitext(onnx_path)[0]}.ort-{ort_version}.onnx"
+
+
+def default_onnx_path(weights_path: str, input_size: Tuple[int, int] = (416, 416)) -> str:
+    base = os.path.splitext(weights_path)[0]
+    return f"{base}-{input_size[0]}x{input_size[1]}.onnx"
+
+
+# --- Conversão Darknet -> ONNX ----------------------------------------------------------------
+
+def parse_darknet_cfg(cfg_path: str) -> List[Tuple[str, Dict[str, str]]]:
+    # Lê o .cfg em uma lista de (tipo_da_seção, opções)
+    sections: List[Tuple[str, Dict[str, str]]] = []
+    with open(cfg_path, "r", encoding="utf-8") as f:
+        for raw in f:
+            line = raw.split("#", 1)[0].strip()
+            if not line:
+                continue
+            if line.startswith("[") and line.endswith("]"):
+                sections.append((line[1:-1].strip(), {}))
+            elif "=" in line and sections:
+                key, value = line.split("=", 1)
+                sections[-1][1][key.strip()] = value.strip()
+    return sections
+
+
+def _read_darknet_weights(weights_path: str) -> np.ndarray:
+    with open(weights_path, "rb") as f:
+        major, minor, _ = np.frombuffer(f.read(12), dtype=np.int32)
+        # Contador de imagens vistas: int64 a partir da versão 0.2
+        f.read(8 if (major * 10 + minor) >= 2 and major < 1000 and minor < 1000 else 4)
+        return np.frombuffer(f.read(), dtype=np.float32)
+
+
+def export_darknet_to_onnx(
+    cfg_path: str,
+    weights_path: str,
+    onnx_path: str,
+    input_size: Tuple[int, int] = (416, 416),
+    opset: int = 13,
+) -> str:
+    # Converte cfg/weights Darknet (camadas usadas pelo YOLOv3/YOLOv3-tiny: convolutional com ou
+    # sem batchnorm, maxpool, route, shortcut, upsample, yolo) para ONNX. O batchnorm é fundido na
+    # convolução e cada [yolo] é decodificada no grafo para o mesmo formato de saída do OpenCV:
+    # (N, H*W*âncoras, 5 + classes) com [cx, cy, w, h] normalizados, objectness e scores * objectness.
+    try:
+        import onnx
+        from onnx import helper, numpy_helper, TensorProto
+    except ImportError as e:
+        raise ImportError("Conversão para ONNX requer o pacote onnx (pip install onnx)") from e
+
+    sections = parse_darknet_cfg(cfg_path)
+    if not sections or sections[0][0] not in ("net", "network"):
+        raise ValueError(f"CFG sem seção [net]: {cfg_path}")
+    net_opts = sections[0][1]
+    in_w, in_h = input_size
+    in_c = int(net_opts.get("channels", 3))
+    weights = _read_darknet_weights(weights_path)
+    ptr = 0
+
+    nodes = []
+    inits = []
+    outputs = []
+    counter = [0]
+
+    def name(prefix: str) -> str:
+        counter[0] += 1
+        return f"{prefix}_{counter[0]}"
+
+    def const(arr: np.ndarray, prefix: str = "const") -> str:
+        n = name(prefix)
+        inits.append(numpy_helper.from_array(np.ascontiguousarray(arr), n))
+        return n
+
+    def take(count: int) -> np.ndarray:
+        nonlocal ptr
+        if ptr + count > weights.size:
+            raise ValueError("Arquivo de pesos menor do que o esperado pelo cfg")
+        arr = weights[ptr:ptr + count]
+        ptr += count
+        return arr
+
+    def activation(x: str, act: str) -> str:
+        if act == "linear":
+            return x
+        out = name(act)
+        if act == "leaky":
+            nodes.append(helper.make_node("LeakyRelu", [x], [out], alpha=0.1))
+        elif act == "relu":
+            nodes.append(helper.make_node("Relu", [x], [out]))
+        elif act == "logistic":
+            nodes.append(helper.make_node("Sigmoid", [x], [out]))
+        else:
+            raise ValueError(f"Ativação não suportada na exportação: {act}")
+        return out
+
+    def sl(x: str, start: int, end: int) -> str:
+        out = name("slice")
+        nodes.append(helper.make_node("Slice", [x, const(np.array([start], np.int64)), const(np.array([end], np.int64)),
+                                              const(np.array([-1], np.int64))], [out]))
+        return out
+
+    def binop(op: str, a: str, b: str) -> str:
+        out = name(op.lower())
+        nodes.append(helper.make_node(op, [a, b], [out]))
+        return out
+
+    def unop(op: str, a: str) -> str:
+        out = name(op.lower())
+        nodes.append(helper.make_node(op, [a], [out]))
+        return out
+
+    layer_out: List[str] = []
+    layer_ch: List[int] = []
+    layer_hw: List[Tuple[int, int]] = []
+    x, c, h, w = "images", in_c, in_h, in_w
+
+    for kind, opts in sections[1:]:
+        if kind == "convolutional":
+            filters = int(opts["filters"])
+            size = int(opts.get("size", 1))
+            stride = int(opts.get("stride", 1))
+            pad = size // 2 if int(opts.get("pad", 0)) else int(opts.get("padding", 0))
+            groups = int(opts.get("groups", 1))
+            bn = int(opts.get("batch_normalize", 0))
+            if bn:
+                beta = take(filters)
+                gamma = take(filters)
+                mean = take(filters)
+                var = take(filters)
+            else:
+                bias = take(filters)
+            kernel = take(filters * (c // groups) * size * size).reshape(filters, c // groups, size, size)
+            if bn:
+                scale = gamma / np.sqrt(var + 1e-6)
+                kernel = kernel * scale[:, None, None, None]
+                bias = beta - mean * scale
+            out = name("conv")
+            nodes.append(helper.make_node(
+                "Conv", [x, const(kernel.astype(np.float32), "W"), const(bias.astype(np.float32), "B")], [out],
+                kernel_shape=[size, size], strides=[stride, stride], pads=[pad, pad, pad, pad], group=groups,
+            ))
+            x = activation(out, opts.get("activation", "linear"))
+            c = filters
+            h = (h + 2 * pad - size) // stride + 1
+            w = (w + 2 * pad - size) // stride + 1
+        elif kind == "maxpool":
+            size = int(opts.get("size", opts.get("stride", 1)))
+            stride = int(opts.get("stride", 1))
+            # Darknet: padding total = size - 1, distribuído como no código original (início = pad // 2)
+            total = int(opts.get("padding", size - 1))
+            pb, pe = total // 2, total - total // 2
+            out = name("maxpool")
+            nodes.append(helper.make_node("MaxPool", [x], [out], kernel_shape=[size, size],
+                                          strides=[stride, stride], pads=[pb, pb, pe, pe]))
+            x = out
+            h = (h + total - size) // stride + 1
+            w = (w + total - size) // stride + 1
+        elif kind == "upsample":
+            stride = int(opts.get("stride", 2))
+            out = name("upsample")
+            nodes.append(helper.make_node("Resize", [x, "", const(np.array([1, 1, stride, stride], np.float32))], [out],
+                                          mode="nearest"))
+            x = out
+            h, w = h * stride, w * stride
+        elif kind == "route":
+            if "groups" in opts or "group_id" in opts:
+                raise ValueError("Camada Darknet não suportada na exportação: [route] com groups/group_id")
+            idx = len(layer_out)
+            refs = [int(v) for v in opts["layers"].split(",")]
+            refs = [r if r >= 0 else idx + r for r in refs]
+            if len(refs) == 1:
+                x = layer_out[refs[0]]
+            else:
+                out = name("route")
+                nodes.append(helper.make_node("Concat", [layer_out[r] for r in refs], [out], axis=1))
+                x = out
+            c = sum(layer_ch[r] for r in refs)
+            h, w = layer_hw[refs[0]]
+        elif kind == "shortcut":
+            ref = int(opts["from"])
+            ref = ref if ref >= 0 else len(layer_out) + ref
+            x = activation(binop("Add", x, layer_out[ref]), opts.get("activation", "linear"))
+        elif kind == "yolo":
+            classes = int(opts["classes"])
+            mask = [int(v) for v in opts["mask"].split(",")]
+            anchors = np.array([float(v) for v in opts["anchors"].split(",")], dtype=np.float32).reshape(-1, 2)[mask]
+            na = len(mask)
+            scale_xy = float(opts.get("scale_x_y", 1.0))
+            ch = 5 + classes
+            # (N, A*(5+C), H, W) -> (N, H*W*A, 5+C): ordem de linhas igual à do OpenCV (y, x, âncora)
+            r = name("yolo_reshape")
+            nodes.append(helper.make_node("Reshape", [x, const(np.array([-1, na, ch, h, w], np.int64))], [r]))
+            t = name("yolo_transpose")
+            nodes.append(helper.make_node("Transpose", [r], [t], perm=[0, 3, 4, 1, 2]))
+            rows = name("yolo_rows")
+            nodes.append(helper.make_node("Reshape", [t, const(np.array([-1, h * w * na, ch], np.int64))], [rows]))
+            gy, gx, ga = np.meshgrid(np.arange(h), np.arange(w), np.arange(na), indexing="ij")
+            col = gx.reshape(1, -1, 1).astype(np.float32)
+            row = gy.reshape(1, -1, 1).astype(np.float32)
+            aw = (anchors[ga.reshape(-1), 0] / in_w).reshape(1, -1, 1).astype(np.float32)
+            ah = (anchors[ga.reshape(-1), 1] / in_h).reshape(1, -1, 1).astype(np.float32)
+            sxy = unop("Sigmoid", sl(rows, 0, 2))
+            if scale_xy != 1.0:
+                sxy = binop("Sub", binop("Mul", sxy, const(np.array(scale_xy, np.float32))),
+                            const(np.array((scale_xy - 1) / 2, np.float32)))
+            grid = np.concatenate([col, row], axis=-1)
+            xy = binop("Div", binop("Add", sxy, const(grid)), const(np.array([w, h], np.float32)))
+            wh = binop("Mul", unop("Exp", sl(rows, 2, 4)), const(np.concatenate([aw, ah], axis=-1)))
+            obj = unop("Sigmoid", sl(rows, 4, 5))
+            cls = binop("Mul", unop("Sigmoid", sl(rows, 5, ch)), obj)
+            # Como o OpenCV (thresh da camada, padrão 0.2), scores <= thresh saem zerados
+            thresh = const(np.array(float(opts.get("thresh", 0.2)), np.float32))
+            cls_out = name("yolo_cls")
+            nodes.append(helper.make_node("Where", [binop("Greater", cls, thresh), cls,
+                                                    const(np.array(0.0, np.float32))], [cls_out]))
+            cls = cls_out
+            out = f"yolo_{len(outputs)}"
+            nodes.append(helper.make_node("Concat", [xy, wh, obj, cls], [out], axis=-1))
+            outputs.append(helper.make_tensor_value_info(out, TensorProto.FLOAT, ["N", h * w * na, ch]))
+        else:
+            raise ValueError(f"Camada Darknet não suportada na exportação: [{kind}]")
+        layer_out.append(x)
+        layer_ch.append(c)
+        layer_hw.append((h, w))
+
+    if ptr != weights.size:
+        raise ValueError(f"Pesos não consumidos por completo ({weights.size - ptr} floats restantes)")
+    graph = helper.make_graph(
+        nodes, "darknet_yolo",
+        [helper.make_tensor_value_info("images", TensorProto.FLOAT, ["N", in_c, in_h, in_w])],
+        outputs, initializer=inits,
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", opset)], producer_name="yolo_backends")
+    # IR 8 (opset 13+) é aceito por qualquer onnxruntime recente; o padrão do pacote onnx pode ser mais novo
+    model.ir_version = 8
+    onnx.checker.check_model(model)
+    os.makedirs(os.path.dirname(os.path.abspath(onnx_path)), exist_ok=True)
+    # Escrita atômica: vários processos (ex.: workers do yolo_pool) podem exportar ao mesmo tempo
+    tmp_path = f"{onnx_path}.{os.getpid()}.tmp"
+    onnx.save(model, tmp_path)
+    os.replace(tmp_path, onnx_path)
+    return onnx_path
+
+
+def compare_backends(detectors: Dict[str, "object"], images: List[np.ndarray],
+                     input_size: Tuple[int, int] = (416, 416), iou_threshold: float = 0.9) -> Dict[str, Dict]:
+    # Paridade entre backends: compara as saídas brutas e as detecções de cada backend com o primeiro.
+    # Valores NaN/inf não entram na diferença máxima (max() com NaN a esconderia) e são contados à parte.
+    from yolo_tracker import iou_matrix
+
+    names = list(detectors)
+    ref_name = names[0]
+    ref = detectors[ref_name]
+    report: Dict[str, Dict] = {}
+    for other_name in names[1:]:
+        other = detectors[other_name]
+        max_abs = 0.0
+        nonfinite = 0
+        matched = total = 0
+        for img in images:
+            blob = cv2.dnn.blobFromImage(img, 1 / 255.0, input_size, swapRB=True, crop=False)
+            for a, b in zip(ref.forward(blob), other.forward(blob)):
+                a = np.asarray(a).reshape(-1, a.shape[-1])
+                b = np.asarray(b).reshape(-1, b.shape[-1])
+                finite = np.isfinite(a) & np.isfinite(b)
+                nonfinite += int(finite.size - np.count_nonzero(finite))
+                if finite.any():
+                    max_abs = max(max_abs, float(np.abs(a[finite] - b[finite]).max()))
+            da = ref.detect(img, input_size=input_size)
+            db = other.detect(img, input_size=input_size)
+            total += max(len(da), len(db))
+            if da and db:
+                ious = iou_matrix(np.array([d["box"] for d in da]), np.array([d["box"] for d in db]))
+                same = np.array([d["class_id"] for d in da])[:, None] == np.array([d["class_id"] for d in db])[None, :]
+                matched += int(((ious >= iou_threshold) & same).any(axis=1).sum())
+        report[f"{ref_name} vs {other_name}"] = {
+            "max_abs_output_diff": max_abs,
+            "nonfinite_outputs": nonfinite,
+            "matched_detections": matched,
+            "total_detections": total,
+        }
+    return report
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Backends de inferência: exportação Darknet -> ONNX e paridade")
+    sub = parser.add_subparsers(dest="command", required=True)
+    exp = sub.add_parser("export", help="Converte cfg/weights Darknet para ONNX")
+    exp.add_argument("--cfg", required=True)
+    exp.add_argument("--weights", required=True)
+    exp.add_argument("--out", default=None, help="Arquivo .onnx de saída (default: ao lado dos pesos)")
+    exp.add_argument("--input-size", type=str, default="416x416")
+    par = sub.add_parser("parity", help="Compara detecções entre backends")
+    par.add_argument("--cfg", required=True)
+    par.add_argument("--weights", required=True)
+    par.add_argument("--names", required=True)
+    par.add_argument("--backends", type=str, default="opencv,onnxruntime")
+    par.add_argument("--input-size", type=str, default="416x416")
+    par.add_argument("--images", nargs="*", default=[], help="Imagens de teste (default: frames sintéticos)")
+    par.add_argument("--conf", type=float, default=0.25)
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    w_str, h_str = args.input_size.lower().split("x")
+    input_size = (int(w_str), int(h_str))
+    if args.command == "export":
+        out = args.out or default_onnx_path(args.weights, input_size)
+        export_darknet_to_onnx(args.cfg, args.weights, out, input_size=input_size)
+        print(f"Modelo ONNX gravado em {out}")
+        return 0
+
+    from yolo_inference import YoloDetector
+
+    detectors = {
+        name: YoloDetector(args.cfg, args.weights, args.names, conf_threshold=args.conf, backend=name,
+                           input_size=input_size)
+        for name in args.backends.split(",")
+    }
+    if args.images:
+        images = [cv2.imread(p) for p in args.images]
+    else:
+        from yolo_benchmark import synthetic_frame
+        images = [synthetic_frame(640, 480, seed=i) for i in range(4)]
+    ok = True
+    for pair, r in compare_backends(detectors, images, input_size).items():
+        print(f"{pair}: diferença máx. nas saídas {r['max_abs_output_diff']:.2e}; "
+              f"{r['matched_detections']}/{r['total_detections']} detecções equivalentes")
+        if r["nonfinite_outputs"]:
+            print(f"  {r['nonfinite_outputs']} valores NaN/inf nas saídas (excluídos da diferença máxima)")
+            ok = False
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,471 @@
+import os
+import sys
+import glob
+import json
+import time
+import queue
+import argparse
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from yolo_backends import BACKENDS
+from yolo_inference import build_detector_from_env, YoloDetector
+from yolo_results import Detections
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp"}
+VIDEO_EXTS = {".mp4", ".avi", ".mov", ".mkv", ".m4v", ".webm", ".mpg", ".mpeg"}
+
+# Item do stream de frames: (arquivo de origem, índice do frame na origem, índice global, frame BGR)
+FrameItem = Tuple[str, int, int, np.ndarray]
+
+
+def expand_inputs(inputs: Iterable[str]) -> List[str]:
+    # Resolve arquivos, diretórios e globs em uma lista ordenada e determinística de arquivos de mídia
+    paths: List[str] = []
+    for item in inputs:
+        if os.path.isdir(item):
+            candidates = sorted(os.path.join(item, f) for f in os.listdir(item))
+        elif any(ch in item for ch in "*?["):
+            candidates = sorted(glob.glob(item, recursive=True))
+        else:
+            if not os.path.isfile(item):
+                raise FileNotFoundError(f"Entrada não encontrada: {item}")
+            candidates = [item]
+        for path in candidates:
+            ext = os.path.splitext(path)[1].lower()
+            if os.path.isfile(path) and (ext in IMAGE_EXTS or ext in VIDEO_EXTS):
+                paths.append(path)
+    return paths
+
+
+def _is_video(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in VIDEO_EXTS
+
+
+def iter_frames(
+    paths: List[str],
+    start: int = 0,
+    stride: int = 1,
+    resume: Optional[Tuple[str, int, int]] = None,
+) -> Iterator[FrameItem]:
+    # Gera frames de todas as entradas em sequência, um por vez (memória constante).
+    # Frames antes de `start` e fora do stride são pulados sem converter (grab em vídeo); os índices
+    # contam os frames realmente lidos, não CAP_PROP_FRAME_COUNT (que é só uma estimativa do container).
+    # resume=(origem, frame local, índice global) de um registro já gravado: as origens anteriores nem
+    # são abertas e a contagem recomeça do início dessa origem, com os mesmos índices de uma execução nova.
+    global_idx = 0
+    if resume is not None:
+        source, local_idx, last_idx = resume
+        if source not in paths:
+            raise ValueError(f"Origem do último registro não está nas entradas: {source}")
+        paths = paths[paths.index(source):]
+        global_idx = last_idx - local_idx
+        start = max(start, last_idx + stride)
+    for path in paths:
+        if not _is_video(path):
+            if global_idx >= start and (global_idx - start) % stride == 0:
+                frame = cv2.imread(path, cv2.IMREAD_COLOR)
+                if frame is None:
+                    print(f"Aviso: não foi possível ler {path}. Pulando.")
+                else:
+                    yield path, 0, global_idx, frame
+            global_idx += 1
+            continue
+
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            print(f"Aviso: não foi possível abrir {path}. Pulando.")
+            continue
+        try:
+            local_idx = 0
+            while True:
+                wanted = global_idx >= start and (global_idx - start) % stride == 0
+                if wanted:
+                    ret, frame = cap.read()
+                else:
+                    ret, frame = cap.grab(), None
+                if not ret:
+                    break
+                if wanted:
+                    yield path, local_idx, global_idx, frame
+                local_idx += 1
+                global_idx += 1
+        finally:
+            cap.release()
+
+
+def prefetch(iterable: Iterable, size: int = 8) -> Iterator:
+    # Decodifica à frente em uma thread, com fila limitada (no máximo `size` frames em memória)
+    if size <= 0:
+        yield from iterable
+        return
+    q: "queue.Queue" = queue.Queue(maxsize=size)
+    sentinel = object()
+    stop = threading.Event()
+    error: List[BaseException] = []
+
+    def producer() -> None:
+        try:
+            for item in iterable:
+                while not stop.is_set():
+                    try:
+                        q.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+        except BaseException as e:
+            error.append(e)
+        finally:
+            q.put(sentinel)
+
+    t = threading.Thread(target=producer, name="prefetch", daemon=True)
+    t.start()
+    try:
+        while True:
+            item = q.get()
+            if item is sentinel:
+                break
+            yield item
+        if error:
+            raise error[0]
+    finally:
+        stop.set()
+        # Drena para liberar o produtor caso esteja bloqueado em put()
+        while t.is_alive():
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                t.join(timeout=0.05)
+
+
+def batched(iterable: Iterable, n: int) -> Iterator[List]:
+    # Agrupa o stream em listas de até n itens
+    batch: List = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= n:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def truncate_partial_line(path: str) -> None:
+    # Remove uma última linha incompleta (execução interrompida no meio da escrita), cortando o
+    # arquivo logo após o último '\n'; sem isso o próximo registro seria colado nela
+    if not os.path.isfile(path):
+        return
+    with open(path, "r+b") as f:
+        f.seek(0, os.SEEK_END)
+        end = pos = f.tell()
+        while pos > 0:
+            step = min(4096, pos)
+            pos -= step
+            f.seek(pos)
+            nl = f.read(step).rfind(b"\n")
+            if nl >= 0:
+                if pos + nl + 1 < end:
+                    f.truncate(pos + nl + 1)
+                return
+        f.truncate(0)
+
+
+class JsonlWriter:
+    # Escreve um registro JSON por frame, com flush incremental
+    def __init__(self, path: str, append: bool = False):
+        if append:
+            truncate_partial_line(path)
+        self._f = open(path, "a" if append else "w", encoding="utf-8")
+
+    def write(self, record: Dict) -> None:
+        self._f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def flush(self) -> None:
+        self._f.flush()
+
+    def close(self) -> None:
+        self._f.close()
+
+
+class ParquetWriter:
+    # Escreve detecções em Parquet (uma linha por detecção) em row groups de tamanho fixo.
+    # Aceita detecções em Detections (colunar): as colunas são estendidas direto dos arrays.
+    columnar = True
+
+    def __init__(self, path: str, row_group_size: int = 10000):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Saída Parquet requer pyarrow (pip install pyarrow)") from e
+        self._pa = pa
+        self._schema = pa.schema([
+            ("source", pa.string()),
+            ("frame", pa.int64()),
+            ("index", pa.int64()),
+            ("class_id", pa.int32()),
+            ("class_name", pa.string()),
+            ("confidence", pa.float32()),
+            ("x", pa.int32()),
+            ("y", pa.int32()),
+            ("w", pa.int32()),
+            ("h", pa.int32()),
+        ])
+        self._writer = pq.ParquetWriter(path, self._schema)
+        self._row_group_size = row_group_size
+        self._rows: Dict[str, List] = {name: [] for name in self._schema.names}
+
+    def write(self, record: Dict) -> None:
+        dets = record["detections"]
+        if isinstance(dets, Detections):
+            n = len(dets)
+            rows = self._rows
+            rows["source"].extend([record["source"]] * n)
+            rows["frame"].extend([record["frame"]] * n)
+            rows["index"].extend([record["index"]] * n)
+            rows["class_id"].extend(dets.class_ids.tolist())
+            rows["class_name"].extend(dets.class_names)
+            rows["confidence"].extend(dets.scores.tolist())
+            for name, column in zip(("x", "y", "w", "h"), dets.boxes.T):
+                rows[name].extend(column.tolist())
+            dets = []
+        for det in dets:
+            x, y, w, h = det["box"]
+            values = (record["source"], record["frame"], record["index"], det["class_id"],
+                      det["class_name"], det["confidence"], x, y, w, h)
+            for name, value in zip(self._schema.names, values):
+                self._rows[name].append(value)
+        if len(self._rows["source"]) >= self._row_group_size:
+            self._write_row_group()
+
+    def _write_row_group(self) -> None:
+        if not self._rows["source"]:
+            return
+        table = self._pa.Table.from_pydict(self._rows, schema=self._schema)
+        self._writer.write_table(table)
+        self._rows = {name: [] for name in self._schema.names}
+
+    def flush(self) -> None:
+        # Row groups são gravados quando completos; evita grupos minúsculos a cada lote
+        pass
+
+    def close(self) -> None:
+        self._write_row_group()
+        self._writer.close()
+
+
+def last_jsonl_record(path: str, chunk_size: int = 4096) -> Optional[Dict]:
+    # Último registro completo = última linha terminada em '\n' (uma linha final sem '\n' é escrita
+    # interrompida, descartada por truncate_partial_line). Lê o arquivo de trás para frente em blocos
+    # até ter essa linha inteira, qualquer que seja o tamanho dos registros.
+    if not os.path.isfile(path):
+        return None
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        tail = b""
+        while pos > 0:
+            step = min(chunk_size, pos)
+            pos -= step
+            f.seek(pos)
+            tail = f.read(step) + tail
+            complete = tail[: tail.rfind(b"\n") + 1].rstrip()
+            if not complete:
+                continue
+            start = complete.rfind(b"\n")
+            if start < 0 and pos > 0:
+                # O início da linha ainda não foi lido
+                continue
+            line = complete[start + 1:]
+            try:
+                return json.loads(line)
+            except ValueError:
+                raise ValueError(f"Último registro de {path} não é JSON válido") from None
+    return None
+
+
+def last_jsonl_index(path: str) -> Optional[int]:
+    # Último índice global processado (None se não houver registro completo)
+    record = last_jsonl_record(path)
+    return int(record["index"]) if record is not None else None
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Detecção YOLO em lote sobre vídeos, imagens, diretórios ou globs")
+    parser.add_argument("inputs", nargs="+", help="Arquivos de vídeo/imagem, diretórios ou globs (ex: 'dados/*.jpg')")
+    parser.add_argument("--output", type=str, required=True, help="Arquivo de saída (.jsonl ou .parquet)")
+    parser.add_argument("--format", type=str, choices=["jsonl", "parquet"], default=None,
+                        help="Formato de saída (default: inferido pela extensão)")
+    parser.add_argument("--video-out", type=str, default=None, help="Grava vídeo anotado neste caminho (opcional)")
+    parser.add_argument("--video-fps", type=float, default=25.0, help="FPS do vídeo anotado")
+    parser.add_argument("--stride", type=int, default=1, help="Processa 1 a cada N frames")
+    parser.add_argument("--start", type=int, default=0, help="Índice global do primeiro frame a processar")
+    parser.add_argument("--resume", action="store_true",
+                        help="Retoma após o último frame presente no .jsonl de saída (anexa ao arquivo)")
+    parser.add_argument("--batch-size", type=int, default=1, help="Frames por forward (usa detect_batch)")
+    parser.add_argument("--prefetch", type=int, default=8, help="Frames decodificados à frente (0 desativa)")
+    parser.add_argument("--input-size", type=str, default="416x416", help="Tamanho de entrada da rede, ex: 416x416")
+    parser.add_argument("--conf", type=float, default=None, help="Confiança mínima")
+    parser.add_argument("--nms", type=float, default=None, help="NMS threshold")
+    parser.add_argument("--gpu", action="store_true", help="Usar CUDA (se disponível)")
+    parser.add_argument("--backend", type=str, choices=BACKENDS, default=None,
+                        help="Backend de inferência (default: YOLO_BACKEND do .env ou opencv)")
+    parser.add_argument("--cfg", type=str, default=None, help="Caminho para .cfg (sobrepõe .env)")
+    parser.add_argument("--weights", type=str, default=None, help="Caminho para .weights (sobrepõe .env)")
+    parser.add_argument("--names", type=str, default=None, help="Caminho para .names (sobrepõe .env)")
+    parser.add_argument("--log-every", type=int, default=500, help="Imprime progresso a cada N frames (0 desativa)")
+    return parser.parse_args()
+
+
+def make_detector(args: argparse.Namespace, input_size: Tuple[int, int] = (416, 416)) -> YoloDetector:
+    # Mesmo critério do yolo_realtime: caminhos explícitos têm prioridade sobre .env/fallback
+    if args.cfg and args.weights and args.names:
+        return YoloDetector(
+            cfg_path=args.cfg,
+            weights_path=args.weights,
+            names_path=args.names,
+            conf_threshold=args.conf if args.conf is not None else 0.5,
+            nms_threshold=args.nms if args.nms is not None else 0.4,
+            use_gpu=args.gpu,
+            backend=args.backend or "opencv",
+            input_size=input_size,
+        )
+    return build_detector_from_env(conf_threshold=args.conf, nms_threshold=args.nms, use_gpu=args.gpu,
+                                   backend=args.backend, input_size=input_size)
+
+
+def run_batch(
+    detector: YoloDetector,
+    paths: List[str],
+    writer,
+    input_size: Tuple[int, int] = (416, 416),
+    start: int = 0,
+    stride: int = 1,
+    resume: Optional[Tuple[str, int, int]] = None,
+    batch_size: int = 1,
+    prefetch_size: int = 8,
+    video_out: Optional[str] = None,
+    video_fps: float = 25.0,
+    log_every: int = 0,
+) -> Dict[str, float]:
+    # Pipeline em streaming: decodificação (com prefetch) -> inferência em lotes -> escrita incremental.
+    # Writers com columnar=True recebem Detections (sem um dict por box).
+    columnar = getattr(writer, "columnar", False)
+    stride = max(1, stride)
+    frames = 0
+    total_dets = 0
+    infer_s = 0.0
+    video_writer = None
+    video_size: Optional[Tuple[int, int]] = None
+    t_start = time.perf_counter()
+    try:
+        for batch in batched(prefetch(iter_frames(paths, start, stride, resume), prefetch_size), max(1, batch_size)):
+            t0 = time.perf_counter()
+            if len(batch) == 1:
+                results = [detector.detect(batch[0][3], input_size=input_size, columnar=columnar)]
+            else:
+                results = detector.detect_batch([item[3] for item in batch], input_size=input_size,
+                                                columnar=columnar)
+            infer_s += time.perf_counter() - t0
+            for (source, local_idx, global_idx, frame), detections in zip(batch, results):
+                writer.write({"source": source, "frame": local_idx, "index": global_idx, "detections": detections
+                              if columnar else [{**d, "box": list(d["box"])} for d in detections]})
+                if video_out:
+                    annotated = detector.draw(frame, detections, in_place=True)
+                    if video_writer is None:
+                        video_size = (annotated.shape[1], annotated.shape[0])
+                        fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+                        video_writer = cv2.VideoWriter(video_out, fourcc, video_fps, video_size)
+                    if (annotated.shape[1], annotated.shape[0]) != video_size:
+                        annotated = cv2.resize(annotated, video_size)
+                    video_writer.write(annotated)
+                frames += 1
+                total_dets += len(detections)
+                if log_every and frames % log_every == 0:
+                    elapsed = time.perf_counter() - t_start
+                    print(f"{frames} frames ({frames / elapsed:.1f} FPS), último índice {global_idx}")
+            writer.flush()
+    finally:
+        if video_writer is not None:
+            video_writer.release()
+    elapsed = time.perf_counter() - t_start
+    return {
+        "frames": frames,
+        "detections": total_dets,
+        "elapsed_s": elapsed,
+        "fps": frames / elapsed if elapsed > 0 else 0.0,
+        "inference_fps": frames / infer_s if infer_s > 0 else 0.0,
+    }
+
+
+def main() -> int:
+    args = parse_args()
+    fmt = args.format or ("parquet" if args.output.lower().endswith(".parquet") else "jsonl")
+    try:
+        w_str, h_str = args.input_size.lower().split("x")
+        input_size = (int(w_str), int(h_str))
+    except Exception:
+        input_size = (416, 416)
+
+    resume: Optional[Tuple[str, int, int]] = None
+    if args.resume:
+        if fmt != "jsonl":
+            print("--resume só é suportado com saída .jsonl")
+            return 2
+        try:
+            last = last_jsonl_record(args.output)
+        except ValueError as e:
+            print(f"--resume: {e}")
+            return 2
+        if last is not None:
+            # Continua da posição gravada (origem + frame local), um stride após o último índice
+            resume = (last["source"], int(last["frame"]), int(last["index"]))
+            print(f"Retomando após {last['source']} frame {last['frame']} (índice global {last['index']})")
+
+    try:
+        paths = expand_inputs(args.inputs)
+    except FileNotFoundError as e:
+        print(e)
+        return 2
+    if not paths:
+        print("Nenhum arquivo de imagem/vídeo encontrado nas entradas")
+        return 2
+    if resume is not None and resume[0] not in paths:
+        print(f"--resume: a origem do último registro ({resume[0]}) não está nas entradas")
+        return 2
+
+    try:
+        detector = make_detector(args, input_size)
+        detector.warmup(input_size, batch_size=max(1, args.batch_size))
+    except Exception as e:
+        print(f"Erro ao inicializar o detector: {e}")
+        return 2
+
+    if fmt == "parquet":
+        writer = ParquetWriter(args.output)
+    else:
+        writer = JsonlWriter(args.output, append=args.resume)
+    try:
+        summary = run_batch(
+            detector, paths, writer,
+            input_size=input_size, start=args.start, stride=args.stride, resume=resume, batch_size=args.batch_size,
+            prefetch_size=args.prefetch, video_out=args.video_out, video_fps=args.video_fps,
+            log_every=args.log_every,
+        )
+    finally:
+        writer.close()
+
+    print(
+        f"Concluído: {summary['frames']} frames, {summary['detections']} detecções em {summary['elapsed_s']:.2f}s "
+        f"({summary['fps']:.1f} FPS fim-a-fim, {summary['inference_fps']:.1f} FPS de inferência)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
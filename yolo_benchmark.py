@@ -0,0 +1,448 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import tracemalloc
+import cv2
+import numpy as np
+from typing import Callable, List, Tuple, Dict, Optional
+
+from yolo_backends import BACKENDS
+from yolo_inference import YoloDetector, _decode_outputs
+
+# Tamanhos padrão de frame (largura, altura) e de entrada da rede usados na suíte
+DEFAULT_RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080)]
+DEFAULT_INPUT_SIZES = [320, 416, 608]
+TINY_CLASSES = ['car', 'motorbike', 'threewheel', 'van', 'bus', 'truck']
+
+
+def _decode_outputs_loop(
+    layer_outputs: List[np.ndarray],
+    img_w: int,
+    img_h: int,
+    conf_threshold: float,
+) -> Tuple[List[List[int]], List[float], List[int]]:
+    # Implementação de referência (loop Python por âncora) usada antes da versão vetorizada
+    boxes: List[List[int]] = []
+    confidences: List[float] = []
+    class_ids: List[int] = []
+    for output in layer_outputs:
+        for detection in output:
+            scores = detection[5:]
+            class_id = int(np.argmax(scores))
+            confidence = float(scores[class_id])
+            if confidence >= conf_threshold:
+                center_x = int(detection[0] * img_w)
+                center_y = int(detection[1] * img_h)
+                width = int(detection[2] * img_w)
+                height = int(detection[3] * img_h)
+                x = int(center_x - width / 2)
+                y = int(center_y - height / 2)
+                boxes.append([x, y, width, height])
+                confidences.append(confidence)
+                class_ids.append(class_id)
+    return boxes, confidences, class_ids
+
+
+def synthetic_layer_outputs(
+    input_size: int = 416,
+    num_classes: int = 80,
+    seed: int = 0,
+) -> List[np.ndarray]:
+    # Gera saídas no formato do YOLOv3-tiny (3 âncoras por célula em strides 32 e 16)
+    rng = np.random.default_rng(seed)
+    outputs = []
+    for stride in (32, 16):
+        grid = input_size // stride
+        rows = grid * grid * 3
+        out = rng.random((rows, 5 + num_classes), dtype=np.float32)
+        # Scores esparsos como em frames reais: a maioria das âncoras fica abaixo do threshold
+        out[:, 5:] *= (rng.random((rows, 1)) < 0.05).astype(np.float32)
+        outputs.append(out)
+    return outputs
+
+
+def _time_call(fn, repeat: int) -> float:
+    # Retorna o tempo médio (ms) por chamada
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) * 1000.0 / repeat
+
+
+def bench_decode(
+    input_size: int = 416,
+    frame_size: Tuple[int, int] = (1280, 720),
+    conf_threshold: float = 0.5,
+    repeat: int = 50,
+) -> Dict[str, float]:
+    # Micro-benchmark do decode: loop de referência vs vetorizado
+    outputs = synthetic_layer_outputs(input_size)
+    w, h = frame_size
+    loop_ms = _time_call(lambda: _decode_outputs_loop(outputs, w, h, conf_threshold), repeat)
+    vec_ms = _time_call(lambda: _decode_outputs(outputs, w, h, conf_threshold), repeat)
+    return {
+        "input_size": input_size,
+        "rows": int(sum(len(o) for o in outputs)),
+        "loop_ms": loop_ms,
+        "vectorized_ms": vec_ms,
+        "speedup": loop_ms / vec_ms if vec_ms > 0 else float("inf"),
+    }
+
+
+def write_darknet_model(
+    out_dir: str,
+    layers: List[Tuple[str, Dict]],
+    size: int = 416,
+    classes: Optional[List[str]] = None,
+    seed: int = 0,
+    name: str = "modelo",
+    objectness_bias: Optional[float] = None,
+    weight_std: Optional[float] = None,
+) -> Tuple[str, str, str]:
+    # Gera cfg + weights aleatórios + names Darknet a partir de uma lista de (tipo, opções do .cfg).
+    # Convs com batch_normalize=1 recebem parâmetros de batchnorm; os canais são acompanhados camada
+    # a camada (route/shortcut). weight_std=None escala os kernels pelo fan-in, o que mantém as
+    # ativações estáveis em redes mais profundas; objectness_bias fixa a objectness das convs de saída.
+    classes = classes or TINY_CLASSES
+    out_filters = 3 * (5 + len(classes))
+    cfg_lines = ["[net]", "batch=1", "subdivisions=1", f"width={size}", f"height={size}", "channels=3", ""]
+    rng = np.random.default_rng(seed)
+    weights: List[np.ndarray] = []
+    channels: List[int] = []
+    in_ch = 3
+    for kind, opts in layers:
+        cfg_lines.append(f"[{kind}]")
+        cfg_lines += [f"{k}={v}" for k, v in opts.items()]
+        cfg_lines.append("")
+        if kind == "convolutional":
+            filters, ksize = int(opts["filters"]), int(opts["size"])
+            if int(opts.get("batch_normalize", 0)):
+                # Ordem Darknet com batchnorm: biases, scales, médias e variâncias
+                weights += [rng.normal(0.0, 0.1, filters), rng.uniform(0.5, 1.5, filters),
+                            rng.normal(0.0, 0.1, filters), rng.uniform(0.5, 1.5, filters)]
+            else:
+                # Ordem Darknet sem batchnorm: biases seguidos dos pesos do kernel
+                biases = rng.normal(0.0, 0.5, filters)
+                if objectness_bias is not None and filters == out_filters:
+                    biases[4::5 + len(classes)] = objectness_bias
+                weights.append(biases)
+            fan_in = in_ch * ksize * ksize
+            std = weight_std if weight_std is not None else 1.0 / np.sqrt(fan_in)
+            weights.append(rng.normal(0.0, std, filters * fan_in))
+            in_ch = filters
+        elif kind == "route":
+            refs = [int(v) for v in str(opts["layers"]).split(",")]
+            in_ch = sum(channels[r if r >= 0 else len(channels) + r] for r in refs)
+        channels.append(in_ch)
+
+    os.makedirs(out_dir, exist_ok=True)
+    cfg_path, weights_path, names_path = (os.path.join(out_dir, f"{name}.{ext}") for ext in ("cfg", "weights", "names"))
+    with open(cfg_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(cfg_lines))
+    with open(weights_path, "wb") as f:
+        # Cabeçalho: major, minor, revision (int32) + imagens vistas (int64 para versão >= 0.2)
+        f.write(np.array([0, 2, 0], dtype=np.int32).tobytes())
+        f.write(np.array([0], dtype=np.int64).tobytes())
+        for w in weights:
+            f.write(np.asarray(w, dtype=np.float32).tobytes())
+    with open(names_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(classes) + "\n")
+    return cfg_path, weights_path, names_path
+
+
+def write_tiny_darknet_model(
+    out_dir: str,
+    classes: Optional[List[str]] = None,
+    seed: int = 0,
+) -> Tuple[str, str, str]:
+    # Gera um modelo Darknet minúsculo (cfg + weights aleatórios + names) com a mesma
+    # estrutura de saída do YOLOv3-tiny: duas camadas [yolo] em strides 32 e 16.
+    # Serve para benchmarks e verificações offline, sem baixar o modelo real.
+    classes = classes or TINY_CLASSES
+    nc = len(classes)
+    out_filters = 3 * (5 + nc)
+    anchors = "10,14, 23,27, 37,58, 81,82, 135,169, 344,319"
+
+    def conv(filters: int, size: int, activation: str) -> Tuple[str, Dict]:
+        return ("convolutional", {"batch_normalize": 0, "filters": filters, "size": size, "stride": 1, "pad": 1,
+                                  "activation": activation})
+
+    maxpool = ("maxpool", {"size": 2, "stride": 2})
+    layers = [
+        conv(8, 3, "leaky"),
+        maxpool, maxpool, maxpool, maxpool,
+        conv(16, 3, "leaky"),
+        maxpool,
+        conv(out_filters, 1, "linear"),
+        ("yolo", {"mask": "3,4,5", "anchors": anchors, "classes": nc, "num": 6}),
+        ("route", {"layers": -4}),
+        conv(out_filters, 1, "linear"),
+        ("yolo", {"mask": "0,1,2", "anchors": anchors, "classes": nc, "num": 6}),
+    ]
+    # Objectness negativa por padrão: poucas âncoras passam do threshold, como em cenas reais
+    return write_darknet_model(out_dir, layers, size=416, classes=classes, seed=seed, name="tiny",
+                               objectness_bias=-3.0, weight_std=0.3)
+
+
+def synthetic_frame(width: int, height: int, seed: int = 0) -> np.ndarray:
+    # Frame BGR sintético: ruído de fundo com alguns retângulos sólidos
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    for _ in range(8):
+        x0, y0 = int(rng.integers(0, width - 20)), int(rng.integers(0, height - 20))
+        x1, y1 = x0 + int(rng.integers(10, width // 4)), y0 + int(rng.integers(10, height // 4))
+        color = tuple(int(c) for c in rng.integers(0, 256, 3))
+        cv2.rectangle(frame, (x0, y0), (x1, y1), color, -1)
+    return frame
+
+
+def summarize_ms(samples: List[float]) -> Dict[str, float]:
+    # Estatísticas de latência (ms) e throughput (chamadas/s) de um estágio
+    arr = np.asarray(samples, dtype=np.float64)
+    mean = float(arr.mean()) if arr.size else 0.0
+    return {
+        "n": int(arr.size),
+        "mean_ms": mean,
+        "p50_ms": float(np.percentile(arr, 50)) if arr.size else 0.0,
+        "p95_ms": float(np.percentile(arr, 95)) if arr.size else 0.0,
+        "p99_ms": float(np.percentile(arr, 99)) if arr.size else 0.0,
+        "throughput_per_s": 1000.0 / mean if mean > 0 else 0.0,
+    }
+
+
+def bench_stages(
+    detector: YoloDetector,
+    frame: np.ndarray,
+    input_size: int,
+    repeat: int = 50,
+    warmup: int = 5,
+) -> Dict[str, Dict[str, float]]:
+    # Mede isoladamente cada estágio do hot path de detect()/draw() sobre o mesmo frame; os nomes seguem
+    # yolo_metrics.STAGES (preprocess = _preprocess do detector: resize + normalização no blob)
+    h, w = frame.shape[:2]
+    size = (input_size, input_size)
+    timings: Dict[str, List[float]] = {k: [] for k in ("preprocess", "forward", "decode", "nms", "draw", "total")}
+    candidates = 0
+    kept = 0
+    for i in range(warmup + repeat):
+        t0 = time.perf_counter()
+        blob = detector._preprocess([frame], size)
+        t1 = time.perf_counter()
+        outputs = detector.forward(blob)
+        t2 = time.perf_counter()
+        boxes, confidences, class_ids = _decode_outputs(outputs, w, h, detector.conf_threshold)
+        t3 = time.perf_counter()
+        detections = detector._nms_to_detections(boxes, confidences, class_ids)
+        t4 = time.perf_counter()
+        detector.draw(frame, detections)
+        t5 = time.perf_counter()
+        if i < warmup:
+            continue
+        for name, a, b in (("preprocess", t0, t1), ("forward", t1, t2), ("decode", t2, t3),
+                           ("nms", t3, t4), ("draw", t4, t5), ("total", t0, t5)):
+            timings[name].append((b - a) * 1000.0)
+        candidates += len(boxes)
+        kept += len(detections)
+    result = {name: summarize_ms(samples) for name, samples in timings.items()}
+    result["counts"] = {
+        "candidates_per_frame": candidates / max(1, repeat),
+        "detections_per_frame": kept / max(1, repeat),
+    }
+    return result
+
+
+def _transient_bytes(fn) -> int:
+    # Pico de memória alocada (rastreada pelo tracemalloc, inclui arrays NumPy/OpenCV) durante fn()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    fn()
+    return tracemalloc.get_traced_memory()[1] - base
+
+
+def bench_allocations(
+    detector: YoloDetector,
+    frame: np.ndarray,
+    input_size: int,
+    repeat: int = 20,
+) -> Dict[str, Dict[str, float]]:
+    # Compara a alocação por frame do caminho antigo (blob novo a cada frame + draw com cópia)
+    # com o caminho sem cópias (buffers de blob reaproveitados + draw in-place).
+    # Valores em bytes por frame: média do pico transitório de cada estágio (o tracemalloc deixa a
+    # execução mais lenta, por isso os tempos ficam no bench_stages).
+    size = (input_size, input_size)
+    original_reuse = detector.reuse_buffers
+    work = frame.copy()
+    result: Dict[str, Dict[str, float]] = {}
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        for mode, reuse, in_place in (("antes", False, False), ("depois", True, True)):
+            detector.reuse_buffers = reuse
+            detector.detect(work, input_size=size)  # aloca os buffers fora da medição
+            pre, drw, total = [], [], []
+            for _ in range(repeat):
+                np.copyto(work, frame)
+                pre.append(_transient_bytes(lambda: detector._preprocess([work], size)))
+                detections = detector.detect(work, input_size=size)
+                drw.append(_transient_bytes(lambda: detector.draw(work, detections, in_place=in_place)))
+                np.copyto(work, frame)
+                total.append(_transient_bytes(
+                    lambda: detector.draw(work, detector.detect(work, input_size=size), in_place=in_place)))
+            result[mode] = {
+                "preprocess_bytes": float(np.mean(pre)),
+                "draw_bytes": float(np.mean(drw)),
+                "frame_bytes": float(np.mean(total)),
+            }
+    finally:
+        detector.reuse_buffers = original_reuse
+        if started:
+            tracemalloc.stop()
+    return result
+
+
+def environment_info() -> Dict[str, object]:
+    # Metadados para comparar execuções entre commits e máquinas
+    info: Dict[str, object] = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "opencv_threads": cv2.getNumThreads(),
+    }
+    try:
+        import subprocess
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5)
+        if commit.returncode == 0:
+            info["commit"] = commit.stdout.strip()
+    except Exception:
+        pass
+    return info
+
+
+def run_suite(
+    detector: Optional[YoloDetector],
+    resolutions: List[Tuple[int, int]],
+    input_sizes: List[int],
+    repeat: int = 50,
+    warmup: int = 5,
+    progress: Optional[Callable[[str], None]] = None,
+    detector_for_size: Optional[Callable[[int], YoloDetector]] = None,
+) -> Dict[str, object]:
+    # Executa os estágios para cada combinação resolução x tamanho de entrada.
+    # detector_for_size: para backends com entrada fixa (ONNX), um detector por tamanho.
+    runs = []
+    detectors = {size: detector_for_size(size) for size in input_sizes} if detector_for_size else {}
+    for (w, h) in resolutions:
+        frame = synthetic_frame(w, h)
+        for size in input_sizes:
+            stages = bench_stages(detectors.get(size, detector), frame, size, repeat=repeat, warmup=warmup)
+            runs.append({"resolution": [w, h], "input_size": size, "stages": stages})
+            if progress is not None:
+                progress(format_run(runs[-1]))
+    decode = [bench_decode(input_size=size, repeat=repeat) for size in input_sizes]
+    return {"environment": environment_info(), "repeat": repeat, "runs": runs, "decode_micro": decode}
+
+
+def format_run(run: Dict) -> str:
+    w, h = run["resolution"]
+    parts = []
+    for name in ("preprocess", "forward", "decode", "nms", "draw", "total"):
+        st = run["stages"][name]
+        parts.append(f"{name} p50 {st['p50_ms']:.2f}/p95 {st['p95_ms']:.2f}/p99 {st['p99_ms']:.2f} ms")
+    parts.append(f"{run['stages']['total']['throughput_per_s']:.1f} FPS")
+    return f"{w}x{h} @ {run['input_size']}: " + " | ".join(parts)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmarks do pipeline de detecção YOLO")
+    parser.add_argument("--resolutions", type=str, default=",".join(f"{w}x{h}" for w, h in DEFAULT_RESOLUTIONS),
+                        help="Resoluções de frame sintético, ex: 640x480,1280x720")
+    parser.add_argument("--input-sizes", type=str, default=",".join(str(s) for s in DEFAULT_INPUT_SIZES), help="Tamanhos de entrada, ex: 320,416,608")
+    parser.add_argument("--repeat", type=int, default=50, help="Repetições por medição")
+    parser.add_argument("--warmup", type=int, default=5, help="Iterações de aquecimento descartadas")
+    parser.add_argument("--conf", type=float, default=0.25, help="Confiança mínima")
+    parser.add_argument("--nms", type=float, default=0.4, help="NMS threshold")
+    parser.add_argument("--cfg", type=str, default=None, help="Caminho para .cfg (default: modelo sintético minúsculo)")
+    parser.add_argument("--weights", type=str, default=None, help="Caminho para .weights")
+    parser.add_argument("--names", type=str, default=None, help="Caminho para .names")
+    parser.add_argument("--backend", type=str, choices=BACKENDS,
+                        default="opencv", help="Backend de inferência medido")
+    parser.add_argument("--output", type=str, default=None, help="Grava o resultado em JSON neste arquivo")
+    parser.add_argument("--json", action="store_true", help="Imprime o JSON no stdout em vez da tabela")
+    parser.add_argument("--decode-only", action="store_true", help="Executa só o micro-benchmark do decode")
+    parser.add_argument("--alloc", action="store_true",
+                        help="Mede a alocação de memória por frame (blob novo + cópia no draw vs buffers reaproveitados)")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    sizes = [int(s) for s in args.input_sizes.split(",") if s.strip()]
+    if args.decode_only:
+        for size in sizes:
+            r = bench_decode(input_size=size, conf_threshold=args.conf, repeat=args.repeat)
+            print(
+                f"decode {size}x{size} ({r['rows']} linhas): loop {r['loop_ms']:.3f} ms | "
+                f"vetorizado {r['vectorized_ms']:.3f} ms | {r['speedup']:.1f}x"
+            )
+        return 0
+
+    resolutions = []
+    for item in args.resolutions.split(","):
+        w_str, h_str = item.lower().strip().split("x")
+        resolutions.append((int(w_str), int(h_str)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.cfg and args.weights and args.names:
+            cfg_path, weights_path, names_path = args.cfg, args.weights, args.names
+        else:
+            cfg_path, weights_path, names_path = write_tiny_darknet_model(tmp)
+
+        def make(size: int) -> YoloDetector:
+            return YoloDetector(cfg_path, weights_path, names_path, conf_threshold=args.conf, nms_threshold=args.nms,
+                                backend=args.backend, input_size=(size, size),
+                                onnx_path=os.path.join(tmp, f"model-{size}.onnx") if args.backend == "onnxruntime" else None)
+
+        model = "sintético" if cfg_path.startswith(tmp) else cfg_path
+        if not args.json:
+            print(f"Modelo: {model} | backend: {args.backend}")
+        if args.alloc:
+            for (w, h) in resolutions:
+                for size in sizes:
+                    r = bench_allocations(make(size), synthetic_frame(w, h), size, repeat=args.repeat)
+                    print(f"{w}x{h} @ {size}: " + " | ".join(
+                        f"{mode}: pico pré-proc. {v['preprocess_bytes'] / 1e6:.2f} MB, draw {v['draw_bytes'] / 1e6:.2f} MB, "
+                        f"frame completo {v['frame_bytes'] / 1e6:.2f} MB"
+                        for mode, v in r.items()))
+            return 0
+        fixed_input = args.backend == "onnxruntime"
+        result = run_suite(None if fixed_input else make(sizes[0]), resolutions, sizes, repeat=args.repeat,
+                           warmup=args.warmup, progress=None if args.json else print,
+                           detector_for_size=make if fixed_input else None)
+        result["model"] = model
+        result["backend"] = args.backend
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+    if args.json:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    else:
+        for r in result["decode_micro"]:
+            print(
+                f"decode {r['input_size']}x{r['input_size']} ({r['rows']} linhas): loop {r['loop_ms']:.3f} ms | "
+                f"vetorizado {r['vectorized_ms']:.3f} ms | {r['speedup']:.1f}x"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,290 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from yolo_eval import Sample, read_image_list, label_path_for_image, read_label_rows, rows_to_pixels
+
+# Arquivos do dataset empacotado (um diretório por split/tamanho)
+IMAGES_FILE = "images.npy"    # (N, H, W, 3) uint8, imagens BGR com letterbox
+LABELS_FILE = "labels.npy"    # (M, 5) float32, linhas YOLO normalizadas para a imagem com letterbox
+OFFSETS_FILE = "offsets.npy"  # (N + 1,) int64, labels da imagem i = labels[offsets[i]:offsets[i + 1]]
+META_FILE = "meta.npy"        # (N, 5) float32, largura e altura originais, escala, pad x, pad y
+INDEX_FILE = "index.json"     # caminhos de origem, tamanho e mtime/tamanho das fontes
+PAD_VALUE = 114
+
+
+def letterbox(
+    image: np.ndarray,
+    size: Tuple[int, int],
+    out: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, float, int, int]:
+    # Redimensiona mantendo a proporção e centraliza em um canvas (W, H) cinza.
+    # Retorna (imagem, escala, pad_x, pad_y); com out, escreve direto nele (ex.: slot do memmap).
+    w, h = size
+    ih, iw = image.shape[:2]
+    scale = min(w / iw, h / ih)
+    nw, nh = max(1, int(round(iw * scale))), max(1, int(round(ih * scale)))
+    pad_x, pad_y = (w - nw) // 2, (h - nh) // 2
+    if out is None:
+        out = np.empty((h, w, 3), dtype=np.uint8)
+    out[...] = PAD_VALUE
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+    cv2.resize(image, (nw, nh), dst=out[pad_y:pad_y + nh, pad_x:pad_x + nw], interpolation=interpolation)
+    return out, scale, pad_x, pad_y
+
+
+def letterbox_labels(rows: np.ndarray, iw: int, ih: int, scale: float, pad_x: int, pad_y: int,
+                     size: Tuple[int, int]) -> np.ndarray:
+    # Reprojeta linhas YOLO normalizadas da imagem original para a imagem com letterbox
+    w, h = size
+    out = rows.astype(np.float32, copy=True)
+    out[:, 1] = (rows[:, 1] * iw * scale + pad_x) / w
+    out[:, 2] = (rows[:, 2] * ih * scale + pad_y) / h
+    out[:, 3] = rows[:, 3] * iw * scale / w
+    out[:, 4] = rows[:, 4] * ih * scale / h
+    return out
+
+
+def _source_stats(paths: List[str]) -> List[List[int]]:
+    # (mtime_ns, tamanho) de cada imagem e do seu label (-1 se não existir)
+    stats = []
+    for path in paths:
+        entry = []
+        for p in (path, label_path_for_image(path)):
+            try:
+                st = os.stat(p)
+                entry += [st.st_mtime_ns, st.st_size]
+            except OSError:
+                entry += [-1, -1]
+        stats.append(entry)
+    return stats
+
+
+def is_up_to_date(out_dir: str, paths: List[str], size: Tuple[int, int]) -> bool:
+    # O pacote vale se as fontes, a ordem e o tamanho forem os mesmos do empacotamento
+    try:
+        with open(os.path.join(out_dir, INDEX_FILE), "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return (index.get("paths") == paths and tuple(index.get("size", ())) == tuple(size)
+            and index.get("sources") == _source_stats(paths))
+
+
+def pack_dataset(
+    paths: List[str],
+    out_dir: str,
+    size: Tuple[int, int] = (416, 416),
+    workers: int = 4,
+) -> Dict[str, float]:
+    # Decodifica cada imagem uma única vez, aplica letterbox e grava direto no slot do memmap;
+    # labels de todas as imagens vão para um único array contíguo com índice de offsets.
+    # Os arquivos são escritos em um diretório temporário e trocados no final (pacote nunca parcial).
+    w, h = size
+    n = len(paths)
+    parent = os.path.dirname(os.path.abspath(out_dir)) or "."
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".pack-", dir=parent)
+    t0 = time.perf_counter()
+    images = np.lib.format.open_memmap(os.path.join(tmp_dir, IMAGES_FILE), mode="w+", dtype=np.uint8,
+                                       shape=(n, h, w, 3))
+    meta = np.zeros((n, 5), dtype=np.float32)
+    labels: List[Optional[np.ndarray]] = [None] * n
+
+    def pack_one(i: int) -> None:
+        image = cv2.imread(paths[i])
+        if image is None:
+            raise FileNotFoundError(f"Imagem não encontrada ou inválida: {paths[i]}")
+        ih, iw = image.shape[:2]
+        _, scale, pad_x, pad_y = letterbox(image, size, out=images[i])
+        meta[i] = (iw, ih, scale, pad_x, pad_y)
+        labels[i] = letterbox_labels(read_label_rows(label_path_for_image(paths[i])), iw, ih, scale, pad_x, pad_y,
+                                     size)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="pack") as executor:
+            list(executor.map(pack_one, range(n)))
+        images.flush()
+        del images
+        counts = np.array([len(lab) for lab in labels], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        all_labels = np.concatenate(labels) if n else np.zeros((0, 5), dtype=np.float32)
+        np.save(os.path.join(tmp_dir, LABELS_FILE), all_labels.astype(np.float32))
+        np.save(os.path.join(tmp_dir, OFFSETS_FILE), offsets)
+        np.save(os.path.join(tmp_dir, META_FILE), meta)
+        with open(os.path.join(tmp_dir, INDEX_FILE), "w", encoding="utf-8") as f:
+            json.dump({"size": [w, h], "paths": paths, "sources": _source_stats(paths)}, f)
+        if os.path.isdir(out_dir):
+            old_dir = tempfile.mkdtemp(prefix=".old-", dir=parent)
+            os.replace(out_dir, os.path.join(old_dir, "pack"))
+            os.replace(tmp_dir, out_dir)
+            _remove_tree(old_dir)
+        else:
+            os.replace(tmp_dir, out_dir)
+    except BaseException:
+        _remove_tree(tmp_dir)
+        raise
+    elapsed = time.perf_counter() - t0
+    return {"images": n, "labels": int(offsets[-1]), "elapsed_s": elapsed,
+            "bytes": n * h * w * 3, "images_per_s": n / elapsed if elapsed > 0 else 0.0}
+
+
+def _remove_tree(path: str) -> None:
+    import shutil
+
+    shutil.rmtree(path, ignore_errors=True)
+
+
+class PackedDataset:
+    # Leitura do dataset empacotado via memmap: imagens e labels são views sobre os arquivos, sem
+    # decodificação. Processos que abrem o mesmo pacote compartilham as páginas do cache do SO.
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, INDEX_FILE), "r", encoding="utf-8") as f:
+            index = json.load(f)
+        self.size: Tuple[int, int] = tuple(index["size"])
+        self.paths: List[str] = index["paths"]
+        self.images = np.load(os.path.join(path, IMAGES_FILE), mmap_mode="r")
+        self.labels = np.load(os.path.join(path, LABELS_FILE), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, OFFSETS_FILE))
+        self.meta = np.load(os.path.join(path, META_FILE))
+
+    def __len__(self) -> int:
+        return len(self.images)
+
+    def __getitem__(self, i: int) -> Tuple[np.ndarray, np.ndarray]:
+        # (imagem (H, W, 3) BGR, labels (k, 5)), ambos views somente leitura
+        return self.images[i], self.labels[self.offsets[i]:self.offsets[i + 1]]
+
+    def iter_batches(
+        self,
+        batch_size: int = 16,
+        shuffle: bool = False,
+        seed: Optional[int] = None,
+    ) -> Iterator[Tuple[np.ndarray, List[np.ndarray], np.ndarray]]:
+        # Lotes no estilo dataloader: (imagens (B, H, W, 3), labels por imagem, índices).
+        # Sem shuffle cada lote é uma fatia contígua (view); com shuffle os índices de cada lote
+        # são ordenados para ler o arquivo em ordem crescente.
+        n = len(self)
+        order = np.random.default_rng(seed).permutation(n) if shuffle else np.arange(n)
+        for start in range(0, n, max(1, batch_size)):
+            idx = order[start:start + batch_size]
+            if shuffle:
+                idx = np.sort(idx)
+                images = self.images[idx]
+            else:
+                images = self.images[idx[0]:idx[-1] + 1]
+            labels = [self.labels[self.offsets[i]:self.offsets[i + 1]] for i in idx]
+            yield images, labels, idx
+
+    def samples(self, limit: int = 0) -> Iterator[Sample]:
+        # Mesmo formato de yolo_eval.iter_samples, com GT em pixels da imagem com letterbox. O IoU não
+        # muda com escala + deslocamento uniformes, mas a rede vê a imagem com bordas em vez da imagem
+        # esticada: o mAP daqui só se compara com outro mAP sobre pacotes, não com o da lista original.
+        w, h = self.size
+        n = len(self) if limit <= 0 else min(limit, len(self))
+        for i in range(n):
+            image, rows = self[i]
+            class_ids, boxes = rows_to_pixels(np.asarray(rows), w, h)
+            yield self.paths[i], image, class_ids, boxes
+
+
+def decode_pass(paths: List[str], size: Tuple[int, int]) -> Tuple[float, float]:
+    # Caminho sem cache: cv2.imread + letterbox + leitura do .txt por imagem. Retorna (s, checksum).
+    t0 = time.perf_counter()
+    total = 0.0
+    buf = np.empty((size[1], size[0], 3), dtype=np.uint8)
+    for path in paths:
+        image = cv2.imread(path)
+        ih, iw = image.shape[:2]
+        _, scale, pad_x, pad_y = letterbox(image, size, out=buf)
+        rows = letterbox_labels(read_label_rows(label_path_for_image(path)), iw, ih, scale, pad_x, pad_y, size)
+        total += float(buf.sum(dtype=np.uint64)) + float(rows.sum())
+    return time.perf_counter() - t0, total
+
+
+def mmap_pass(dataset: PackedDataset, batch_size: int = 16) -> Tuple[float, float]:
+    # Caminho com cache: lotes do memmap, lendo todos os pixels/labels como o decode_pass
+    t0 = time.perf_counter()
+    total = 0.0
+    for images, labels, _ in dataset.iter_batches(batch_size):
+        total += float(images.sum(dtype=np.uint64))
+        total += sum(float(lab.sum()) for lab in labels)
+    return time.perf_counter() - t0, total
+
+
+def bench_decode_vs_mmap(paths: List[str], dataset: PackedDataset, repeat: int = 3) -> Dict[str, float]:
+    # Melhor de `repeat` passadas completas em cada caminho (cache de páginas do SO já aquecido)
+    decode_s = min(decode_pass(paths, dataset.size)[0] for _ in range(repeat))
+    mmap_s = min(mmap_pass(dataset)[0] for _ in range(repeat))
+    n = len(paths)
+    return {
+        "images": n,
+        "decode_images_per_s": n / decode_s if decode_s > 0 else 0.0,
+        "mmap_images_per_s": n / mmap_s if mmap_s > 0 else 0.0,
+        "speedup": decode_s / mmap_s if mmap_s > 0 else float("inf"),
+    }
+
+
+def _parse_size(value: str) -> Tuple[int, int]:
+    w_str, h_str = value.lower().split("x")
+    return (int(w_str), int(h_str))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Dataset pré-processado e memory-mapped para avaliações repetidas")
+    sub = parser.add_subparsers(dest="command", required=True)
+    pack = sub.add_parser("pack", help="Empacota as imagens/labels de uma lista (val.txt) com letterbox")
+    pack.add_argument("list", help="Lista de imagens (train.txt/val.txt)")
+    pack.add_argument("--out", required=True, help="Diretório do pacote")
+    pack.add_argument("--size", type=str, default="416x416", help="Tamanho das imagens empacotadas, ex: 416x416")
+    pack.add_argument("--workers", type=int, default=4, help="Threads de decodificação")
+    pack.add_argument("--force", action="store_true", help="Reempacota mesmo se as fontes não mudaram")
+    bench = sub.add_parser("bench", help="Compara decodificar as imagens vs ler o pacote")
+    bench.add_argument("list", nargs="?", default=None, help="Lista de imagens (default: dataset sintético)")
+    bench.add_argument("--size", type=str, default="416x416")
+    bench.add_argument("--images", type=int, default=200, help="Imagens do dataset sintético")
+    bench.add_argument("--repeat", type=int, default=3)
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    size = _parse_size(args.size)
+    if args.command == "pack":
+        paths = read_image_list(args.list)
+        if not args.force and is_up_to_date(args.out, paths, size):
+            print(f"{args.out} já está atualizado ({len(paths)} imagens)")
+            return 0
+        r = pack_dataset(paths, args.out, size, workers=args.workers)
+        print(f"Empacotadas {r['images']} imagens e {r['labels']} labels em {r['elapsed_s']:.1f}s "
+              f"({r['images_per_s']:.0f} img/s, {r['bytes'] / 1e6:.0f} MB) -> {args.out}")
+        return 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.list:
+            paths = read_image_list(args.list)
+        else:
+            from yolo_eval import write_synthetic_dataset
+
+            paths = read_image_list(write_synthetic_dataset(tmp, num_images=args.images, size=(1280, 720)))
+        pack_dataset(paths, os.path.join(tmp, "pack"), size)
+        # A equivalência com a decodificação direta é conferida em tests/test_dataset_cache.py
+        dataset = PackedDataset(os.path.join(tmp, "pack"))
+        r = bench_decode_vs_mmap(paths, dataset, args.repeat)
+        del dataset
+    print(f"{r['images']} imagens: decode {r['decode_images_per_s']:.0f} img/s | mmap {r['mmap_images_per_s']:.0f} img/s "
+          f"| {r['speedup']:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,447 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from yolo_backends import BACKENDS
+from yolo_results import Detections
+from yolo_tracker import iou_matrix
+
+# Limiares de IoU do mAP@0.5:0.95 (padrão COCO)
+IOU_THRESHOLDS = np.round(np.linspace(0.5, 0.95, 10), 2)
+
+# Amostra de avaliação: (caminho da imagem, imagem BGR, class_ids GT (N,), boxes GT (N, 4) x, y, w, h em pixels)
+Sample = Tuple[str, np.ndarray, np.ndarray, np.ndarray]
+
+
+def read_image_list(list_path: str) -> List[str]:
+    # Lê train.txt/val.txt; caminhos relativos são resolvidos a partir do diretório da lista
+    base = os.path.dirname(os.path.abspath(list_path))
+    with open(list_path, "r", encoding="utf-8") as f:
+        lines = [line.strip() for line in f]
+    return [p if os.path.isabs(p) else os.path.join(base, p) for p in lines if p]
+
+
+def label_path_for_image(image_path: str) -> str:
+    # Mesmo layout do prepare_dataset: 'img/1.jpg' -> 'img/1.txt'
+    return os.path.splitext(image_path)[0] + ".txt"
+
+
+def read_label_rows(label_path: str) -> np.ndarray:
+    # Linhas YOLO (classe cx cy w h normalizados) em um array (N, 5) float32.
+    # Imagem sem arquivo de label (ou com label vazio, como o prepare_dataset grava) = imagem sem objetos.
+    if not os.path.isfile(label_path) or os.path.getsize(label_path) == 0:
+        return np.zeros((0, 5), dtype=np.float32)
+    rows = np.loadtxt(label_path, dtype=np.float32, ndmin=2)
+    return rows.reshape(-1, 5)
+
+
+def rows_to_pixels(rows: np.ndarray, width: int, height: int) -> Tuple[np.ndarray, np.ndarray]:
+    # Linhas YOLO normalizadas -> class_ids e boxes (x, y, w, h) em pixels
+    cx, cy = rows[:, 1] * width, rows[:, 2] * height
+    w, h = rows[:, 3] * width, rows[:, 4] * height
+    boxes = np.stack([cx - w / 2, cy - h / 2, w, h], axis=1).astype(np.float32).reshape(-1, 4)
+    return rows[:, 0].astype(np.int64), boxes
+
+
+def load_labels(label_path: str, width: int, height: int) -> Tuple[np.ndarray, np.ndarray]:
+    return rows_to_pixels(read_label_rows(label_path), width, height)
+
+
+def load_sample(image_path: str) -> Sample:
+    image = cv2.imread(image_path)
+    if image is None:
+        raise FileNotFoundError(f"Imagem não encontrada ou inválida: {image_path}")
+    h, w = image.shape[:2]
+    class_ids, boxes = load_labels(label_path_for_image(image_path), w, h)
+    return image_path, image, class_ids, boxes
+
+
+def iter_samples(paths: Iterable[str], workers: int = 4, prefetch: int = 16) -> Iterator[Sample]:
+    # Decodifica imagens + labels em paralelo (cv2.imread libera o GIL) mantendo a ordem da lista
+    # e no máximo `prefetch` amostras em memória
+    if workers <= 1:
+        for path in paths:
+            yield load_sample(path)
+        return
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="decode") as executor:
+        pending: deque = deque()
+        for path in paths:
+            if len(pending) >= max(prefetch, workers):
+                yield pending.popleft().result()
+            pending.append(executor.submit(load_sample, path))
+        while pending:
+            yield pending.popleft().result()
+
+
+def match_predictions(
+    pred_boxes: np.ndarray,
+    gt_boxes: np.ndarray,
+    iou_thresholds: np.ndarray = IOU_THRESHOLDS,
+) -> np.ndarray:
+    # Casamento guloso (predições já ordenadas por confiança decrescente) para todos os limiares
+    # de uma vez: cada predição fica com o GT livre de maior IoU. Retorna tp (limiares, predições).
+    n_thr, n_pred = len(iou_thresholds), len(pred_boxes)
+    tp = np.zeros((n_thr, n_pred), dtype=bool)
+    if n_pred == 0 or len(gt_boxes) == 0:
+        return tp
+    ious = iou_matrix(pred_boxes, gt_boxes)
+    matched = np.zeros((n_thr, len(gt_boxes)), dtype=bool)
+    rows = np.arange(n_thr)
+    for p in range(n_pred):
+        candidates = np.where(matched, -1.0, ious[p][None, :])
+        best = candidates.argmax(axis=1)
+        hit = candidates[rows, best] >= iou_thresholds
+        tp[hit, p] = True
+        matched[rows[hit], best[hit]] = True
+    return tp
+
+
+def average_precision(tp: np.ndarray, num_gt: int) -> np.ndarray:
+    # AP por limiar com interpolação em todos os pontos (como o `darknet detector map`).
+    # tp: (limiares, predições) já ordenado por confiança decrescente.
+    n_thr = tp.shape[0]
+    if num_gt == 0:
+        return np.full(n_thr, np.nan)
+    if tp.shape[1] == 0:
+        return np.zeros(n_thr)
+    ctp = np.cumsum(tp, axis=1)
+    cfp = np.cumsum(~tp, axis=1)
+    recall = ctp / num_gt
+    precision = ctp / (ctp + cfp)
+    # Envelope: precisão máxima para qualquer recall >= r
+    precision = np.maximum.accumulate(precision[:, ::-1], axis=1)[:, ::-1]
+    recall_steps = np.diff(np.concatenate([np.zeros((n_thr, 1)), recall], axis=1), axis=1)
+    return (recall_steps * precision).sum(axis=1)
+
+
+class MapAccumulator:
+    # Acumula, imagem a imagem, confiança + TP por limiar de cada predição e o nº de GTs por classe;
+    # compute() calcula AP por classe e o mAP (média sobre classes com pelo menos um GT)
+    def __init__(self, iou_thresholds: np.ndarray = IOU_THRESHOLDS):
+        self.iou_thresholds = np.asarray(iou_thresholds, dtype=np.float32)
+        self._scores: Dict[int, List[np.ndarray]] = {}
+        self._tp: Dict[int, List[np.ndarray]] = {}
+        self._num_gt: Dict[int, int] = {}
+        self.images = 0
+
+    def add(
+        self,
+        pred_classes: np.ndarray,
+        pred_boxes: np.ndarray,
+        pred_scores: np.ndarray,
+        gt_classes: np.ndarray,
+        gt_boxes: np.ndarray,
+    ) -> None:
+        pred_classes = np.asarray(pred_classes, dtype=np.int64)
+        pred_boxes = np.asarray(pred_boxes, dtype=np.float32).reshape(-1, 4)
+        pred_scores = np.asarray(pred_scores, dtype=np.float32)
+        gt_classes = np.asarray(gt_classes, dtype=np.int64)
+        gt_boxes = np.asarray(gt_boxes, dtype=np.float32).reshape(-1, 4)
+        self.images += 1
+        for cls in np.union1d(pred_classes, gt_classes):
+            cls = int(cls)
+            gt = gt_boxes[gt_classes == cls]
+            self._num_gt[cls] = self._num_gt.get(cls, 0) + len(gt)
+            sel = np.flatnonzero(pred_classes == cls)
+            if len(sel) == 0:
+                continue
+            sel = sel[np.argsort(-pred_scores[sel], kind="stable")]
+            self._scores.setdefault(cls, []).append(pred_scores[sel])
+            self._tp.setdefault(cls, []).append(match_predictions(pred_boxes[sel], gt, self.iou_thresholds))
+
+    def add_detections(self, detections, gt_classes: np.ndarray, gt_boxes: np.ndarray) -> None:
+        # Mesmo que add(), a partir da saída de YoloDetector.detect (lista de dicts ou Detections)
+        if isinstance(detections, Detections):
+            self.add(detections.class_ids, detections.boxes, detections.scores, gt_classes, gt_boxes)
+            return
+        self.add(
+            np.array([d["class_id"] for d in detections], dtype=np.int64),
+            np.array([d["box"] for d in detections], dtype=np.float32).reshape(-1, 4),
+            np.array([d["confidence"] for d in detections], dtype=np.float32),
+            gt_classes,
+            gt_boxes,
+        )
+
+    def compute(self, class_names: Optional[List[str]] = None) -> Dict[str, object]:
+        per_class: Dict[str, Dict[str, float]] = {}
+        aps = []
+        for cls in sorted(set(self._num_gt) | set(self._scores)):
+            num_gt = self._num_gt.get(cls, 0)
+            if cls in self._scores:
+                scores = np.concatenate(self._scores[cls])
+                order = np.argsort(-scores, kind="stable")
+                tp = np.concatenate(self._tp[cls], axis=1)[:, order]
+            else:
+                tp = np.zeros((len(self.iou_thresholds), 0), dtype=bool)
+            ap = average_precision(tp, num_gt)
+            name = class_names[cls] if class_names and 0 <= cls < len(class_names) else str(cls)
+            per_class[name] = {
+                "class_id": cls,
+                "gt": num_gt,
+                "predictions": int(tp.shape[1]),
+                "ap50": float(ap[0]),
+                "ap50_95": float(np.mean(ap)),
+            }
+            if num_gt > 0:
+                aps.append(ap)
+        aps_arr = np.array(aps) if aps else np.zeros((0, len(self.iou_thresholds)))
+        return {
+            "images": self.images,
+            "map50": float(aps_arr[:, 0].mean()) if len(aps_arr) else 0.0,
+            "map50_95": float(aps_arr.mean()) if len(aps_arr) else 0.0,
+            "per_class": per_class,
+        }
+
+
+def evaluate(
+    detector,
+    paths: Optional[List[str]],
+    input_size: Tuple[int, int] = (416, 416),
+    batch_size: int = 1,
+    decode_workers: int = 4,
+    pool=None,
+    samples: Optional[Iterable[Sample]] = None,
+    classes: Optional[List[str]] = None,
+) -> Dict[str, object]:
+    # Avalia o detector sobre a lista de imagens em streaming: decodificação paralela -> inferência
+    # (detect_batch em lotes, ou DetectorPool com processos; nesse caso detector pode ser None e os
+    # nomes vêm de classes) -> acumulação do mAP.
+    # samples substitui a decodificação de paths (ex.: yolo_dataset_cache.PackedDataset.samples()).
+    # Retorna as métricas de acurácia junto com throughput para comparar configurações.
+    acc = MapAccumulator()
+    if samples is None:
+        samples = iter_samples(paths, workers=decode_workers)
+    infer_s = 0.0
+    t_start = time.perf_counter()
+    if pool is not None:
+        gts: deque = deque()
+
+        def frames() -> Iterator[np.ndarray]:
+            for _, image, gt_classes, gt_boxes in samples:
+                gts.append((gt_classes, gt_boxes))
+                yield image
+
+        # DetectorPool.map devolve os resultados na ordem de submissão
+        for detections in pool.map(frames()):
+            gt_classes, gt_boxes = gts.popleft()
+            acc.add_detections(detections, gt_classes, gt_boxes)
+        infer_s = time.perf_counter() - t_start
+    else:
+        batch: List[Sample] = []
+
+        def flush() -> float:
+            t0 = time.perf_counter()
+            if len(batch) == 1:
+                results = [detector.detect(batch[0][1], input_size=input_size, columnar=True)]
+            else:
+                results = detector.detect_batch([s[1] for s in batch], input_size=input_size, columnar=True)
+            elapsed = time.perf_counter() - t0
+            for (_, _, gt_classes, gt_boxes), detections in zip(batch, results):
+                acc.add_detections(detections, gt_classes, gt_boxes)
+            batch.clear()
+            return elapsed
+
+        for sample in samples:
+            batch.append(sample)
+            if len(batch) >= max(1, batch_size):
+                infer_s += flush()
+        if batch:
+            infer_s += flush()
+    elapsed = time.perf_counter() - t_start
+    result = acc.compute(classes if classes is not None else getattr(detector, "classes", None))
+    result.update({
+        "input_size": f"{input_size[0]}x{input_size[1]}",
+        "elapsed_s": elapsed,
+        "images_per_s": acc.images / elapsed if elapsed > 0 else 0.0,
+        "inference_images_per_s": acc.images / infer_s if infer_s > 0 else 0.0,
+    })
+    return result
+
+
+def write_synthetic_dataset(
+    out_dir: str,
+    num_images: int = 32,
+    num_classes: int = 6,
+    size: Tuple[int, int] = (640, 480),
+    seed: int = 0,
+) -> str:
+    # Dataset sintético no layout do prepare_dataset (valid/img/N.jpg + N.txt e val.txt):
+    # retângulos sólidos sobre ruído, cada um rotulado com uma classe aleatória
+    rng = np.random.default_rng(seed)
+    width, height = size
+    img_dir = os.path.join(out_dir, "valid", "img")
+    os.makedirs(img_dir, exist_ok=True)
+    paths = []
+    for i in range(num_images):
+        image = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        lines = []
+        for _ in range(int(rng.integers(1, 6))):
+            bw, bh = int(rng.integers(24, width // 3)), int(rng.integers(24, height // 3))
+            x0, y0 = int(rng.integers(0, width - bw)), int(rng.integers(0, height - bh))
+            color = tuple(int(c) for c in rng.integers(0, 256, 3))
+            cv2.rectangle(image, (x0, y0), (x0 + bw - 1, y0 + bh - 1), color, -1)
+            cls = int(rng.integers(0, num_classes))
+            lines.append(f"{cls} {(x0 + bw / 2) / width} {(y0 + bh / 2) / height} {bw / width} {bh / height}")
+        path = os.path.join(img_dir, f"{i}.jpg")
+        cv2.imwrite(path, image)
+        with open(label_path_for_image(path), "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        paths.append(os.path.abspath(path))
+    list_path = os.path.join(out_dir, "val.txt")
+    with open(list_path, "w", encoding="utf-8") as f:
+        for path in paths:
+            f.write(path + "\n")
+    return list_path
+
+
+def bench(args: argparse.Namespace) -> int:
+    # Mede o throughput do pipeline completo (decodificação -> inferência -> mAP) com o modelo e o
+    # dataset sintéticos; a exatidão do mAP é coberta em tests/test_eval.py
+    from yolo_benchmark import write_tiny_darknet_model
+    from yolo_inference import YoloDetector
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = read_image_list(write_synthetic_dataset(tmp, num_images=args.images))
+        cfg_path, weights_path, names_path = write_tiny_darknet_model(tmp)
+        input_size = _parse_sizes(args.input_size)[0]
+        detector = YoloDetector(cfg_path, weights_path, names_path, conf_threshold=args.conf,
+                                backend=args.backend or "opencv", input_size=input_size)
+        detector.warmup(input_size, batch_size=max(1, args.batch_size))
+        for workers in sorted({1, args.decode_workers}):
+            r = evaluate(detector, paths, input_size, batch_size=args.batch_size, decode_workers=workers)
+            print(f"decode_workers={workers}: {format_result(r)}")
+    return 0
+
+
+def format_result(r: Dict) -> str:
+    return (f"{r['input_size']} | mAP@0.5 {r['map50']:.4f} | mAP@0.5:0.95 {r['map50_95']:.4f} | "
+            f"{r['images_per_s']:.1f} img/s fim-a-fim | {r['inference_images_per_s']:.1f} img/s inferência "
+            f"| {r['images']} imagens")
+
+
+def _parse_sizes(value: str) -> List[Tuple[int, int]]:
+    sizes = []
+    for item in value.split(","):
+        w_str, h_str = item.strip().lower().split("x")
+        sizes.append((int(w_str), int(h_str)))
+    return sizes
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Avaliação de mAP + throughput do YOLO sobre val.txt")
+    parser.add_argument("list", nargs="?", default="val.txt", help="Lista de imagens (val.txt do prepare_dataset)")
+    parser.add_argument("--input-size", type=str, default="416x416",
+                        help="Tamanho(s) de entrada, separados por vírgula para comparar (ex: 320x320,416x416,608x608)")
+    parser.add_argument("--batch-size", type=int, default=1, help="Imagens por forward (usa detect_batch)")
+    parser.add_argument("--decode-workers", type=int, default=4, help="Threads de decodificação de imagens")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Processos de inferência (DetectorPool); 0 = detector único neste processo")
+    parser.add_argument("--max-frame", type=str, default="1920x1080", help="Maior imagem aceita pelo pool, ex: 1920x1080")
+    parser.add_argument("--packed", type=str, default=None,
+                        help="Avalia um dataset empacotado (yolo_dataset_cache.py pack) em vez da lista. A rede recebe "
+                             "as imagens com letterbox (proporção mantida, bordas cinza) em vez da imagem inteira "
+                             "esticada, então o mAP não é comparável com o da --list; compare pacote com pacote")
+    parser.add_argument("--limit", type=int, default=0, help="Avalia só as N primeiras imagens (0 = todas)")
+    parser.add_argument("--conf", type=float, default=0.005, help="Confiança mínima (baixa para a curva P-R completa)")
+    parser.add_argument("--nms", type=float, default=0.45, help="NMS threshold")
+    parser.add_argument("--gpu", action="store_true", help="Usar CUDA (se disponível)")
+    parser.add_argument("--backend", type=str, choices=BACKENDS, default=None,
+                        help="Backend de inferência (default: YOLO_BACKEND do .env ou opencv)")
+    parser.add_argument("--cfg", type=str, default=None, help="Caminho para .cfg (sobrepõe .env)")
+    parser.add_argument("--weights", type=str, default=None, help="Caminho para .weights (sobrepõe .env)")
+    parser.add_argument("--names", type=str, default=None, help="Caminho para .names (sobrepõe .env)")
+    parser.add_argument("--per-class", action="store_true", help="Imprime AP por classe")
+    parser.add_argument("--json-out", type=str, default=None, help="Grava os resultados (lista, um por tamanho) em JSON")
+    parser.add_argument("--bench", action="store_true",
+                        help="Mede o pipeline com o modelo e um dataset sintéticos (sem download)")
+    parser.add_argument("--images", type=int, default=32, help="Imagens do dataset sintético (--bench)")
+    return parser.parse_args()
+
+
+def detector_kwargs_from_args(args: argparse.Namespace, input_size: Tuple[int, int]) -> Dict:
+    # kwargs do YoloDetector com os thresholds da avaliação (--conf/--nms), usados tanto no detector
+    # local quanto nos workers do pool (que sem kwargs cairiam nos defaults 0.5/0.4 do .env)
+    if args.cfg and args.weights and args.names:
+        return dict(cfg_path=args.cfg, weights_path=args.weights, names_path=args.names,
+                    conf_threshold=args.conf, nms_threshold=args.nms, use_gpu=args.gpu,
+                    backend=args.backend or "opencv", input_size=input_size)
+    from yolo_inference import resolve_detector_config
+
+    return resolve_detector_config(args.conf, args.nms, args.gpu, args.backend, input_size)
+
+
+def main() -> int:
+    args = parse_args()
+    if args.bench:
+        return bench(args)
+    from yolo_inference import YoloDetector, _load_classes
+
+    packed = None
+    try:
+        if args.packed:
+            from yolo_dataset_cache import PackedDataset
+
+            packed = PackedDataset(args.packed)
+            paths = packed.paths
+        else:
+            paths = read_image_list(args.list)
+    except OSError as e:
+        print(f"Não foi possível ler a lista de imagens: {e}")
+        return 2
+    if args.limit > 0:
+        paths = paths[: args.limit]
+    if not paths:
+        print(f"Nenhuma imagem em {args.packed or args.list}")
+        return 2
+
+    results = []
+    for input_size in _parse_sizes(args.input_size):
+        try:
+            detector_kwargs = detector_kwargs_from_args(args, input_size)
+            # Com o pool a inferência roda só nos workers: o processo principal não carrega a rede
+            detector = None
+            if args.workers <= 0:
+                detector = YoloDetector(**detector_kwargs)
+                detector.warmup(input_size, batch_size=max(1, args.batch_size))
+        except Exception as e:
+            print(f"Erro ao inicializar o detector: {e}")
+            return 2
+        if args.workers > 0:
+            from yolo_pool import DetectorPool
+
+            max_w, max_h = _parse_sizes(args.max_frame)[0]
+            with DetectorPool(args.workers, detector_kwargs, input_size=input_size,
+                              max_frame_shape=(max_h, max_w, 3)) as pool:
+                r = evaluate(None, paths, input_size, decode_workers=args.decode_workers, pool=pool,
+                             samples=packed.samples(args.limit) if packed else None,
+                             classes=_load_classes(detector_kwargs["names_path"]))
+        else:
+            r = evaluate(detector, paths, input_size, batch_size=args.batch_size, decode_workers=args.decode_workers,
+                         samples=packed.samples(args.limit) if packed else None)
+        r["backend"] = detector_kwargs["backend"]
+        # Marca a origem: mAP com letterbox (pacote) e sobre a imagem esticada (lista) não se comparam
+        r["source"] = f"packed:{args.packed}" if packed else args.list
+        r["letterbox"] = packed is not None
+        results.append(r)
+        print(format_result(r))
+        if args.per_class:
+            for name, c in r["per_class"].items():
+                print(f"  {name:>12}: AP@0.5 {c['ap50']:.4f} | AP@0.5:0.95 {c['ap50_95']:.4f} | "
+                      f"{c['gt']} GT | {c['predictions']} predições")
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,11 @@
 import os
+import time
 import cv2
 import numpy as np
 from typing import List, Tuple, Dict, Optional
-import urllib.request
-import pathlib
 
-try:
-    from dotenv import load_dotenv
-except Exception:
-    load_dotenv = None
+from yolo_backends import create_backend
+from yolo_results import Detections
 
 
 def _load_classes(names_path: str) -> List[str]:
@@ -22,15 +19,47 @@ def _load_classes(names_path: str) -> List[str]:
     return classes
 
 
-def _get_output_layer_names(net: cv2.dnn_Net) -> List[str]:
-    # Extrai nomes das camadas de saída (YOLO) para forward
-    layer_names = net.getLayerNames()
-    out_layers = net.getUnconnectedOutLayers()
-    return [layer_names[i - 1] for i in out_layers.flatten()]
+# Normalização do blob (1/255) como float32, para a conta não passar por float64
+_SCALE = np.float32(1 / 255.0)
+
+
+def _decode_outputs(
+    layer_outputs: List[np.ndarray],
+    img_w: int,
+    img_h: int,
+    conf_threshold: float,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Decodifica as saídas YOLO de forma vetorizada (sem loop Python por âncora).
+    # Cada linha: [cx, cy, w, h, objectness, score_classe_0, ..., score_classe_n] normalizados.
+    # Retorna boxes (N, 4) int32 em pixels (x, y, w, h), confidences (N,) float32 e class_ids (N,) int32.
+    rows = np.concatenate([np.asarray(o).reshape(-1, o.shape[-1]) for o in layer_outputs], axis=0)
+    # Filtra pelo score máximo antes do argmax: a maioria das âncoras é descartada aqui
+    confidences = rows[:, 5:].max(axis=1)
+    keep = confidences >= conf_threshold
+    rows = rows[keep]
+    # Descarta linhas com geometria não finita (overflow no exp do tamanho da âncora)
+    finite = np.isfinite(rows[:, :4]).all(axis=1)
+    if not finite.all():
+        keep[np.flatnonzero(keep)[~finite]] = False
+        rows = rows[finite]
+    confidences = confidences[keep].astype(np.float32)
+    class_ids = np.argmax(rows[:, 5:], axis=1).astype(np.int32)
+
+    # Mesma semântica do int() do Python: truncamento em direção a zero
+    center_x = np.trunc(rows[:, 0] * img_w)
+    center_y = np.trunc(rows[:, 1] * img_h)
+    width = np.trunc(rows[:, 2] * img_w)
+    height = np.trunc(rows[:, 3] * img_h)
+    x = np.trunc(center_x - width / 2)
+    y = np.trunc(center_y - height / 2)
+    boxes = np.stack([x, y, width, height], axis=1).astype(np.int32)
+    return boxes, confidences, class_ids
 
 
 class YoloDetector:
-    # Wrapper para inferência com OpenCV DNN + Darknet cfg/weights
+    # Wrapper para inferência YOLO a partir de Darknet cfg/weights. O backend de execução é
+    # plugável (ver yolo_backends.BACKENDS): OpenCV DNN (CPU, CUDA, CPU FP16, OpenVINO) ou
+    # ONNX Runtime sobre o modelo exportado; decode e NMS são os mesmos para todos.
     def __init__(
         self,
         cfg_path: str,
@@ -39,92 +68,224 @@ class YoloDetector:
         conf_threshold: float = 0.5,
         nms_threshold: float = 0.4,
         use_gpu: bool = False,
+        instrumentation=None,
+        backend: str = "opencv",
+        onnx_path: Optional[str] = None,
+        input_size: Tuple[int, int] = (416, 416),
+        reuse_buffers: bool = True,
     ):
         if not os.path.isfile(cfg_path):
             raise FileNotFoundError(f"CFG não encontrado: {cfg_path}")
         if not os.path.isfile(weights_path):
             raise FileNotFoundError(f"Pesos não encontrados: {weights_path}")
         self.classes = _load_classes(names_path)
-        self.net = cv2.dnn.readNetFromDarknet(cfg_path, weights_path)
-        if use_gpu:
-            self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_CUDA)
-            self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CUDA)
-        else:
-            self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
-            self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        self.backend_name = backend
+        # input_size só é usado para exportar o ONNX (tamanho de entrada fixo nesse backend)
+        self.backend = create_backend(backend, cfg_path, weights_path, use_gpu=use_gpu,
+                                      onnx_path=onnx_path, input_size=input_size)
+        # cv2.dnn_Net exposto para compatibilidade (None em backends que não são do OpenCV)
+        self.net = getattr(self.backend, "net", None)
         self.conf_threshold = conf_threshold
         self.nms_threshold = nms_threshold
-        self.output_layer_names = _get_output_layer_names(self.net)
+        self.output_layer_names = self.backend.output_layer_names
+        # Buffers de pré-processamento reaproveitados entre frames, por (lote, tamanho de entrada).
+        # Uma instância não deve rodar detect()/detect_batch() concorrentes (a rede já não permite).
+        self.reuse_buffers = reuse_buffers
+        self._buffers: Dict[Tuple[int, Tuple[int, int]], Tuple[np.ndarray, List[np.ndarray]]] = {}
+        # Instrumentação opcional (ex.: yolo_metrics.DetectorMetrics): objeto com
+        # observe(stage, ms) e count(name, n). Com None o hot path não mede nada.
+        self.instrumentation = instrumentation
 
     def detect(
         self,
         image_bgr: np.ndarray,
         input_size: Tuple[int, int] = (416, 416),
-    ) -> List[Dict]:
-        # Executa inferência e retorna lista de detecções com bbox, classe e confiança
+        is_rgb: bool = False,
+        columnar: bool = False,
+    ):
+        # Executa inferência e retorna lista de detecções com bbox, classe e confiança.
+        # is_rgb: a imagem já está em RGB (ex.: PIL/Streamlit), dispensa conversão de cor.
+        # columnar: retorna um yolo_results.Detections (arrays NumPy) em vez da lista de dicts.
         if image_bgr is None or image_bgr.size == 0:
             raise ValueError("Imagem inválida para detecção")
         h, w = image_bgr.shape[:2]
-        blob = cv2.dnn.blobFromImage(image_bgr, 1 / 255.0, input_size, swapRB=True, crop=False)
-        self.net.setInput(blob)
-        layer_outputs = self.net.forward(self.output_layer_names)
-
-        boxes: List[List[int]] = []
-        confidences: List[float] = []
-        class_ids: List[int] = []
-
-        for output in layer_outputs:
-            for detection in output:
-                scores = detection[5:]
-                class_id = int(np.argmax(scores))
-                confidence = float(scores[class_id])
-                if confidence >= self.conf_threshold:
-                    center_x = int(detection[0] * w)
-                    center_y = int(detection[1] * h)
-                    width = int(detection[2] * w)
-                    height = int(detection[3] * h)
-                    x = int(center_x - width / 2)
-                    y = int(center_y - height / 2)
-                    boxes.append([x, y, width, height])
-                    confidences.append(confidence)
-                    class_ids.append(class_id)
-
-        indices = cv2.dnn.NMSBoxes(boxes, confidences, self.conf_threshold, self.nms_threshold)
+        inst = self.instrumentation
+        if inst is None:
+            blob = self._preprocess([image_bgr], input_size, is_rgb)
+            layer_outputs = self.backend.forward(blob)
+            boxes, confidences, class_ids = _decode_outputs(layer_outputs, w, h, self.conf_threshold)
+            return self._nms_to_detections(boxes, confidences, class_ids, columnar)
+
+        t0 = time.perf_counter()
+        blob = self._preprocess([image_bgr], input_size, is_rgb)
+        t1 = time.perf_counter()
+        layer_outputs = self.backend.forward(blob)
+        t2 = time.perf_counter()
+        boxes, confidences, class_ids = _decode_outputs(layer_outputs, w, h, self.conf_threshold)
+        t3 = time.perf_counter()
+        detections = self._nms_to_detections(boxes, confidences, class_ids, columnar)
+        t4 = time.perf_counter()
+        inst.observe("preprocess", (t1 - t0) * 1000.0)
+        inst.observe("forward", (t2 - t1) * 1000.0)
+        inst.observe("decode", (t3 - t2) * 1000.0)
+        inst.observe("nms", (t4 - t3) * 1000.0)
+        inst.count("candidates", len(boxes))
+        inst.count("detections", len(detections))
+        inst.count("frames", 1)
+        return detections
+
+    def detect_batch(
+        self,
+        images: List[np.ndarray],
+        input_size: Tuple[int, int] = (416, 416),
+        is_rgb: bool = False,
+        columnar: bool = False,
+    ) -> List:
+        # Executa um único forward para N imagens (tamanhos podem diferir) e
+        # retorna uma lista de detecções por imagem, reescalada para o tamanho de cada uma
+        # (com columnar=True, um Detections por imagem)
+        if not images:
+            return []
+        for img in images:
+            if img is None or img.size == 0:
+                raise ValueError("Imagem inválida para detecção")
+        inst = self.instrumentation
+        t0 = time.perf_counter() if inst is not None else 0.0
+        blob = self._preprocess(images, input_size, is_rgb)
+        t1 = time.perf_counter() if inst is not None else 0.0
+        layer_outputs = self.backend.forward(blob)
+        t2 = time.perf_counter() if inst is not None else 0.0
+
+        # Saídas de batch vêm como (N, linhas, 5 + classes); com N=1 o OpenCV devolve 2D
+        n = len(images)
+        per_image = [np.asarray(o).reshape(n, -1, o.shape[-1]) for o in layer_outputs]
+
+        results: List = []
+        for idx, img in enumerate(images):
+            h, w = img.shape[:2]
+            outputs = [o[idx] for o in per_image]
+            boxes, confidences, class_ids = _decode_outputs(outputs, w, h, self.conf_threshold)
+            results.append(self._nms_to_detections(boxes, confidences, class_ids, columnar))
+            if inst is not None:
+                inst.count("candidates", len(boxes))
+                inst.count("detections", len(results[-1]))
+                inst.count("frames", 1)
+        if inst is not None:
+            # Tempos de lote ficam em estágios próprios para não misturar com os de detect()
+            inst.observe("batch_preprocess", (t1 - t0) * 1000.0)
+            inst.observe("batch_forward", (t2 - t1) * 1000.0)
+            inst.observe("batch_postprocess", (time.perf_counter() - t2) * 1000.0)
+        return results
+
+    def warmup(self, input_size: Tuple[int, int] = (416, 416), batch_size: int = 1) -> float:
+        # Forward de aquecimento com blob de zeros: a primeira execução do OpenCV DNN/ONNX Runtime
+        # inicializa camadas e aloca memória e custa várias vezes um forward normal.
+        # Retorna o tempo gasto (ms).
+        t0 = time.perf_counter()
+        w, h = input_size
+        self.backend.forward(np.zeros((batch_size, 3, h, w), dtype=np.float32))
+        return (time.perf_counter() - t0) * 1000.0
+
+    def _preprocess(self, images: List[np.ndarray], input_size: Tuple[int, int], is_rgb: bool = False) -> np.ndarray:
+        # Monta o blob NCHW float32 (RGB, /255), equivalente a cv2.dnn.blobFromImages(..., swapRB=True).
+        # Com reuse_buffers, redimensiona e normaliza direto em buffers pré-alocados (sem alocar por frame).
+        if not self.reuse_buffers:
+            return cv2.dnn.blobFromImages(images, 1 / 255.0, input_size, swapRB=not is_rgb, crop=False)
+        key = (len(images), input_size)
+        entry = self._buffers.get(key)
+        if entry is None:
+            if len(self._buffers) >= 8:
+                # Muitos tamanhos de lote distintos: descarta os buffers antigos
+                self._buffers.clear()
+            w, h = input_size
+            entry = self._buffers[key] = (
+                np.empty((len(images), 3, h, w), dtype=np.float32),
+                [np.empty((h, w, 3), dtype=np.uint8) for _ in images],
+            )
+        blob, resized = entry
+        for i, img in enumerate(images):
+            if img.shape[1] == input_size[0] and img.shape[0] == input_size[1]:
+                src = img
+            else:
+                src = cv2.resize(img, input_size, dst=resized[i], interpolation=cv2.INTER_LINEAR)
+            # HWC -> CHW (e BGR -> RGB) como views; a única escrita é a normalização no buffer do blob
+            chw = src.transpose(2, 0, 1)
+            np.multiply(chw if is_rgb else chw[::-1], _SCALE, out=blob[i], casting="unsafe")
+        return blob
+
+    def forward(self, blob: np.ndarray) -> List[np.ndarray]:
+        # Forward bruto no backend: blob NCHW -> saídas das camadas YOLO
+        return self.backend.forward(blob)
+
+    def _nms_to_detections(
+        self,
+        boxes: np.ndarray,
+        confidences: np.ndarray,
+        class_ids: np.ndarray,
+        columnar: bool = False,
+    ):
+        # Aplica NMS sobre os candidatos decodificados e monta a lista de dicts de saída
+        # (ou um Detections com os mesmos valores, sem criar um dict por box)
+        if len(boxes) == 0:
+            return Detections.empty(self.classes) if columnar else []
+        indices = cv2.dnn.NMSBoxes(boxes.tolist(), confidences.tolist(), self.conf_threshold, self.nms_threshold)
+        if columnar:
+            keep = np.asarray(indices, dtype=np.int64).reshape(-1)
+            # astype trunca em direção a zero, como o int() do caminho em dicts
+            return Detections(np.maximum(boxes[keep].astype(np.int32), 0), confidences[keep], class_ids[keep],
+                              self.classes)
 
         detections: List[Dict] = []
         if len(indices) > 0:
-            for i in indices.flatten():
-                x, y, w_box, h_box = boxes[i]
+            for i in np.asarray(indices).flatten():
+                x, y, w_box, h_box = (int(v) for v in boxes[i])
+                class_id = int(class_ids[i])
                 detections.append(
                     {
-                        "class_id": class_ids[i],
-                        "class_name": self.classes[class_ids[i]] if 0 <= class_ids[i] < len(self.classes) else str(class_ids[i]),
-                        "confidence": confidences[i],
+                        "class_id": class_id,
+                        "class_name": self.classes[class_id] if 0 <= class_id < len(self.classes) else str(class_id),
+                        "confidence": float(confidences[i]),
                         "box": (max(0, x), max(0, y), max(0, w_box), max(0, h_box)),
                     }
                 )
         return detections
 
-    def draw(self, image_bgr: np.ndarray, detections: List[Dict]) -> np.ndarray:
-        # Desenha retângulos e labels no frame
-        out = image_bgr.copy()
+    def draw(self, image_bgr: np.ndarray, detections, in_place: bool = False) -> np.ndarray:
+        # Desenha retângulos e labels no frame; in_place=True desenha no próprio array (sem cópia).
+        # As cores usadas são as mesmas em BGR e RGB. Aceita lista de dicts ou Detections.
+        t0 = time.perf_counter() if self.instrumentation is not None else 0.0
+        if isinstance(detections, Detections):
+            detections = detections.to_dicts()
+        out = image_bgr if in_place else image_bgr.copy()
         for det in detections:
             x, y, w, h = det["box"]
             label = f"{det['class_name']} {det['confidence']:.2f}"
+            if "track_id" in det:
+                label = f"#{det['track_id']} {label}"
             color = (0, 255, 0)
             cv2.rectangle(out, (x, y), (x + w, y + h), color, 2)
             (tw, th), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
             cv2.rectangle(out, (x, y - th - 6), (x + tw + 4, y), color, -1)
             cv2.putText(out, label, (x + 2, y - 4), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 2)
+        if self.instrumentation is not None:
+            self.instrumentation.observe("draw", (time.perf_counter() - t0) * 1000.0)
         return out
 
 
-def build_detector_from_env(
+def resolve_detector_config(
     conf_threshold: Optional[float] = None,
     nms_threshold: Optional[float] = None,
     use_gpu: Optional[bool] = None,
-) -> YoloDetector:
-    # Inicializa via .env; se faltarem caminhos/arquivos, baixa YOLOv3-tiny automaticamente (models/)
+    backend: Optional[str] = None,
+    input_size: Tuple[int, int] = (416, 416),
+) -> Dict:
+    # Resolve caminhos/thresholds via .env sem construir a rede; se faltarem caminhos/arquivos,
+    # usa o YOLOv3-tiny do cache local (models/, baixado e verificado por checksum se preciso).
+    # Retorna kwargs para YoloDetector (input_size define a entrada do ONNX exportado).
+    try:
+        from dotenv import load_dotenv
+    except Exception:
+        load_dotenv = None
     if load_dotenv is not None:
         load_dotenv()
     cfg_path = os.getenv("YOLO_CFG_PATH", "").strip()
@@ -135,22 +296,33 @@ def build_detector_from_env(
         or not os.path.isfile(cfg_path)
         or not os.path.isfile(weights_path)
         or not os.path.isfile(names_path)):
-        models_dir = pathlib.Path("models")
-        models_dir.mkdir(exist_ok=True)
-        cfg_path = str(models_dir / "yolov3-tiny.cfg")
-        weights_path = str(models_dir / "yolov3-tiny.weights")
-        names_path = str(models_dir / "coco.names")
-        if not os.path.isfile(cfg_path):
-            url_cfg = "https://raw.githubusercontent.com/pjreddie/darknet/master/cfg/yolov3-tiny.cfg"
-            urllib.request.urlretrieve(url_cfg, cfg_path)
-        if not os.path.isfile(weights_path):
-            url_weights = "https://pjreddie.com/media/files/yolov3-tiny.weights"
-            urllib.request.urlretrieve(url_weights, weights_path)
-        if not os.path.isfile(names_path):
-            url_names = "https://raw.githubusercontent.com/pjreddie/darknet/master/data/coco.names"
-            urllib.request.urlretrieve(url_names, names_path)
+        from yolo_model_cache import ensure_default_model
+
+        cfg_path, weights_path, names_path = ensure_default_model()
     ct = float(os.getenv("YOLO_CONF_THRESHOLD", conf_threshold if conf_threshold is not None else 0.5))
     nt = float(os.getenv("YOLO_NMS_THRESHOLD", nms_threshold if nms_threshold is not None else 0.4))
     gpu_flag = os.getenv("YOLO_USE_GPU", "false").lower() in {"1", "true", "yes"} if use_gpu is None else use_gpu
-    return YoloDetector(cfg_path=cfg_path, weights_path=weights_path, names_path=names_path, conf_threshold=ct, nms_threshold=nt, use_gpu=gpu_flag)
+    backend_name = backend or os.getenv("YOLO_BACKEND", "").strip() or "opencv"
+    onnx_path = os.getenv("YOLO_ONNX_PATH", "").strip() or None
+    return {
+        "cfg_path": cfg_path,
+        "weights_path": weights_path,
+        "names_path": names_path,
+        "conf_threshold": ct,
+        "nms_threshold": nt,
+        "use_gpu": gpu_flag,
+        "backend": backend_name,
+        "onnx_path": onnx_path,
+        "input_size": tuple(input_size),
+    }
+
 
+def build_detector_from_env(
+    conf_threshold: Optional[float] = None,
+    nms_threshold: Optional[float] = None,
+    use_gpu: Optional[bool] = None,
+    backend: Optional[str] = None,
+    input_size: Tuple[int, int] = (416, 416),
+) -> YoloDetector:
+    # Inicializa via .env (ver resolve_detector_config)
+    return YoloDetector(**resolve_detector_config(conf_threshold, nms_threshold, use_gpu, backend, input_size))
@@ -0,0 +1,166 @@
+import json
+import time
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Estágios instrumentados pelo YoloDetector (ordem usada nos overlays)
+STAGES = ["preprocess", "forward", "decode", "nms", "draw"]
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class RollingHistogram:
+    # Janela circular com as últimas N amostras (ms) + soma/contagem acumuladas
+    def __init__(self, window: int = 1000):
+        self._samples = np.zeros(window, dtype=np.float64)
+        self._pos = 0
+        self._filled = 0
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        self._samples[self._pos] = value
+        self._pos = (self._pos + 1) % len(self._samples)
+        self._filled = min(self._filled + 1, len(self._samples))
+        self.count += 1
+        self.total += value
+
+    def values(self) -> np.ndarray:
+        return self._samples[: self._filled]
+
+    def quantiles(self, qs=QUANTILES) -> Dict[float, float]:
+        vals = self.values()
+        if vals.size == 0:
+            return {q: 0.0 for q in qs}
+        return {q: float(v) for q, v in zip(qs, np.quantile(vals, qs))}
+
+    def mean(self) -> float:
+        vals = self.values()
+        return float(vals.mean()) if vals.size else 0.0
+
+
+class DetectorMetrics:
+    # Coletor em processo para o YoloDetector: histogramas por estágio, contadores e FPS.
+    # Qualquer objeto com observe(stage, ms) e count(name, n) pode ser usado como instrumentação.
+    def __init__(self, window: int = 1000, fps_window: int = 60):
+        self._lock = threading.Lock()
+        self._window = window
+        self._hists: Dict[str, RollingHistogram] = {}
+        self._counters: Dict[str, int] = {}
+        self._gauges: Dict[str, float] = {}
+        self._frame_times: "deque[float]" = deque(maxlen=fps_window)
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def observe(self, stage: str, ms: float) -> None:
+        with self._lock:
+            hist = self._hists.get(stage)
+            if hist is None:
+                hist = self._hists[stage] = RollingHistogram(self._window)
+            hist.observe(ms)
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+            # Valor do último frame, útil para overlays (ex.: candidatos antes do NMS)
+            self._gauges[name] = float(n)
+            if name == "frames":
+                self._frame_times.append(time.perf_counter())
+
+    def fps(self) -> float:
+        with self._lock:
+            if len(self._frame_times) < 2:
+                return 0.0
+            span = self._frame_times[-1] - self._frame_times[0]
+            return (len(self._frame_times) - 1) / span if span > 0 else 0.0
+
+    def snapshot(self) -> Dict:
+        # Estado atual em dict simples (serializável em JSON)
+        fps = self.fps()
+        with self._lock:
+            stages = {}
+            for stage, hist in self._hists.items():
+                q = hist.quantiles()
+                stages[stage] = {
+                    "count": hist.count,
+                    "mean_ms": hist.mean(),
+                    "p50_ms": q[0.5],
+                    "p95_ms": q[0.95],
+                    "p99_ms": q[0.99],
+                }
+            return {
+                "fps": fps,
+                "stages": stages,
+                "counters": dict(self._counters),
+                "last": dict(self._gauges),
+            }
+
+    def summary_line(self) -> str:
+        # Linha curta para overlays: FPS e média por estágio
+        parts = [f"FPS {self.fps():.1f}"]
+        with self._lock:
+            for stage in STAGES:
+                hist = self._hists.get(stage)
+                if hist is not None:
+                    parts.append(f"{stage} {hist.mean():.1f}ms")
+        return " | ".join(parts)
+
+    def to_prometheus(self, prefix: str = "yolo") -> str:
+        # Exporta no formato texto do Prometheus (summary por estágio + contadores + FPS)
+        snap = self.snapshot()
+        lines: List[str] = [
+            f"# HELP {prefix}_stage_latency_ms Latência por estágio do detector (ms, janela móvel para quantis)",
+            f"# TYPE {prefix}_stage_latency_ms summary",
+        ]
+        with self._lock:
+            hists = {stage: (hist.quantiles(), hist.total, hist.count) for stage, hist in self._hists.items()}
+        for stage, (q, total, count) in sorted(hists.items()):
+            for quantile, value in q.items():
+                lines.append(f'{prefix}_stage_latency_ms{{stage="{stage}",quantile="{quantile}"}} {value:.6f}')
+            lines.append(f'{prefix}_stage_latency_ms_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'{prefix}_stage_latency_ms_count{{stage="{stage}"}} {count}')
+        for name, value in sorted(snap["counters"].items()):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+        lines.append(f"# TYPE {prefix}_fps gauge")
+        lines.append(f"{prefix}_fps {snap['fps']:.6f}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str) -> None:
+        # Grava as métricas em arquivo: .json (snapshot) ou texto Prometheus (demais extensões)
+        with open(path, "w", encoding="utf-8") as f:
+            if path.lower().endswith(".json"):
+                json.dump(self.snapshot(), f, indent=2)
+            else:
+                f.write(self.to_prometheus())
+
+    def serve(self, port: int = 9100, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+        # Sobe um endpoint HTTP /metrics (Prometheus) em thread daemon
+        metrics = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = metrics.to_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        return self._server
+
+    def close(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
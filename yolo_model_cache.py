@@ -0,0 +1,219 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import subprocess
+import tempfile
+from typing import Dict, Optional, Tuple
+
+# Modelo padrão baixado quando .env não aponta para arquivos existentes: (arquivo, URL, SHA-256 esperado).
+# Nenhum SHA-256 do upstream está embutido (None), então a verificação padrão é trust-on-first-use: o
+# primeiro download não é conferido contra nada, só registrado no manifesto, e as cópias seguintes são
+# conferidas contra esse registro. Para verificar também o primeiro download, defina YOLO_CFG_SHA256 /
+# YOLO_WEIGHTS_SHA256 / YOLO_NAMES_SHA256 com valores de uma cópia conferida (`fetch --print-checksums`).
+DEFAULT_MODEL_FILES = {
+    "cfg": ("yolov3-tiny.cfg", "https://raw.githubusercontent.com/pjreddie/darknet/master/cfg/yolov3-tiny.cfg",
+            None),
+    "weights": ("yolov3-tiny.weights", "https://pjreddie.com/media/files/yolov3-tiny.weights", None),
+    "names": ("coco.names", "https://raw.githubusercontent.com/pjreddie/darknet/master/data/coco.names", None),
+}
+MANIFEST_NAME = ".checksums.json"
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _load_manifest(cache_dir: str) -> Dict[str, Dict]:
+    path = os.path.join(cache_dir, MANIFEST_NAME)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(cache_dir: str, manifest: Dict[str, Dict]) -> None:
+    # Escrita atômica (workers/sessões podem iniciar ao mesmo tempo)
+    path = os.path.join(cache_dir, MANIFEST_NAME)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def verify_file(path: str, manifest: Dict[str, Dict], expected_sha256: Optional[str] = None) -> bool:
+    # Confere o arquivo contra o checksum registrado no manifesto (e contra expected_sha256, se
+    # informado). O SHA-256 só é recalculado se tamanho/mtime mudarem, então o caminho comum da
+    # inicialização é um stat(). Arquivos ainda sem registro são registrados (primeiro uso).
+    name = os.path.basename(path)
+    st = os.stat(path)
+    entry = manifest.get(name)
+    if entry is not None and entry.get("size") == st.st_size and entry.get("mtime_ns") == st.st_mtime_ns:
+        sha = entry["sha256"]
+    else:
+        sha = file_sha256(path)
+        if entry is not None and entry.get("sha256") != sha:
+            return False
+        manifest[name] = {"sha256": sha, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    return expected_sha256 is None or sha == expected_sha256.lower()
+
+
+def _offline() -> bool:
+    return os.getenv("YOLO_OFFLINE", "").lower() in {"1", "true", "yes"}
+
+
+def download(url: str, dest: str) -> None:
+    # Download para arquivo temporário + rename: um download interrompido nunca fica no cache
+    if _offline():
+        raise FileNotFoundError(f"{dest} não está no cache local e YOLO_OFFLINE está ativo")
+    import urllib.request
+
+    tmp_path = f"{dest}.{os.getpid()}.part"
+    try:
+        urllib.request.urlretrieve(url, tmp_path)
+        os.replace(tmp_path, dest)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def ensure_default_model(cache_dir: Optional[str] = None) -> Tuple[str, str, str]:
+    # Garante cfg/weights/names do modelo padrão no cache local (YOLO_MODEL_CACHE, default models/),
+    # verificando checksums. Arquivo corrompido ou alterado é baixado de novo.
+    # Checksum esperado: YOLO_CFG_SHA256 / YOLO_WEIGHTS_SHA256 / YOLO_NAMES_SHA256 ou o de
+    # DEFAULT_MODEL_FILES; sem nenhum dos dois, trust-on-first-use.
+    cache_dir = cache_dir or os.getenv("YOLO_MODEL_CACHE", "").strip() or "models"
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest = _load_manifest(cache_dir)
+    before = json.dumps(manifest, sort_keys=True)
+    paths = []
+    for key in ("cfg", "weights", "names"):
+        filename, url, default_sha256 = DEFAULT_MODEL_FILES[key]
+        path = os.path.join(cache_dir, filename)
+        expected = os.getenv(f"YOLO_{key.upper()}_SHA256", "").strip() or default_sha256
+        if os.path.isfile(path) and not verify_file(path, manifest, expected):
+            if _offline():
+                raise ValueError(f"Checksum de {path} não confere e YOLO_OFFLINE impede baixar novamente")
+            print(f"Checksum de {path} não confere; baixando novamente")
+            os.remove(path)
+            manifest.pop(filename, None)
+        if not os.path.isfile(path):
+            download(url, path)
+            if not verify_file(path, manifest, expected):
+                os.remove(path)
+                raise ValueError(f"Checksum de {path} não confere com o esperado após o download")
+            if expected is None:
+                print(f"Aviso: {filename} baixado sem SHA-256 esperado (trust-on-first-use); registrado "
+                      f"{manifest[filename]['sha256']}. Defina YOLO_{key.upper()}_SHA256 para verificar o download.")
+        paths.append(path)
+    if json.dumps(manifest, sort_keys=True) != before:
+        _save_manifest(cache_dir, manifest)
+    return paths[0], paths[1], paths[2]
+
+
+def _probe(args: argparse.Namespace) -> int:
+    # Executado em subprocesso: mede cada fase da inicialização e imprime JSON
+    t0 = time.perf_counter()
+    import numpy as np
+    from yolo_inference import YoloDetector
+
+    t1 = time.perf_counter()
+    detector = YoloDetector(args.cfg, args.weights, args.names, backend=args.backend)
+    t2 = time.perf_counter()
+    warmup_ms = detector.warmup() if args.warmup else 0.0
+    t3 = time.perf_counter()
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    detector.detect(frame)
+    t4 = time.perf_counter()
+    print(json.dumps({
+        "import_ms": (t1 - t0) * 1000.0,
+        "load_ms": (t2 - t1) * 1000.0,
+        "warmup_ms": warmup_ms,
+        "first_detect_ms": (t4 - t3) * 1000.0,
+        "total_ms": (t4 - t0) * 1000.0,
+    }))
+    return 0
+
+
+def startup_report(cfg: str, weights: str, names: str, backends, warmup: bool = True) -> Dict[str, Dict]:
+    # Tempo até a primeira detecção em processos novos: "frio" sem artefatos em cache (ONNX e
+    # grafo otimizado do onnxruntime), "quente" reaproveitando o que a execução fria gravou.
+    # O modelo é copiado para um diretório temporário para não apagar caches do usuário.
+    import shutil
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    report: Dict[str, Dict] = {}
+    for backend in backends:
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = []
+            for src in (cfg, weights, names):
+                paths.append(os.path.join(tmp, os.path.basename(src)))
+                shutil.copyfile(src, paths[-1])
+            for phase in ("frio", "quente"):
+                cmd = [sys.executable, os.path.abspath(__file__), "probe", "--cfg", paths[0], "--weights", paths[1],
+                       "--names", paths[2], "--backend", backend]
+                if warmup:
+                    cmd.append("--warmup")
+                out = subprocess.run(cmd, cwd=here, check=True, capture_output=True, text=True).stdout
+                report[f"{backend} {phase}"] = json.loads(out.strip().splitlines()[-1])
+    return report
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Cache local do modelo YOLO e relatório de tempo de inicialização")
+    sub = parser.add_subparsers(dest="command", required=True)
+    fetch = sub.add_parser("fetch", help="Baixa/verifica o modelo padrão no cache local")
+    fetch.add_argument("--cache-dir", type=str, default=None, help="Diretório do cache (default: YOLO_MODEL_CACHE ou models/)")
+    fetch.add_argument("--print-checksums", action="store_true",
+                       help="Imprime o SHA-256 dos arquivos do cache (valores para YOLO_*_SHA256)")
+    rep = sub.add_parser("startup", help="Compara inicialização fria e quente (processos novos)")
+    rep.add_argument("--cfg", type=str, default=None, help="Caminho para .cfg (default: modelo sintético)")
+    rep.add_argument("--weights", type=str, default=None)
+    rep.add_argument("--names", type=str, default=None)
+    rep.add_argument("--backends", type=str, default="opencv,onnxruntime")
+    rep.add_argument("--no-warmup", action="store_true", help="Não faz o forward de aquecimento antes da 1ª detecção")
+    probe = sub.add_parser("probe")
+    probe.add_argument("--cfg", required=True)
+    probe.add_argument("--weights", required=True)
+    probe.add_argument("--names", required=True)
+    probe.add_argument("--backend", default="opencv")
+    probe.add_argument("--warmup", action="store_true")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    if args.command == "probe":
+        return _probe(args)
+    if args.command == "fetch":
+        cfg, weights, names = ensure_default_model(args.cache_dir)
+        print(f"Modelo verificado: {cfg}, {weights}, {names}")
+        if args.print_checksums:
+            for key, path in zip(("cfg", "weights", "names"), (cfg, weights, names)):
+                print(f"{key}: {file_sha256(path)}")
+        return 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.cfg and args.weights and args.names:
+            cfg, weights, names = args.cfg, args.weights, args.names
+        else:
+            from yolo_benchmark import write_tiny_darknet_model
+            cfg, weights, names = write_tiny_darknet_model(tmp)
+        report = startup_report(cfg, weights, names, [b for b in args.backends.split(",") if b],
+                                warmup=not args.no_warmup)
+    for label, r in report.items():
+        print(f"{label}: import {r['import_ms']:.0f} ms | carga {r['load_ms']:.0f} ms | "
+              f"warm-up {r['warmup_ms']:.0f} ms | 1ª detecção {r['first_detect_ms']:.0f} ms | "
+              f"total {r['total_ms']:.0f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
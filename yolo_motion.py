@@ -0,0 +1,312 @@
+import sys
+import time
+import argparse
+from typing import Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from yolo_tiling import merge_detections
+
+# Região com movimento no frame: (x, y, largura, altura)
+Region = Tuple[int, int, int, int]
+MOTION_METHODS = ["diff", "mog2"]
+
+
+def _merge_regions(regions: List[Region]) -> List[Region]:
+    # Junta retângulos que se sobrepõem até restarem só regiões disjuntas
+    boxes = [list(r) for r in regions]
+    merged = True
+    while merged and len(boxes) > 1:
+        merged = False
+        out: List[List[int]] = []
+        for b in boxes:
+            for o in out:
+                if b[0] < o[0] + o[2] and o[0] < b[0] + b[2] and b[1] < o[1] + o[3] and o[1] < b[1] + b[3]:
+                    x1, y1 = min(b[0], o[0]), min(b[1], o[1])
+                    x2, y2 = max(b[0] + b[2], o[0] + o[2]), max(b[1] + b[3], o[1] + o[3])
+                    o[:] = [x1, y1, x2 - x1, y2 - y1]
+                    merged = True
+                    break
+            else:
+                out.append(b)
+        boxes = out
+    return [tuple(b) for b in boxes]
+
+
+class MotionGate:
+    # Detector de movimento barato sobre o frame reduzido (cinza, largura `width`):
+    # - diff: diferença absoluta contra o frame de referência (o da última inferência), então
+    #   mudanças lentas também acumulam até disparar
+    # - mog2: subtração de fundo (cv2.createBackgroundSubtractorMOG2) sem detecção de sombras
+    #   (um veículo escuro sobre asfalto claro seria classificado como sombra e ignorado)
+    # Há movimento se a fração de pixels alterados passar de min_area.
+    def __init__(
+        self,
+        method: str = "diff",
+        width: int = 160,
+        pixel_threshold: int = 15,
+        min_area: float = 0.002,
+        blur: int = 5,
+    ):
+        if method not in MOTION_METHODS:
+            raise ValueError(f"Método de movimento desconhecido: {method} (opções: {', '.join(MOTION_METHODS)})")
+        self.method = method
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.min_area = min_area
+        self.blur = blur | 1
+        self._reference: Optional[np.ndarray] = None
+        self._small: Optional[np.ndarray] = None
+        self._subtractor = (cv2.createBackgroundSubtractorMOG2(history=500, varThreshold=16, detectShadows=False)
+                            if method == "mog2" else None)
+        self._kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+
+    def _downscale(self, frame: np.ndarray) -> np.ndarray:
+        h, w = frame.shape[:2]
+        small_h = max(1, round(h * self.width / w))
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        small = cv2.resize(gray, (self.width, small_h), interpolation=cv2.INTER_AREA)
+        return cv2.GaussianBlur(small, (self.blur, self.blur), 0) if self.blur > 1 else small
+
+    def check(self, frame: np.ndarray) -> Tuple[bool, np.ndarray, float]:
+        # Retorna (houve movimento, máscara reduzida uint8, fração de pixels alterados).
+        # Sem referência (primeiro frame) sempre reporta movimento.
+        small = self._downscale(frame)
+        self._small = small
+        if self._subtractor is not None:
+            mask = self._subtractor.apply(small)
+            first = self._reference is None
+            self._reference = small
+        else:
+            if self._reference is None or self._reference.shape != small.shape:
+                self._reference = small
+                return True, np.full(small.shape, 255, dtype=np.uint8), 1.0
+            diff = cv2.absdiff(small, self._reference)
+            _, mask = cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)
+            first = False
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, self._kernel)
+        fraction = float(np.count_nonzero(mask)) / mask.size
+        return first or fraction >= self.min_area, mask, fraction
+
+    def accept(self) -> None:
+        # Chamado após uma inferência: o frame atual vira a referência do modo diff
+        if self._subtractor is None and self._small is not None:
+            self._reference = self._small
+
+    def regions(self, mask: np.ndarray, frame_w: int, frame_h: int, pad: int = 16,
+                min_size: int = 0) -> List[Region]:
+        # Caixas das áreas com movimento em coordenadas do frame, com margem e tamanho mínimo
+        # (contexto para o detector), fundidas em regiões disjuntas
+        mask = cv2.dilate(mask, self._kernel, iterations=2)
+        n, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        sx, sy = frame_w / mask.shape[1], frame_h / mask.shape[0]
+        regions: List[Region] = []
+        for x, y, w, h, area in stats[1:n]:
+            x1, y1 = int(x * sx) - pad, int(y * sy) - pad
+            x2, y2 = int((x + w) * sx) + pad, int((y + h) * sy) + pad
+            # Garante o tamanho mínimo crescendo em volta do centro
+            if x2 - x1 < min_size:
+                cx = (x1 + x2) // 2
+                x1, x2 = cx - min_size // 2, cx + min_size - min_size // 2
+            if y2 - y1 < min_size:
+                cy = (y1 + y2) // 2
+                y1, y2 = cy - min_size // 2, cy + min_size - min_size // 2
+            x1, y1 = max(0, x1), max(0, y1)
+            x2, y2 = min(frame_w, x2), min(frame_h, y2)
+            if x2 > x1 and y2 > y1:
+                regions.append((x1, y1, x2 - x1, y2 - y1))
+        return _merge_regions(regions)
+
+
+def region_input_size(crop_w: int, crop_h: int, frame_w: int, frame_h: int,
+                      input_size: Tuple[int, int]) -> Tuple[int, int]:
+    # Entrada da rede para um recorte na mesma escala do frame inteiro (objetos com o mesmo tamanho
+    # em pixels de entrada), em múltiplos de 32: o custo cai com a área do recorte
+    w = min(input_size[0], max(64, int(np.ceil(crop_w * input_size[0] / frame_w / 32)) * 32))
+    h = min(input_size[1], max(64, int(np.ceil(crop_h * input_size[1] / frame_h / 32)) * 32))
+    return (w, h)
+
+
+class MotionGatedDetector:
+    # Roda a inferência só quando a cena muda; em frames estáticos reutiliza as últimas detecções.
+    # Com region_detect_fn(recorte, input_size) (ex.: lambda crop, size: detector.detect(crop, input_size=size)),
+    # quando o movimento cobre pouco do frame só as regiões com movimento passam pelo detector, cada
+    # uma com entrada proporcional ao seu tamanho (region_input_size): detecções antigas que tocam
+    # essas regiões são substituídas pelas novas.
+    # refresh_every força uma inferência completa após N frames pulados seguidos (0 desativa).
+    def __init__(
+        self,
+        detect_fn: Callable[[np.ndarray], List[Dict]],
+        gate: MotionGate,
+        region_detect_fn: Optional[Callable[[np.ndarray, Tuple[int, int]], List[Dict]]] = None,
+        input_size: Tuple[int, int] = (416, 416),
+        max_region_fraction: float = 0.4,
+        min_region_size: int = 160,
+        refresh_every: int = 0,
+    ):
+        self.detect_fn = detect_fn
+        self.gate = gate
+        self.region_detect_fn = region_detect_fn
+        self.input_size = input_size
+        self.max_region_fraction = max_region_fraction
+        self.min_region_size = min_region_size
+        self.refresh_every = refresh_every
+        self.last_detections: List[Dict] = []
+        self.frames = 0
+        self.skipped = 0
+        self.full = 0
+        self.regional = 0
+        self._static_run = 0
+
+    def process(self, frame: np.ndarray) -> List[Dict]:
+        self.frames += 1
+        moving, mask, _ = self.gate.check(frame)
+        force = self.refresh_every > 0 and self._static_run >= self.refresh_every
+        if not moving and not force:
+            self.skipped += 1
+            self._static_run += 1
+            return self.last_detections
+        self._static_run = 0
+        if self.region_detect_fn is not None and moving and not force and self.full > 0:
+            h, w = frame.shape[:2]
+            regions = self._with_previous(self.gate.regions(mask, w, h, min_size=self.min_region_size), w, h)
+            if regions and sum(rw * rh for _, _, rw, rh in regions) <= self.max_region_fraction * w * h:
+                self.last_detections = self._detect_regions(frame, regions)
+                self.regional += 1
+                self.gate.accept()
+                return self.last_detections
+        self.last_detections = self.detect_fn(frame)
+        self.full += 1
+        self.gate.accept()
+        return self.last_detections
+
+    def _with_previous(self, regions: List[Region], frame_w: int, frame_h: int) -> List[Region]:
+        # No modo diff a máscara marca só as bordas que mudaram: o interior de um objeto que andou pouco
+        # fica fora das regiões e o recorte o cortaria ao meio. Cada região cresce até cobrir as
+        # detecções anteriores que toca (que seriam substituídas de qualquer forma)
+        grown: List[Region] = []
+        for x, y, w, h in regions:
+            x1, y1, x2, y2 = x, y, x + w, y + h
+            for det in self.last_detections:
+                bx, by, bw, bh = det["box"]
+                if bx < x2 and x1 < bx + bw and by < y2 and y1 < by + bh:
+                    x1, y1 = max(0, min(x1, bx)), max(0, min(y1, by))
+                    x2, y2 = min(frame_w, max(x2, bx + bw)), min(frame_h, max(y2, by + bh))
+            grown.append((x1, y1, x2 - x1, y2 - y1))
+        return _merge_regions(grown)
+
+    def _detect_regions(self, frame: np.ndarray, regions: List[Region]) -> List[Dict]:
+        fh, fw = frame.shape[:2]
+        fresh: List[Dict] = []
+        for ox, oy, rw, rh in regions:
+            size = region_input_size(rw, rh, fw, fh, self.input_size)
+            for det in self.region_detect_fn(frame[oy:oy + rh, ox:ox + rw], size):
+                bx, by, bw, bh = det["box"]
+                fresh.append({**det, "box": (bx + ox, by + oy, bw, bh)})
+
+        def touches(box) -> bool:
+            bx, by, bw, bh = box
+            return any(bx < x + w and x < bx + bw and by < y + h and y < by + bh for x, y, w, h in regions)
+
+        kept = [d for d in self.last_detections if not touches(d["box"])]
+        if len(regions) > 1:
+            fresh = merge_detections(fresh, "nms", 0.5, "ios")
+        return kept + fresh
+
+    def skip_ratio(self) -> float:
+        return self.skipped / self.frames if self.frames else 0.0
+
+    def label(self) -> str:
+        # Texto curto para overlay
+        return (f"Movimento: {self.skip_ratio() * 100:.0f}% pulados "
+                f"({self.full} completos, {self.regional} regionais)")
+
+
+def synthetic_scene(num_frames: int = 300, width: int = 1280, height: int = 720, moving_fraction: float = 0.2,
+                    noise: int = 3, seed: int = 0):
+    # Câmera fixa sintética: fundo estático com ruído de sensor e um objeto que atravessa a cena
+    # em `moving_fraction` dos frames (no meio da sequência)
+    rng = np.random.default_rng(seed)
+    background = cv2.GaussianBlur(rng.integers(0, 256, (height, width, 3), dtype=np.uint8), (0, 0), 8)
+    moving = int(num_frames * moving_fraction)
+    start = (num_frames - moving) // 2
+    for i in range(num_frames):
+        frame = background.copy()
+        if start <= i < start + moving:
+            x = int((i - start) / max(1, moving - 1) * (width - 200))
+            cv2.rectangle(frame, (x, height // 2 - 60), (x + 160, height // 2 + 60), (40, 40, 220), -1)
+        if noise:
+            n = rng.integers(-noise, noise + 1, frame.shape, dtype=np.int16)
+            frame = np.clip(frame.astype(np.int16) + n, 0, 255).astype(np.uint8)
+        yield frame
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Inferência com gate de movimento: compara com/sem gate")
+    parser.add_argument("video", nargs="?", default=None, help="Vídeo de entrada (default: cena sintética)")
+    parser.add_argument("--frames", type=int, default=300, help="Frames da cena sintética / limite do vídeo")
+    parser.add_argument("--method", type=str, choices=MOTION_METHODS, default="diff")
+    parser.add_argument("--threshold", type=int, default=15, help="Diferença mínima de intensidade por pixel")
+    parser.add_argument("--min-area", type=float, default=0.002, help="Fração mínima de pixels alterados")
+    parser.add_argument("--regions", action="store_true", help="Só infere nas regiões com movimento")
+    parser.add_argument("--refresh", type=int, default=0, help="Inferência completa após N frames pulados (0 desativa)")
+    parser.add_argument("--input-size", type=str, default="416x416")
+    parser.add_argument("--cfg", type=str, default=None, help="Caminho para .cfg (default: modelo sintético)")
+    parser.add_argument("--weights", type=str, default=None)
+    parser.add_argument("--names", type=str, default=None)
+    return parser.parse_args()
+
+
+def main() -> int:
+    import tempfile
+    from yolo_inference import YoloDetector
+
+    args = parse_args()
+    w_str, h_str = args.input_size.lower().split("x")
+    input_size = (int(w_str), int(h_str))
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.cfg and args.weights and args.names:
+            cfg, weights, names = args.cfg, args.weights, args.names
+        else:
+            from yolo_benchmark import write_tiny_darknet_model
+            cfg, weights, names = write_tiny_darknet_model(tmp)
+        detector = YoloDetector(cfg, weights, names, conf_threshold=0.25, input_size=input_size)
+        detector.warmup(input_size)
+
+    if args.video:
+        cap = cv2.VideoCapture(args.video)
+        frames = []
+        while len(frames) < args.frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+    else:
+        frames = list(synthetic_scene(args.frames))
+    if not frames:
+        print("Nenhum frame lido")
+        return 3
+
+    def detect(frame: np.ndarray) -> List[Dict]:
+        return detector.detect(frame, input_size=input_size)
+
+    gate = MotionGate(args.method, pixel_threshold=args.threshold, min_area=args.min_area)
+    region_fn = (lambda crop, size: detector.detect(crop, input_size=size)) if args.regions else None
+    gated = MotionGatedDetector(detect, gate, region_fn, input_size=input_size, refresh_every=args.refresh)
+    results = {}
+    for label, fn in (("sem gate", detect), ("com gate", gated.process)):
+        cpu0, t0 = time.process_time(), time.perf_counter()
+        for frame in frames:
+            fn(frame)
+        results[label] = (time.perf_counter() - t0, time.process_time() - cpu0)
+    for label, (wall, cpu) in results.items():
+        print(f"{label}: {len(frames) / wall:.1f} FPS | CPU {cpu * 1000 / len(frames):.1f} ms/frame")
+    print(f"Gate ({args.method}): {gated.skipped}/{gated.frames} frames pulados ({gated.skip_ratio() * 100:.0f}%), "
+          f"{gated.full} inferências completas, {gated.regional} regionais")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
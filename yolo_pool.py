@@ -0,0 +1,328 @@
+import os
+import sys
+import queue
+import argparse
+import threading
+import time
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from collections import deque
+from concurrent.futures import Future
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+
+def _pool_worker(
+    detector_kwargs: Optional[Dict],
+    slot_names: List[str],
+    input_size: Tuple[int, int],
+    threads_per_worker: int,
+    task_q: "mp.Queue",
+    result_q: "mp.Queue",
+) -> None:
+    # Processo worker: carrega a rede uma única vez e processa frames lidos da memória compartilhada
+    import cv2
+    from yolo_inference import YoloDetector, build_detector_from_env
+
+    if threads_per_worker > 0:
+        cv2.setNumThreads(threads_per_worker)
+        # Mesmo limite para o backend onnxruntime
+        os.environ["YOLO_NUM_THREADS"] = str(threads_per_worker)
+    try:
+        if detector_kwargs:
+            detector = YoloDetector(**detector_kwargs)
+        else:
+            detector = build_detector_from_env(input_size=input_size)
+        # Aquece antes de sinalizar "ready": o primeiro frame real não paga a inicialização da rede
+        detector.warmup(input_size)
+    except Exception as e:
+        result_q.put(("init_error", None, f"{type(e).__name__}: {e}"))
+        return
+    slots = [shared_memory.SharedMemory(name=name) for name in slot_names]
+    result_q.put(("ready", None, None))
+    try:
+        while True:
+            task = task_q.get()
+            if task is None:
+                break
+            job_id, slot_idx, shape, dtype = task
+            frame = np.ndarray(shape, dtype=dtype, buffer=slots[slot_idx].buf)
+            try:
+                detections = detector.detect(frame, input_size=input_size)
+                result_q.put((job_id, slot_idx, detections))
+            except Exception as e:
+                result_q.put((job_id, slot_idx, RuntimeError(f"{type(e).__name__}: {e}")))
+            del frame
+    finally:
+        for shm in slots:
+            shm.close()
+
+
+class DetectorPool:
+    # Pool de processos com um YoloDetector por worker.
+    # Frames são copiados para slots de memória compartilhada (sem pickling dos arrays);
+    # apenas metadados e as detecções trafegam pelas filas.
+    def __init__(
+        self,
+        num_workers: Optional[int] = None,
+        detector_kwargs: Optional[Dict] = None,
+        input_size: Tuple[int, int] = (416, 416),
+        max_frame_shape: Tuple[int, int, int] = (1080, 1920, 3),
+        slots_per_worker: int = 2,
+        threads_per_worker: int = 1,
+        start_timeout: float = 120.0,
+    ):
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.input_size = input_size
+        self._slot_bytes = int(np.prod(max_frame_shape)) * np.dtype(np.uint8).itemsize
+        num_slots = max(1, self.num_workers * slots_per_worker)
+
+        self._ctx = mp.get_context("spawn")
+        self._task_q = self._ctx.Queue()
+        self._result_q = self._ctx.Queue()
+        self._slots = [shared_memory.SharedMemory(create=True, size=self._slot_bytes) for _ in range(num_slots)]
+        self._free_slots: "queue.Queue[int]" = queue.Queue()
+        for i in range(num_slots):
+            self._free_slots.put(i)
+        self._pending: Dict[int, Future] = {}
+        self._pending_lock = threading.Lock()
+        self._next_id = 0
+        self._closed = False
+        # Mensagem de erro quando um worker morre: o pool deixa de aceitar jobs
+        self._broken: Optional[str] = None
+
+        self._procs = [
+            self._ctx.Process(
+                target=_pool_worker,
+                args=(detector_kwargs, [s.name for s in self._slots], input_size, threads_per_worker,
+                      self._task_q, self._result_q),
+                daemon=True,
+            )
+            for _ in range(self.num_workers)
+        ]
+        for p in self._procs:
+            p.start()
+        try:
+            self._wait_ready(start_timeout)
+        except Exception:
+            self.shutdown()
+            raise
+        self._collector = threading.Thread(target=self._collect_results, name="pool-results", daemon=True)
+        self._collector.start()
+
+    @property
+    def num_slots(self) -> int:
+        return len(self._slots)
+
+    def _wait_ready(self, timeout: float) -> None:
+        # Aguarda cada worker carregar a rede; falha cedo se algum não inicializar
+        deadline = time.monotonic() + timeout
+        ready = 0
+        while ready < self.num_workers:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("Workers do DetectorPool não inicializaram a tempo")
+            try:
+                kind, _, payload = self._result_q.get(timeout=min(remaining, 0.5))
+            except queue.Empty:
+                dead = self._dead_worker()
+                if dead is not None:
+                    raise RuntimeError(f"Worker do DetectorPool morreu durante a inicialização ({dead})")
+                continue
+            if kind == "init_error":
+                raise RuntimeError(f"Falha ao inicializar worker: {payload}")
+            ready += 1
+
+    def _dead_worker(self) -> Optional[str]:
+        # Descrição do primeiro worker encerrado (ex.: morto por sinal), ou None se todos vivos
+        for p in self._procs:
+            if p.exitcode is not None:
+                return f"pid {p.pid}, exitcode {p.exitcode}"
+        return None
+
+    def _fail_pending(self, reason: str) -> None:
+        # Marca o pool como quebrado e falha todas as futures pendentes: a fila de tarefas é
+        # compartilhada, então não dá para saber quais jobs estavam com o worker morto
+        with self._pending_lock:
+            self._broken = reason
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for fut in pending:
+            fut.set_exception(RuntimeError(f"DetectorPool quebrado: {reason}"))
+
+    def _collect_results(self) -> None:
+        # Thread que recebe resultados dos workers, resolve as futures e libera os slots.
+        # Sem resultados por um tempo, verifica se algum worker morreu (senão as futures nunca resolvem).
+        while True:
+            try:
+                item = self._result_q.get(timeout=0.5)
+            except queue.Empty:
+                if self._closed:
+                    continue
+                dead = self._dead_worker()
+                if dead is not None:
+                    self._fail_pending(f"worker morreu ({dead})")
+                    break
+                continue
+            if item is None:
+                break
+            job_id, slot_idx, payload = item
+            with self._pending_lock:
+                fut = self._pending.pop(job_id, None)
+            self._free_slots.put(slot_idx)
+            if fut is None:
+                continue
+            if isinstance(payload, BaseException):
+                fut.set_exception(payload)
+            else:
+                fut.set_result(payload)
+
+    def submit(self, frame: np.ndarray) -> Future:
+        # Copia o frame para um slot livre (bloqueia se todos estiverem em uso) e enfileira o job
+        if self._closed:
+            raise RuntimeError("DetectorPool já foi encerrado")
+        if self._broken is not None:
+            raise RuntimeError(f"DetectorPool quebrado: {self._broken}")
+        if frame is None or frame.size == 0:
+            raise ValueError("Imagem inválida para detecção")
+        if frame.nbytes > self._slot_bytes:
+            raise ValueError(f"Frame de {frame.nbytes} bytes excede o slot de {self._slot_bytes} bytes (max_frame_shape)")
+        while True:
+            try:
+                slot_idx = self._free_slots.get(timeout=0.5)
+                break
+            except queue.Empty:
+                if self._broken is not None:
+                    raise RuntimeError(f"DetectorPool quebrado: {self._broken}")
+        dst = np.ndarray(frame.shape, dtype=frame.dtype, buffer=self._slots[slot_idx].buf)
+        dst[...] = frame
+        del dst
+        fut: Future = Future()
+        with self._pending_lock:
+            if self._broken is not None:
+                self._free_slots.put(slot_idx)
+                raise RuntimeError(f"DetectorPool quebrado: {self._broken}")
+            job_id = self._next_id
+            self._next_id += 1
+            self._pending[job_id] = fut
+        self._task_q.put((job_id, slot_idx, frame.shape, frame.dtype.str))
+        return fut
+
+    def map(self, frames: Iterable[np.ndarray]) -> Iterator[List[Dict]]:
+        # Processa um iterável de frames em paralelo e devolve os resultados na ordem de submissão.
+        # Mantém no máximo num_slots frames em voo, então a memória não cresce com o tamanho da entrada.
+        in_flight: "deque[Future]" = deque()
+        for frame in frames:
+            if len(in_flight) >= self.num_slots:
+                yield in_flight.popleft().result()
+            in_flight.append(self.submit(frame))
+        while in_flight:
+            yield in_flight.popleft().result()
+
+    def shutdown(self, timeout: float = 10.0) -> None:
+        # Encerra workers, a thread coletora e libera a memória compartilhada
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._procs:
+            self._task_q.put(None)
+        # Com um worker morto o pool já está quebrado e os vivos podem nunca receber o sentinela
+        # (o morto pode ter levado junto o lock de leitura da fila de tarefas): espera curta e terminate
+        broken = self._broken is not None or self._dead_worker() is not None
+        join_timeout = min(timeout, 1.0) if broken else timeout
+        for p in self._procs:
+            p.join(timeout=join_timeout)
+            if p.is_alive():
+                p.terminate()
+                p.join()
+        collector = getattr(self, "_collector", None)
+        if collector is not None:
+            # Sentinela só se a coletora ainda estiver rodando; após a falha ela já saiu e ninguém leria
+            if collector.is_alive() and self._broken is None:
+                self._result_q.put(None)
+            collector.join(timeout=timeout)
+        with self._pending_lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for fut in pending:
+            fut.cancel()
+        # Sem isso a saída do interpretador espera as threads alimentadoras das filas, que podem
+        # estar bloqueadas escrevendo num pipe que nenhum processo vai ler
+        for q in (self._task_q, self._result_q):
+            q.cancel_join_thread()
+            q.close()
+        for shm in self._slots:
+            shm.close()
+            shm.unlink()
+
+    def __enter__(self) -> "DetectorPool":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.shutdown()
+
+
+def parse_args() -> argparse.Namespace:
+    from yolo_backends import BACKENDS
+
+    parser = argparse.ArgumentParser(description="Inferência YOLO em paralelo com pool de processos sobre um vídeo")
+    parser.add_argument("video", type=str, help="Caminho do arquivo de vídeo")
+    parser.add_argument("--workers", type=int, default=None, help="Número de processos (default: nº de CPUs)")
+    parser.add_argument("--input-size", type=str, default="416x416", help="Tamanho de entrada da rede, ex: 416x416")
+    parser.add_argument("--conf", type=float, default=0.5, help="Confiança mínima")
+    parser.add_argument("--nms", type=float, default=0.4, help="NMS threshold")
+    parser.add_argument("--cfg", type=str, default=None, help="Caminho para .cfg (sobrepõe .env)")
+    parser.add_argument("--weights", type=str, default=None, help="Caminho para .weights (sobrepõe .env)")
+    parser.add_argument("--names", type=str, default=None, help="Caminho para .names (sobrepõe .env)")
+    parser.add_argument("--backend", type=str, choices=BACKENDS,
+                        default=None, help="Backend de inferência dos workers (default: YOLO_BACKEND do .env ou opencv)")
+    return parser.parse_args()
+
+
+def _read_frames(cap) -> Iterator[np.ndarray]:
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        yield frame
+
+
+def main() -> int:
+    import cv2
+
+    args = parse_args()
+    w_str, h_str = args.input_size.lower().split("x")
+    input_size = (int(w_str), int(h_str))
+    # kwargs explícitos em todos os casos: sem eles os workers iriam para build_detector_from_env()
+    # e ignorariam --conf, --nms, --backend e --input-size
+    if args.cfg and args.weights and args.names:
+        detector_kwargs = dict(cfg_path=args.cfg, weights_path=args.weights, names_path=args.names,
+                               conf_threshold=args.conf, nms_threshold=args.nms, backend=args.backend or "opencv",
+                               input_size=input_size)
+    else:
+        from yolo_inference import resolve_detector_config
+
+        detector_kwargs = resolve_detector_config(args.conf, args.nms, backend=args.backend, input_size=input_size)
+    cap = cv2.VideoCapture(args.video)
+    if not cap.isOpened():
+        print(f"Não foi possível abrir o vídeo: {args.video}")
+        return 3
+    w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) or 1920
+    h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) or 1080
+    with DetectorPool(args.workers, detector_kwargs, input_size=input_size, max_frame_shape=(h, w, 3)) as pool:
+        start = time.perf_counter()
+        frames = 0
+        total_dets = 0
+        for detections in pool.map(_read_frames(cap)):
+            frames += 1
+            total_dets += len(detections)
+        elapsed = time.perf_counter() - start
+    cap.release()
+    fps = frames / elapsed if elapsed > 0 else 0.0
+    print(f"{frames} frames em {elapsed:.2f}s ({fps:.1f} FPS) com {pool.num_workers} workers; {total_dets} detecções")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,19 @@
 import os
 import sys
+import time
+import queue
 import argparse
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
 import cv2
+import numpy as np
+from yolo_backends import BACKENDS
 from yolo_inference import build_detector_from_env, YoloDetector
+from yolo_metrics import DetectorMetrics
+from yolo_tracker import TrackingDetector
+from yolo_tiling import TiledDetector, load_roi_mask
+from yolo_adaptive import AdaptiveController, AdaptiveDetector, build_operating_points
+from yolo_motion import MOTION_METHODS, MotionGate, MotionGatedDetector
 
 # Lista de classes do dataset custom utilizado no projeto
 CLASSES = ['car', 'motorbike', 'threewheel', 'van', 'bus', 'truck']
@@ -17,9 +28,51 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--conf", type=float, default=None, help="Confiança mínima")
     parser.add_argument("--nms", type=float, default=None, help="NMS threshold")
     parser.add_argument("--gpu", action="store_true", help="Usar CUDA (se disponível)")
+    parser.add_argument("--backend", type=str, choices=BACKENDS, default=None,
+                        help="Backend de inferência (default: YOLO_BACKEND do .env ou opencv)")
     parser.add_argument("--cfg", type=str, default=None, help="Caminho para .cfg (sobrepõe .env)")
     parser.add_argument("--weights", type=str, default=None, help="Caminho para .weights (sobrepõe .env)")
     parser.add_argument("--names", type=str, default=None, help="Caminho para .names (sobrepõe .env)")
+    parser.add_argument("--mode", type=str, choices=["serial", "pipelined"], default="serial",
+                        help="serial: captura/inferência/exibição em sequência; pipelined: threads com filas limitadas")
+    parser.add_argument("--metrics", action="store_true", help="Mostra FPS e tempos por estágio do detector no overlay")
+    parser.add_argument("--metrics-port", type=int, default=0, help="Expõe /metrics (Prometheus) nesta porta (0 desativa)")
+    parser.add_argument("--metrics-file", type=str, default=None, help="Grava as métricas ao sair (.json ou texto Prometheus)")
+    parser.add_argument("--track", action="store_true",
+                        help="Rastreia objetos (IDs estáveis e contagem por classe) entre detecções")
+    parser.add_argument("--detect-every", type=int, default=3,
+                        help="Com --track, roda o detector completo a cada N frames e propaga as boxes nos demais")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Ajusta tamanho de entrada/pulo de frames para manter a latência alvo")
+    parser.add_argument("--target-latency", type=float, default=None, help="Latência alvo por frame em ms (modo adaptativo)")
+    parser.add_argument("--target-fps", type=float, default=None, help="FPS alvo (alternativa a --target-latency)")
+    parser.add_argument("--adaptive-sizes", type=str, default="608,416,320",
+                        help="Tamanhos de entrada permitidos no modo adaptativo, ex: 608,416,320")
+    parser.add_argument("--max-skip", type=int, default=2, help="Máximo de frames pulados entre detecções no modo adaptativo")
+    parser.add_argument("--tiles", action="store_true",
+                        help="Inferência fatiada: tiles sobrepostos em resolução nativa, em um único lote")
+    parser.add_argument("--tile-size", type=int, default=416, help="Lado do tile em pixels do frame (modo --tiles)")
+    parser.add_argument("--tile-overlap", type=float, default=0.2, help="Sobreposição entre tiles (fração, modo --tiles)")
+    parser.add_argument("--tile-merge", type=str, choices=["nms", "wbf"], default="nms",
+                        help="Fusão das detecções entre tiles: nms ou weighted box fusion")
+    parser.add_argument("--no-full-frame", action="store_true",
+                        help="Com --tiles, não inclui o frame inteiro reduzido no lote")
+    parser.add_argument("--roi-mask", type=str, default=None,
+                        help="Imagem de máscara (branco = região de interesse); com --tiles só processa tiles na ROI")
+    parser.add_argument("--motion-gate", action="store_true",
+                        help="Pula a inferência em frames sem movimento (câmera fixa), reutilizando as últimas detecções")
+    parser.add_argument("--motion-method", type=str, choices=MOTION_METHODS, default="diff",
+                        help="diff: diferença contra o frame da última inferência; mog2: subtração de fundo")
+    parser.add_argument("--motion-threshold", type=int, default=15,
+                        help="Diferença mínima de intensidade por pixel (frame reduzido, modo diff)")
+    parser.add_argument("--motion-min-area", type=float, default=0.002,
+                        help="Fração mínima de pixels alterados para considerar movimento")
+    parser.add_argument("--motion-regions", action="store_true",
+                        help="Com --motion-gate, infere só nas regiões com movimento quando elas cobrem pouco do frame")
+    parser.add_argument("--motion-refresh", type=int, default=300,
+                        help="Força uma inferência completa após N frames pulados seguidos (0 desativa)")
+    parser.add_argument("--stats-interval", type=float, default=5.0,
+                        help="Intervalo (s) para imprimir tempos por estágio (0 desativa)")
     return parser.parse_args()
 
 
@@ -33,63 +86,321 @@ def make_detector(args: argparse.Namespace) -> YoloDetector:
             conf_threshold=args.conf if args.conf is not None else 0.5,
             nms_threshold=args.nms if args.nms is not None else 0.4,
             use_gpu=args.gpu,
+            backend=args.backend or "opencv",
+            input_size=parse_input_size(args.input_size),
         )
-    return build_detector_from_env(conf_threshold=args.conf, nms_threshold=args.nms, use_gpu=args.gpu)
+    return build_detector_from_env(conf_threshold=args.conf, nms_threshold=args.nms, use_gpu=args.gpu,
+                                   backend=args.backend, input_size=parse_input_size(args.input_size))
 
 
-def main() -> int:
-    # Loop principal de captura da câmera, inferência e exibição com overlay
-    args = parse_args()
-    try:
-        detector = make_detector(args)
-    except Exception as e:
-        print(f"Erro ao inicializar o detector: {e}")
-        return 2
+class StageStats:
+    # Acumula tempos (ms) por estágio do pipeline; seguro para uso entre threads
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals: Dict[str, float] = {}
+        self._counts: Dict[str, int] = {}
+        self._max: Dict[str, float] = {}
+        self.dropped: Dict[str, int] = {}
 
-    cap = cv2.VideoCapture(args.camera)
-    if not cap.isOpened():
-        print("Não foi possível abrir a câmera")
-        return 3
-    if args.width > 0 and args.height > 0:
-        cap.set(cv2.CAP_PROP_FRAME_WIDTH, args.width)
-        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, args.height)
+    def add(self, stage: str, ms: float) -> None:
+        with self._lock:
+            self._totals[stage] = self._totals.get(stage, 0.0) + ms
+            self._counts[stage] = self._counts.get(stage, 0) + 1
+            self._max[stage] = max(self._max.get(stage, 0.0), ms)
+
+    def drop(self, stage: str) -> None:
+        with self._lock:
+            self.dropped[stage] = self.dropped.get(stage, 0) + 1
 
+    def summary(self) -> str:
+        with self._lock:
+            parts = []
+            for stage, total in self._totals.items():
+                n = self._counts[stage]
+                parts.append(f"{stage}: {total / n:.1f} ms (max {self._max[stage]:.1f}, n={n})")
+            for stage, n in self.dropped.items():
+                parts.append(f"descartados em {stage}: {n}")
+            return " | ".join(parts)
+
+
+def put_latest(q: "queue.Queue", item, stats: StageStats, stage: str) -> None:
+    # Política "último frame vence": se a fila estiver cheia, descarta o item antigo
+    while True:
+        try:
+            q.put_nowait(item)
+            return
+        except queue.Full:
+            try:
+                q.get_nowait()
+                stats.drop(stage)
+            except queue.Empty:
+                pass
+
+
+def parse_input_size(value: str) -> Tuple[int, int]:
+    # Converte "416x416" em (416, 416); usa o padrão se o formato for inválido
     try:
-        w_str, h_str = args.input_size.lower().split("x")
-        input_size = (int(w_str), int(h_str))
+        w_str, h_str = value.lower().split("x")
+        return (int(w_str), int(h_str))
     except Exception:
-        input_size = (416, 416)
+        return (416, 416)
+
+
+def draw_overlays(frame_out: np.ndarray, detections: List[Dict], status: Optional[str] = None) -> None:
+    # Desenha instrução de saída na tela
+    overlay1 = "Pressione 'q' para sair"
+    (tw1, th1), _ = cv2.getTextSize(overlay1, cv2.FONT_HERSHEY_SIMPLEX, 0.8, 2)
+    cv2.rectangle(frame_out, (8, 8), (8 + tw1 + 6, 8 + th1 + 10), (0, 0, 0), -1)
+    cv2.putText(frame_out, overlay1, (12, 8 + th1 + 2), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+    # Coleta classes detectadas do dataset custom e exibe overlay se houver
+    hits = sorted({d['class_name'] for d in detections if d.get('class_name') in CLASSES})
+    if hits:
+        overlay2 = "Detectadas: " + ", ".join(hits)
+        (tw2, th2), _ = cv2.getTextSize(overlay2, cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2)
+        y0 = 20 + th1 + 16
+        cv2.rectangle(frame_out, (8, y0), (8 + tw2 + 6, y0 + th2 + 8), (0, 0, 0), -1)
+        cv2.putText(frame_out, overlay2, (12, y0 + th2 + 2), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+    # Linha de status (ex.: FPS e tempos por estágio) no canto inferior esquerdo
+    if status:
+        (tw3, th3), _ = cv2.getTextSize(status, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
+        y1 = frame_out.shape[0] - 8
+        cv2.rectangle(frame_out, (8, y1 - th3 - 8), (8 + tw3 + 6, y1), (0, 0, 0), -1)
+        cv2.putText(frame_out, status, (11, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
 
-    print("Pressione 'q' para sair")
+
+DetectFn = Callable[[np.ndarray], List[Dict]]
+StatusFn = Callable[[], Optional[str]]
+
+
+def run_serial(cap: cv2.VideoCapture, detector: YoloDetector, detect_fn: DetectFn,
+               stats: StageStats, stats_interval: float, status_fn: Optional[StatusFn] = None) -> None:
+    # Loop sequencial: captura -> inferência -> desenho -> exibição
+    last_report = time.perf_counter()
     while True:
+        t0 = time.perf_counter()
         ret, frame = cap.read()
+        t1 = time.perf_counter()
         if not ret:
             print("Falha ao capturar frame")
             break
+        stats.add("captura", (t1 - t0) * 1000.0)
+        detections: List[Dict] = []
         try:
-            detections = detector.detect(frame, input_size=input_size)
-            frame_out = detector.draw(frame, detections)
+            detections = detect_fn(frame)
+            t2 = time.perf_counter()
+            stats.add("inferência", (t2 - t1) * 1000.0)
+            # O frame lido é descartado após a exibição: desenha nele mesmo, sem cópia
+            frame_out = detector.draw(frame, detections, in_place=True)
         except Exception as e:
             print(f"Erro na detecção: {e}")
             frame_out = frame
-        # Desenha instrução de saída na tela
-        overlay1 = "Pressione 'q' para sair"
-        (tw1, th1), _ = cv2.getTextSize(overlay1, cv2.FONT_HERSHEY_SIMPLEX, 0.8, 2)
-        cv2.rectangle(frame_out, (8, 8), (8 + tw1 + 6, 8 + th1 + 10), (0, 0, 0), -1)
-        cv2.putText(frame_out, overlay1, (12, 8 + th1 + 2), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
-        # Coleta classes detectadas do dataset custom e exibe overlay se houver
-        hits = sorted({d['class_name'] for d in detections if d.get('class_name') in CLASSES})
-        if hits:
-            overlay2 = "Detectadas: " + ", ".join(hits)
-            (tw2, th2), _ = cv2.getTextSize(overlay2, cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2)
-            y0 = 20 + th1 + 16
-            cv2.rectangle(frame_out, (8, y0), (8 + tw2 + 6, y0 + th2 + 8), (0, 0, 0), -1)
-            cv2.putText(frame_out, overlay2, (12, y0 + th2 + 2), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+        t3 = time.perf_counter()
+        draw_overlays(frame_out, detections, status_fn() if status_fn is not None else None)
         cv2.imshow("YOLO - Detecção em tempo real", frame_out)
         key = cv2.waitKey(1) & 0xFF
+        stats.add("exibição", (time.perf_counter() - t3) * 1000.0)
+        if stats_interval > 0 and time.perf_counter() - last_report >= stats_interval:
+            print(stats.summary())
+            last_report = time.perf_counter()
         if key == ord("q"):
             break
 
+
+def run_pipelined(cap: cv2.VideoCapture, detector: YoloDetector, detect_fn: DetectFn,
+                  stats: StageStats, stats_interval: float, status_fn: Optional[StatusFn] = None) -> None:
+    # Pipeline com threads: captura e inferência rodam em paralelo à exibição.
+    # Filas de tamanho 1 com descarte do frame antigo evitam acúmulo de latência.
+    # A exibição fica na thread principal (exigência do highgui em várias plataformas).
+    frames_q: "queue.Queue" = queue.Queue(maxsize=1)
+    results_q: "queue.Queue" = queue.Queue(maxsize=1)
+    stop = threading.Event()
+
+    def capture_worker() -> None:
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            ret, frame = cap.read()
+            if not ret:
+                print("Falha ao capturar frame")
+                stop.set()
+                break
+            stats.add("captura", (time.perf_counter() - t0) * 1000.0)
+            put_latest(frames_q, (frame, time.perf_counter()), stats, "captura")
+
+    def inference_worker() -> None:
+        while not stop.is_set():
+            try:
+                frame, t_captured = frames_q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            t0 = time.perf_counter()
+            detections: List[Dict] = []
+            try:
+                detections = detect_fn(frame)
+                t1 = time.perf_counter()
+                stats.add("inferência", (t1 - t0) * 1000.0)
+                frame_out = detector.draw(frame, detections, in_place=True)
+                stats.add("desenho", (time.perf_counter() - t1) * 1000.0)
+            except Exception as e:
+                print(f"Erro na detecção: {e}")
+                frame_out = frame
+            put_latest(results_q, (frame_out, detections, t_captured), stats, "inferência")
+
+    threads = [
+        threading.Thread(target=capture_worker, name="captura", daemon=True),
+        threading.Thread(target=inference_worker, name="inferência", daemon=True),
+    ]
+    for t in threads:
+        t.start()
+
+    last_report = time.perf_counter()
+    try:
+        while not stop.is_set():
+            try:
+                frame_out, detections, t_captured = results_q.get(timeout=0.1)
+            except queue.Empty:
+                if (cv2.waitKey(1) & 0xFF) == ord("q"):
+                    break
+                continue
+            t0 = time.perf_counter()
+            draw_overlays(frame_out, detections, status_fn() if status_fn is not None else None)
+            cv2.imshow("YOLO - Detecção em tempo real", frame_out)
+            key = cv2.waitKey(1) & 0xFF
+            now = time.perf_counter()
+            stats.add("exibição", (now - t0) * 1000.0)
+            stats.add("latência fim-a-fim", (now - t_captured) * 1000.0)
+            if stats_interval > 0 and now - last_report >= stats_interval:
+                print(stats.summary())
+                last_report = now
+            if key == ord("q"):
+                break
+    finally:
+        stop.set()
+        for t in threads:
+            t.join(timeout=2.0)
+
+
+def main() -> int:
+    # Loop principal de captura da câmera, inferência e exibição com overlay
+    args = parse_args()
+    try:
+        detector = make_detector(args)
+        detector.warmup(parse_input_size(args.input_size))
+    except Exception as e:
+        print(f"Erro ao inicializar o detector: {e}")
+        return 2
+
+    cap = cv2.VideoCapture(args.camera)
+    if not cap.isOpened():
+        print("Não foi possível abrir a câmera")
+        return 3
+    if args.width > 0 and args.height > 0:
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, args.width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, args.height)
+
+    input_size = parse_input_size(args.input_size)
+
+    metrics: Optional[DetectorMetrics] = None
+    if args.metrics or args.metrics_port or args.metrics_file:
+        metrics = DetectorMetrics()
+        detector.instrumentation = metrics
+        if args.metrics_port:
+            metrics.serve(args.metrics_port)
+            print(f"Métricas Prometheus em http://localhost:{args.metrics_port}/metrics")
+
+    # Cadeia de processamento por frame: detector completo (ou fatiado), opcionalmente envolvido
+    # pelo controlador adaptativo e pelo rastreador
+    base_detect = detector.detect
+    if args.tiles:
+        roi_mask = None
+        if args.roi_mask:
+            frame_w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) or args.width
+            frame_h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) or args.height
+            roi_mask = load_roi_mask(args.roi_mask, frame_w, frame_h)
+        tiled = TiledDetector(detector, tile_size=args.tile_size, overlap=args.tile_overlap, merge=args.tile_merge,
+                              include_full_frame=not args.no_full_frame, roi_mask=roi_mask)
+        # Cada tile entra na rede com --input-size (igual a --tile-size evita reescala)
+        base_detect = tiled.detect
+        print(f"Modo fatiado: tiles de {args.tile_size}px, sobreposição {args.tile_overlap:.0%}, fusão {args.tile_merge}")
+
+    def detect_fn(frame: np.ndarray) -> List[Dict]:
+        return base_detect(frame, input_size=input_size)
+
+    controller: Optional[AdaptiveController] = None
+    if args.adaptive and detector.backend_name == "onnxruntime":
+        # O ONNX exportado tem entrada fixa: trocar de tamanho falharia na primeira mudança de ponto
+        print("--adaptive ignorado com backend onnxruntime (entrada fixa)")
+    elif args.adaptive:
+        if args.target_latency:
+            target_ms = args.target_latency
+        elif args.target_fps:
+            target_ms = 1000.0 / args.target_fps
+        else:
+            target_ms = 1000.0 / 15.0
+        points = build_operating_points([int(v) for v in args.adaptive_sizes.split(",") if v.strip()], args.max_skip)
+        # Começa no ponto cujo tamanho é o mais próximo do --input-size informado
+        start = min(range(len(points)), key=lambda i: abs(points[i][0] - input_size[0]) + 1000 * points[i][1])
+        controller = AdaptiveController(target_ms, points, start_index=start)
+        adaptive = AdaptiveDetector(lambda frame, size: base_detect(frame, input_size=size), controller)
+        detect_fn = adaptive.process
+        print(f"Modo adaptativo: alvo {target_ms:.1f} ms, pontos de operação {points}")
+
+    # Gate de movimento antes do rastreador: o controlador adaptativo só mede inferências reais
+    gated: Optional[MotionGatedDetector] = None
+    if args.motion_gate:
+        gate = MotionGate(args.motion_method, pixel_threshold=args.motion_threshold, min_area=args.motion_min_area)
+        region_fn = None
+        if args.motion_regions:
+            if args.tiles or args.adaptive or detector.backend_name == "onnxruntime":
+                print("--motion-regions ignorado com --tiles, --adaptive ou backend onnxruntime (entrada fixa)")
+            else:
+                def region_fn(crop: np.ndarray, size: Tuple[int, int]) -> List[Dict]:
+                    return detector.detect(crop, input_size=size)
+        gated = MotionGatedDetector(detect_fn, gate, region_fn, input_size=input_size,
+                                    refresh_every=args.motion_refresh)
+        detect_fn = gated.process
+        print(f"Gate de movimento: {args.motion_method}, limiar {args.motion_threshold}, "
+              f"área mínima {args.motion_min_area:.2%}{', por regiões' if region_fn else ''}")
+
+    tracker: Optional[TrackingDetector] = None
+    if args.track:
+        tracker = TrackingDetector(detect_fn, detect_every=args.detect_every)
+        detect_fn = tracker.process
+
+    def status_fn() -> Optional[str]:
+        parts = []
+        if metrics is not None and args.metrics:
+            parts.append(metrics.summary_line())
+        if controller is not None:
+            parts.append(controller.label())
+        if gated is not None:
+            parts.append(gated.label())
+        if tracker is not None:
+            counts = tracker.counts()
+            if counts:
+                parts.append("Contagem: " + ", ".join(f"{k} {v}" for k, v in counts.items()))
+        return " | ".join(parts) if parts else None
+
+    print(f"Modo: {args.mode}. Pressione 'q' para sair")
+    stats = StageStats()
+    if args.mode == "pipelined":
+        run_pipelined(cap, detector, detect_fn, stats, args.stats_interval, status_fn)
+    else:
+        run_serial(cap, detector, detect_fn, stats, args.stats_interval, status_fn)
+    print(f"Tempos por estágio ({args.mode}): {stats.summary()}")
+    if controller is not None:
+        print(f"Adaptativo: {controller.switches} trocas; ponto final {controller.current[0]}px skip {controller.skip}")
+    if gated is not None:
+        print(f"Gate de movimento: {gated.skipped}/{gated.frames} frames pulados ({gated.skip_ratio() * 100:.0f}%), "
+              f"{gated.full} inferências completas, {gated.regional} regionais")
+    if tracker is not None:
+        print(f"Rastreamento: {tracker.detect_ratio() * 100:.0f}% dos frames com detecção completa; "
+              f"contagem por classe: {tracker.counts()}")
+    if metrics is not None:
+        print(f"Detector: {metrics.summary_line()}")
+        if args.metrics_file:
+            metrics.dump(args.metrics_file)
+        metrics.close()
+
     cap.release()
     cv2.destroyAllWindows()
     return 0
@@ -0,0 +1,233 @@
+import sys
+import time
+import struct
+import argparse
+import tracemalloc
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+# Cabeçalho do formato binário: magic, versão, nº de detecções, bytes da tabela de classes
+_HEADER = struct.Struct("<4sIQQ")
+_MAGIC = b"YDET"
+_VERSION = 1
+
+
+def _align8(n: int) -> int:
+    return (n + 7) & ~7
+
+
+class Detections:
+    # Resultado colunar de detecção: boxes (N, 4) int32 em (x, y, w, h), scores (N,) float32,
+    # class_ids (N,) int32 e frame_ids (N,) int64, com a tabela de nomes das classes compartilhada
+    # (não copiada). Alternativa compacta à lista de dicts de YoloDetector.detect para cenas densas
+    # e muitos frames: fatias são views sem cópia, concat junta frames num único conjunto de arrays
+    # e to_bytes/save serializam os arrays crus (from_bytes/load(mmap=True) leem sem copiar).
+    __slots__ = ("boxes", "scores", "class_ids", "frame_ids", "classes")
+
+    def __init__(
+        self,
+        boxes,
+        scores,
+        class_ids,
+        classes: Sequence[str] = (),
+        frame_ids=None,
+    ):
+        self.boxes = np.asarray(boxes, dtype=np.int32).reshape(-1, 4)
+        self.scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+        self.class_ids = np.asarray(class_ids, dtype=np.int32).reshape(-1)
+        n = len(self.boxes)
+        if frame_ids is None:
+            frame_ids = np.zeros(n, dtype=np.int64)
+        self.frame_ids = np.asarray(frame_ids, dtype=np.int64).reshape(-1)
+        if not len(self.scores) == len(self.class_ids) == len(self.frame_ids) == n:
+            raise ValueError("boxes, scores, class_ids e frame_ids devem ter o mesmo comprimento")
+        self.classes = classes
+
+    @classmethod
+    def empty(cls, classes: Sequence[str] = ()) -> "Detections":
+        return cls(np.zeros((0, 4), np.int32), np.zeros(0, np.float32), np.zeros(0, np.int32), classes)
+
+    @classmethod
+    def from_dicts(cls, detections: List[Dict], classes: Sequence[str] = (), frame_id: int = 0) -> "Detections":
+        # Converte a saída em dicts de YoloDetector.detect
+        if not detections:
+            return cls.empty(classes)
+        return cls(
+            [d["box"] for d in detections],
+            [d["confidence"] for d in detections],
+            [d["class_id"] for d in detections],
+            classes,
+            np.full(len(detections), frame_id, dtype=np.int64),
+        )
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def __repr__(self) -> str:
+        frames = len(np.unique(self.frame_ids)) if len(self) else 0
+        return f"Detections(n={len(self)}, frames={frames}, classes={len(self.classes)})"
+
+    def __getitem__(self, index: Union[int, slice, np.ndarray]) -> "Detections":
+        # Fatias devolvem views (sem cópia); máscaras booleanas e índices inteiros copiam, como no NumPy
+        if isinstance(index, (int, np.integer)):
+            index = slice(index, index + 1 if index != -1 else None)
+        return Detections(self.boxes[index], self.scores[index], self.class_ids[index], self.classes,
+                          self.frame_ids[index])
+
+    @property
+    def class_names(self) -> List[str]:
+        n = len(self.classes)
+        return [self.classes[c] if 0 <= c < n else str(c) for c in self.class_ids.tolist()]
+
+    def to_dicts(self) -> List[Dict]:
+        # Mesmo formato de YoloDetector.detect (lista de dicts com box em tupla)
+        return [
+            {"class_id": c, "class_name": name, "confidence": s, "box": tuple(b)}
+            for c, name, s, b in zip(self.class_ids.tolist(), self.class_names, self.scores.tolist(),
+                                     self.boxes.tolist())
+        ]
+
+    def for_frame(self, frame_id: int) -> "Detections":
+        # Detecções de um frame. Após concat os frame_ids ficam ordenados e o resultado é uma view.
+        if len(self) > 1 and np.any(self.frame_ids[1:] < self.frame_ids[:-1]):
+            return self[self.frame_ids == frame_id]
+        lo, hi = np.searchsorted(self.frame_ids, [frame_id, frame_id + 1])
+        return self[int(lo):int(hi)]
+
+    def iter_frames(self) -> Iterator[Tuple[int, "Detections"]]:
+        # (frame_id, views) para cada frame com ao menos uma detecção, em ordem de frame_id
+        if len(self) == 0:
+            return
+        order = self if np.all(self.frame_ids[1:] >= self.frame_ids[:-1]) else \
+            self[np.argsort(self.frame_ids, kind="stable")]
+        starts = np.flatnonzero(np.diff(order.frame_ids)) + 1
+        bounds = [0, *starts.tolist(), len(order)]
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            yield int(order.frame_ids[lo]), order[lo:hi]
+
+    @staticmethod
+    def concat(parts: Sequence["Detections"], frame_ids: Optional[Sequence[int]] = None) -> "Detections":
+        # Junta vários resultados (ex.: um por frame) em um só. Com frame_ids (um por parte), o
+        # frame de cada detecção passa a ser o da sua parte; sem ele, mantém os frame_ids originais.
+        if not parts:
+            return Detections.empty()
+        classes = parts[0].classes
+        if frame_ids is None:
+            frames = np.concatenate([p.frame_ids for p in parts])
+        else:
+            if len(frame_ids) != len(parts):
+                raise ValueError("frame_ids deve ter um valor por parte")
+            frames = np.repeat(np.asarray(frame_ids, dtype=np.int64), [len(p) for p in parts])
+        return Detections(
+            np.concatenate([p.boxes for p in parts]),
+            np.concatenate([p.scores for p in parts]),
+            np.concatenate([p.class_ids for p in parts]),
+            classes,
+            frames,
+        )
+
+    def to_bytes(self) -> bytes:
+        # Layout: cabeçalho + nomes das classes (utf-8, '\n') + frame_ids + boxes + scores + class_ids,
+        # cada bloco alinhado a 8 bytes para que from_bytes monte views alinhadas
+        names = "\n".join(self.classes).encode("utf-8")
+        parts = [_HEADER.pack(_MAGIC, _VERSION, len(self), len(names)), names,
+                 b"\0" * (_align8(len(names)) - len(names))]
+        for arr in (self.frame_ids, self.boxes, self.scores, self.class_ids):
+            raw = np.ascontiguousarray(arr).tobytes()
+            parts += [raw, b"\0" * (_align8(len(raw)) - len(raw))]
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data) -> "Detections":
+        # Aceita bytes, bytearray, memoryview ou np.memmap; os arrays são views sobre o buffer
+        buf = np.frombuffer(data, dtype=np.uint8) if not isinstance(data, np.ndarray) else data
+        magic, version, n, names_len = _HEADER.unpack(bytes(buf[:_HEADER.size]))
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError("Dados não estão no formato de Detections")
+        offset = _HEADER.size
+        names = bytes(buf[offset:offset + names_len]).decode("utf-8")
+        offset += _align8(names_len)
+        arrays = []
+        for dtype, shape in ((np.int64, (n,)), (np.int32, (n, 4)), (np.float32, (n,)), (np.int32, (n,))):
+            size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            arrays.append(buf[offset:offset + size].view(dtype).reshape(shape))
+            offset += _align8(size)
+        frame_ids, boxes, scores, class_ids = arrays
+        return cls(boxes, scores, class_ids, names.split("\n") if names else [], frame_ids)
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = False) -> "Detections":
+        # mmap=True mapeia o arquivo: arrays somente leitura, carregados sob demanda pelo SO
+        if mmap:
+            return cls.from_bytes(np.memmap(path, dtype=np.uint8, mode="r"))
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+
+def _synthetic_frames(num_frames: int, per_frame: int, classes: Sequence[str], seed: int = 0) -> List[Detections]:
+    rng = np.random.default_rng(seed)
+    return [
+        Detections(rng.integers(0, 1000, (per_frame, 4)), rng.random(per_frame),
+                   rng.integers(0, len(classes), per_frame), classes)
+        for _ in range(num_frames)
+    ]
+
+
+def _traced(fn) -> Tuple[object, int, float]:
+    # (resultado, bytes ainda alocados pelo resultado, tempo em ms)
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = fn()
+    elapsed = (time.perf_counter() - t0) * 1000.0
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, elapsed
+
+
+def bench_memory(num_frames: int = 10000, per_frame: int = 50) -> Dict[str, float]:
+    # Memória e tempo para manter num_frames x per_frame detecções: lista de dicts vs Detections
+    classes = ["car", "motorbike", "threewheel", "van", "bus", "truck"]
+    frames = _synthetic_frames(num_frames, per_frame, classes)
+    dicts, dict_bytes, dict_ms = _traced(lambda: [f.to_dicts() for f in frames])
+    merged, col_bytes, concat_ms = _traced(lambda: Detections.concat(frames, frame_ids=range(num_frames)))
+    data, _, ser_ms = _traced(merged.to_bytes)
+    back, _, de_ms = _traced(lambda: Detections.from_bytes(data))
+    if not (np.array_equal(back.boxes, merged.boxes) and back.to_dicts()[:per_frame] == dicts[0]):
+        raise RuntimeError("Serialização de Detections não reproduziu os dados")
+    return {
+        "detections": num_frames * per_frame,
+        "dicts_mb": dict_bytes / 1e6,
+        "columnar_mb": col_bytes / 1e6,
+        "ratio": dict_bytes / col_bytes if col_bytes else float("inf"),
+        "to_dicts_ms": dict_ms,
+        "concat_ms": concat_ms,
+        "serialized_mb": len(data) / 1e6,
+        "to_bytes_ms": ser_ms,
+        "from_bytes_ms": de_ms,
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Memória e serialização: detecções em dicts vs Detections colunar")
+    parser.add_argument("--frames", type=int, default=10000, help="Número de frames simulados")
+    parser.add_argument("--per-frame", type=int, default=50, help="Detecções por frame")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    r = bench_memory(args.frames, args.per_frame)
+    print(f"{r['detections']} detecções: dicts {r['dicts_mb']:.1f} MB ({r['to_dicts_ms']:.0f} ms para montar) | "
+          f"Detections {r['columnar_mb']:.1f} MB (concat {r['concat_ms']:.1f} ms) | {r['ratio']:.1f}x menos memória")
+    print(f"Serializado: {r['serialized_mb']:.1f} MB | to_bytes {r['to_bytes_ms']:.1f} ms | "
+          f"from_bytes {r['from_bytes_ms']:.3f} ms (views sem cópia)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
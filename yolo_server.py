@@ -0,0 +1,515 @@
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from email.parser import BytesParser
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import cv2
+import numpy as np
+
+from yolo_backends import BACKENDS
+from yolo_inference import YoloDetector, build_detector_from_env
+from yolo_metrics import DetectorMetrics
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class Overloaded(Exception):
+    # Fila de inferência cheia: o cliente deve tentar de novo mais tarde (HTTP 503)
+    pass
+
+
+class MicroBatcher:
+    # Junta requisições concorrentes em micro-lotes para um único detect_batch: o lote fecha ao
+    # atingir max_batch_size ou quando o primeiro item esperou max_wait_ms. A inferência roda
+    # em uma thread dedicada (o detector não aceita forwards concorrentes) sem travar o event loop.
+    # Backpressure: com max_queue itens pendentes, novas requisições falham na hora (Overloaded).
+    def __init__(
+        self,
+        detector: YoloDetector,
+        input_size: Tuple[int, int] = (416, 416),
+        max_batch_size: int = 8,
+        max_wait_ms: float = 5.0,
+        max_queue: int = 64,
+        metrics: Optional[DetectorMetrics] = None,
+    ):
+        self.detector = detector
+        self.input_size = input_size
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_s = max(0.0, max_wait_ms) / 1000.0
+        self.max_queue = max(1, max_queue)
+        self.metrics = metrics
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inferencia")
+        self.batches = 0
+        self.items = 0
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Requisições ainda na fila recebem erro em vez de ficarem penduradas
+        while self._queue is not None and not self._queue.empty():
+            _, fut, _ = self._queue.get_nowait()
+            if not fut.done():
+                fut.set_exception(Overloaded("Servidor encerrando"))
+        self._executor.shutdown(wait=True)
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, frame: np.ndarray) -> Tuple[List[Dict], int]:
+        # Enfileira um frame e aguarda (detecções, tamanho do lote em que foi processado)
+        fut = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((frame, fut, time.perf_counter()))
+        except asyncio.QueueFull:
+            if self.metrics is not None:
+                self.metrics.count("rejected", 1)
+            raise Overloaded(f"Fila de inferência cheia ({self.max_queue})")
+        return await fut
+
+    async def _collect(self) -> List[Tuple[np.ndarray, asyncio.Future, float]]:
+        # Bloqueia até o primeiro item; depois junta o que chegar até o prazo ou o lote encher
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # Clientes que desistiram (timeout/desconexão) não entram no forward
+            batch = [item for item in batch if not item[1].done()]
+            if not batch:
+                continue
+            t0 = time.perf_counter()
+            frames = [item[0] for item in batch]
+            try:
+                results = await loop.run_in_executor(self._executor, self._infer, frames)
+            except Exception as e:
+                for _, fut, _ in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            if self.metrics is not None:
+                self.metrics.count("batch_size", len(batch))
+                for _, _, t_enqueued in batch:
+                    self.metrics.observe("queue_wait", (t0 - t_enqueued) * 1000.0)
+            for (_, fut, _), detections in zip(batch, results):
+                if not fut.done():
+                    fut.set_result((detections, len(batch)))
+
+    def _infer(self, frames: List[np.ndarray]) -> List[List[Dict]]:
+        if len(frames) == 1:
+            return [self.detector.detect(frames[0], input_size=self.input_size)]
+        return self.detector.detect_batch(frames, input_size=self.input_size)
+
+
+def decode_image(body: bytes, content_type: str) -> np.ndarray:
+    # Aceita o corpo como imagem crua (image/jpeg, image/png, application/octet-stream)
+    # ou multipart/form-data com um arquivo de imagem
+    data = body
+    if content_type.startswith("multipart/form-data"):
+        message = BytesParser().parsebytes(b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + body)
+        data = b""
+        for part in message.walk():
+            if part.get_content_maintype() != "multipart" and part.get_filename() is not None:
+                data = part.get_payload(decode=True) or b""
+                break
+    frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR) if data else None
+    if frame is None:
+        raise ValueError("Corpo da requisição não é uma imagem JPEG/PNG válida")
+    return frame
+
+
+def parse_content_length(value: str) -> int:
+    # Content-Length precisa ser um inteiro decimal não negativo (sem sinal, espaços ou vírgulas)
+    value = value.strip()
+    if not value:
+        return 0
+    if not value.isascii() or not value.isdigit():
+        raise ValueError(f"Content-Length inválido: {value!r}")
+    return int(value)
+
+
+def default_max_batch(use_gpu: bool = False) -> int:
+    # Em CPU o forward de um lote custa o mesmo que as imagens avulsas (a CPU já fica saturada com
+    # uma imagem) e a espera para montar o lote só soma latência (no --bench: opencv 61 req/s com
+    # lote 1 vs 52 com lote 8; onnxruntime 81 vs 82). O micro-batching compensa em GPU, onde um lote
+    # ocupa melhor o dispositivo.
+    return 8 if use_gpu else 1
+
+
+class DetectionServer:
+    # Servidor HTTP/1.1 mínimo sobre asyncio (sem dependências além da biblioteca padrão):
+    #   POST /detect   corpo = imagem (ou multipart) -> JSON com as detecções
+    #   GET  /health   estado, fila e contadores do micro-batching
+    #   GET  /metrics  métricas Prometheus (latência por requisição, espera na fila, estágios do detector)
+    def __init__(
+        self,
+        detector: YoloDetector,
+        host: str = "127.0.0.1",
+        port: int = 8080,
+        input_size: Tuple[int, int] = (416, 416),
+        max_batch_size: int = 8,
+        max_wait_ms: float = 5.0,
+        max_queue: int = 64,
+        max_body_bytes: int = 20 * 1024 * 1024,
+        request_timeout_s: float = 30.0,
+    ):
+        self.host = host
+        self.port = port
+        self.max_body_bytes = max_body_bytes
+        self.request_timeout_s = request_timeout_s
+        self.metrics = DetectorMetrics()
+        detector.instrumentation = self.metrics
+        self.batcher = MicroBatcher(detector, input_size, max_batch_size, max_wait_ms, max_queue, self.metrics)
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._started = 0.0
+
+    async def start(self) -> None:
+        self.batcher.start()
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        # Com port=0 o sistema escolhe a porta (útil em testes)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._started = time.monotonic()
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        await self.batcher.stop()
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        # Uma conexão pode carregar várias requisições (keep-alive)
+        try:
+            while True:
+                try:
+                    request_line = await reader.readline()
+                except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+                    break
+                if not request_line:
+                    break
+                parts = request_line.decode("latin-1").split()
+                if len(parts) != 3:
+                    await self._respond(writer, 400, {"error": "Linha de requisição inválida"}, keep_alive=False)
+                    break
+                method, target, version = parts
+                headers: Dict[str, str] = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                keep_alive = (headers.get("connection", "").lower() != "close"
+                              and (version == "HTTP/1.1" or headers.get("connection", "").lower() == "keep-alive"))
+                try:
+                    length = parse_content_length(headers.get("content-length", ""))
+                except ValueError as e:
+                    await self._respond(writer, 400, {"error": str(e)}, keep_alive=False)
+                    break
+                if length > self.max_body_bytes:
+                    await self._respond(writer, 413, {"error": f"Corpo maior que {self.max_body_bytes} bytes"},
+                                        keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                status, payload, extra = await self._dispatch(method, target, headers, body)
+                await self._respond(writer, status, payload, keep_alive, extra)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _dispatch(self, method: str, target: str, headers: Dict[str, str], body: bytes):
+        path = urlsplit(target).path
+        if path == "/health":
+            if method != "GET":
+                return 405, {"error": "Use GET"}, None
+            return 200, self.health(), None
+        if path == "/metrics":
+            if method != "GET":
+                return 405, {"error": "Use GET"}, None
+            return 200, self.metrics.to_prometheus(), {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+        if path != "/detect":
+            return 404, {"error": f"Rota não encontrada: {path}"}, None
+        if method != "POST":
+            return 405, {"error": "Use POST com a imagem no corpo"}, None
+
+        t0 = time.perf_counter()
+        try:
+            # Decodificação fora do event loop (o cv2 libera o GIL): várias requisições em paralelo
+            frame = await asyncio.to_thread(decode_image, body, headers.get("content-type", ""))
+        except ValueError as e:
+            return 400, {"error": str(e)}, None
+        try:
+            detections, batch_size = await asyncio.wait_for(self.batcher.submit(frame), self.request_timeout_s)
+        except Overloaded as e:
+            return 503, {"error": str(e)}, {"Retry-After": "1"}
+        except asyncio.TimeoutError:
+            return 503, {"error": "Tempo limite da inferência excedido"}, {"Retry-After": "1"}
+        except Exception as e:
+            return 500, {"error": f"{type(e).__name__}: {e}"}, None
+        latency_ms = (time.perf_counter() - t0) * 1000.0
+        self.metrics.observe("request", latency_ms)
+        h, w = frame.shape[:2]
+        return 200, {
+            "width": w,
+            "height": h,
+            "detections": [{**d, "box": list(d["box"])} for d in detections],
+            "batch_size": batch_size,
+            "latency_ms": latency_ms,
+        }, None
+
+    def health(self) -> Dict:
+        return {
+            "status": "ok",
+            "uptime_s": time.monotonic() - self._started,
+            "queue": self.batcher.pending,
+            "max_queue": self.batcher.max_queue,
+            "max_batch_size": self.batcher.max_batch_size,
+            "batches": self.batcher.batches,
+            "requests": self.batcher.items,
+            "mean_batch_size": self.batcher.items / self.batcher.batches if self.batcher.batches else 0.0,
+        }
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: int, payload, keep_alive: bool,
+                       extra_headers: Optional[Dict[str, str]] = None) -> None:
+        if isinstance(payload, str):
+            body = payload.encode("utf-8")
+            content_type = "text/plain; charset=utf-8"
+        else:
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            content_type = "application/json"
+        headers = {"Content-Type": content_type, "Content-Length": str(len(body)),
+                   "Connection": "keep-alive" if keep_alive else "close"}
+        headers.update(extra_headers or {})
+        head = f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+        head += "".join(f"{k}: {v}\r\n" for k, v in headers.items()) + "\r\n"
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+
+class AsyncClient:
+    # Cliente HTTP mínimo (keep-alive) para testes locais e benchmarks contra o DetectionServer
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def request(self, method: str, path: str, body: bytes = b"",
+                      content_type: str = "application/octet-stream") -> Tuple[int, Dict[str, str], bytes]:
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        head = (f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n")
+        self._writer.write(head.encode("latin-1") + body)
+        await self._writer.drain()
+        status_line = await self._reader.readline()
+        status = int(status_line.split()[1])
+        headers: Dict[str, str] = {}
+        while True:
+            line = await self._reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+        data = await self._reader.readexactly(int(headers.get("content-length", "0")))
+        if headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, headers, data
+
+    async def detect(self, image_bytes: bytes, content_type: str = "image/jpeg") -> Tuple[int, Dict]:
+        status, _, data = await self.request("POST", "/detect", image_bytes, content_type)
+        return status, json.loads(data)
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except ConnectionError:
+                pass
+            self._writer = self._reader = None
+
+
+async def run_load(host: str, port: int, image_bytes: bytes, requests: int, concurrency: int) -> Dict:
+    # Dispara `requests` requisições com `concurrency` clientes keep-alive; retorna latências e status
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    batch_sizes: List[int] = []
+    counter = iter(range(requests))
+
+    async def worker() -> None:
+        client = AsyncClient(host, port)
+        try:
+            for _ in counter:
+                t0 = time.perf_counter()
+                status, payload = await client.detect(image_bytes)
+                latencies.append((time.perf_counter() - t0) * 1000.0)
+                statuses[status] = statuses.get(status, 0) + 1
+                if status == 200:
+                    batch_sizes.append(payload["batch_size"])
+        finally:
+            await client.close()
+
+    t_start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    elapsed = time.perf_counter() - t_start
+    arr = np.asarray(latencies) if latencies else np.zeros(1)
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "elapsed_s": elapsed,
+        "throughput_per_s": requests / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": float(np.percentile(arr, 50)),
+        "p95_ms": float(np.percentile(arr, 95)),
+        "p99_ms": float(np.percentile(arr, 99)),
+        "statuses": statuses,
+        "mean_batch_size": float(np.mean(batch_sizes)) if batch_sizes else 0.0,
+    }
+
+
+async def bench(args: argparse.Namespace) -> int:
+    # Sobe o servidor em processo com o modelo sintético (porta livre) e mede latência/throughput
+    # com o cliente assíncrono, com e sem micro-batching (as rotas são cobertas em tests/test_server.py)
+    from yolo_benchmark import synthetic_frame, write_tiny_darknet_model
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.cfg and args.weights and args.names:
+            cfg_path, weights_path, names_path = args.cfg, args.weights, args.names
+        else:
+            cfg_path, weights_path, names_path = write_tiny_darknet_model(tmp)
+        ok, jpeg = cv2.imencode(".jpg", synthetic_frame(640, 480))
+        image_bytes = jpeg.tobytes()
+        input_size = _parse_size(args.input_size)
+        # Compara sem e com micro-batching (lote 8 se --max-batch não for informado)
+        for max_batch in sorted({1, args.max_batch or 8}):
+            detector = YoloDetector(cfg_path, weights_path, names_path, conf_threshold=args.conf or 0.25,
+                                    backend=args.backend or "opencv", input_size=input_size)
+            server = DetectionServer(detector, "127.0.0.1", 0, input_size=input_size, max_batch_size=max_batch,
+                                     max_wait_ms=args.max_wait_ms, max_queue=args.max_queue)
+            await server.start()
+            try:
+                r = await run_load("127.0.0.1", server.port, image_bytes, args.requests, args.concurrency)
+            finally:
+                await server.stop()
+            print(f"max_batch={max_batch}: {r['throughput_per_s']:.1f} req/s | p50 {r['p50_ms']:.1f} ms | "
+                  f"p95 {r['p95_ms']:.1f} ms | p99 {r['p99_ms']:.1f} ms | lote médio {r['mean_batch_size']:.1f} | "
+                  f"status {r['statuses']}")
+    return 0
+
+
+def _parse_size(value: str) -> Tuple[int, int]:
+    w_str, h_str = value.lower().split("x")
+    return (int(w_str), int(h_str))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Servidor HTTP assíncrono de detecção YOLO com micro-batching")
+    parser.add_argument("--host", type=str, default="0.0.0.0", help="Endereço de escuta")
+    parser.add_argument("--port", type=int, default=8080, help="Porta HTTP")
+    parser.add_argument("--input-size", type=str, default="416x416", help="Tamanho de entrada da rede, ex: 416x416")
+    parser.add_argument("--max-batch", type=int, default=None,
+                        help="Tamanho máximo do micro-lote (default: 1 em CPU, onde lotes não aumentam o throughput; "
+                             "8 com --gpu)")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="Espera máxima para completar um lote (ms)")
+    parser.add_argument("--max-queue", type=int, default=64, help="Requisições pendentes antes de responder 503")
+    parser.add_argument("--max-body-mb", type=float, default=20.0, help="Tamanho máximo do corpo da requisição (MB)")
+    parser.add_argument("--conf", type=float, default=None, help="Confiança mínima")
+    parser.add_argument("--nms", type=float, default=None, help="NMS threshold")
+    parser.add_argument("--gpu", action="store_true", help="Usar CUDA (se disponível)")
+    parser.add_argument("--backend", type=str, choices=BACKENDS, default=None,
+                        help="Backend de inferência (default: YOLO_BACKEND do .env ou opencv)")
+    parser.add_argument("--cfg", type=str, default=None, help="Caminho para .cfg (sobrepõe .env)")
+    parser.add_argument("--weights", type=str, default=None, help="Caminho para .weights (sobrepõe .env)")
+    parser.add_argument("--names", type=str, default=None, help="Caminho para .names (sobrepõe .env)")
+    parser.add_argument("--bench", action="store_true",
+                        help="Sobe o servidor em processo com o modelo sintético e mede com o cliente assíncrono")
+    parser.add_argument("--requests", type=int, default=200, help="Requisições no --bench")
+    parser.add_argument("--concurrency", type=int, default=16, help="Clientes simultâneos no --bench")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    if args.bench:
+        return asyncio.run(bench(args))
+    input_size = _parse_size(args.input_size)
+    try:
+        if args.cfg and args.weights and args.names:
+            detector = YoloDetector(args.cfg, args.weights, args.names,
+                                    conf_threshold=args.conf if args.conf is not None else 0.5,
+                                    nms_threshold=args.nms if args.nms is not None else 0.4,
+                                    use_gpu=args.gpu, backend=args.backend or "opencv", input_size=input_size)
+        else:
+            detector = build_detector_from_env(conf_threshold=args.conf, nms_threshold=args.nms, use_gpu=args.gpu,
+                                               backend=args.backend, input_size=input_size)
+        max_batch = args.max_batch or default_max_batch(args.gpu)
+        # Aquece os formatos de lote mais comuns (1 e o lote máximo) antes de aceitar conexões
+        for batch_size in sorted({1, max(1, max_batch)}):
+            detector.warmup(input_size, batch_size=batch_size)
+    except Exception as e:
+        print(f"Erro ao inicializar o detector: {e}")
+        return 2
+    server = DetectionServer(detector, args.host, args.port, input_size=input_size, max_batch_size=max_batch,
+                             max_wait_ms=args.max_wait_ms, max_queue=args.max_queue,
+                             max_body_bytes=int(args.max_body_mb * 1024 * 1024))
+    print(f"Servindo em http://{args.host}:{args.port} (POST /detect, GET /health, GET /metrics)")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+import time
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from yolo_tracker import iou_matrix
+
+# Região de um tile no frame: (x, y, largura, altura)
+Tile = Tuple[int, int, int, int]
+MERGE_METHODS = ["nms", "wbf"]
+
+
+def _axis_starts(length: int, tile: int, overlap: float) -> List[int]:
+    # Posições iniciais ao longo de um eixo; o último tile é alinhado à borda (sem sobrar faixa)
+    if length <= tile:
+        return [0]
+    step = max(1, int(tile * (1.0 - overlap)))
+    starts = list(range(0, length - tile, step))
+    starts.append(length - tile)
+    return starts
+
+
+def tile_grid(
+    frame_w: int,
+    frame_h: int,
+    tile_size: int = 416,
+    overlap: float = 0.2,
+    roi_mask: Optional[np.ndarray] = None,
+    min_roi_fraction: float = 0.01,
+) -> List[Tile]:
+    # Divide o frame em tiles quadrados com sobreposição. Com máscara de ROI (uint8, mesmo
+    # tamanho do frame, >0 = região de interesse) descarta tiles com pouca área de interesse.
+    tiles = [
+        (x, y, min(tile_size, frame_w), min(tile_size, frame_h))
+        for y in _axis_starts(frame_h, tile_size, overlap)
+        for x in _axis_starts(frame_w, tile_size, overlap)
+    ]
+    if roi_mask is None:
+        return tiles
+    kept = []
+    for x, y, w, h in tiles:
+        if np.count_nonzero(roi_mask[y:y + h, x:x + w]) >= min_roi_fraction * w * h:
+            kept.append((x, y, w, h))
+    return kept
+
+
+def load_roi_mask(path: str, frame_w: int, frame_h: int) -> np.ndarray:
+    # Carrega uma imagem de máscara (branco = ROI) e ajusta para o tamanho do frame
+    mask = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if mask is None:
+        raise FileNotFoundError(f"Máscara de ROI não encontrada: {path}")
+    if mask.shape[:2] != (frame_h, frame_w):
+        mask = cv2.resize(mask, (frame_w, frame_h), interpolation=cv2.INTER_NEAREST)
+    return mask
+
+
+def _overlap_matrix(boxes: np.ndarray, metric: str) -> np.ndarray:
+    # "iou" ou "ios" (interseção sobre a menor área): IoS casa um box cortado na borda do
+    # tile com o box completo do tile vizinho, que no IoU ficariam abaixo do limiar
+    if metric == "iou":
+        return iou_matrix(boxes, boxes)
+    b = boxes.astype(np.float32)
+    x1, y1 = b[:, 0], b[:, 1]
+    x2, y2 = x1 + b[:, 2], y1 + b[:, 3]
+    iw = np.clip(np.minimum(x2[:, None], x2[None, :]) - np.maximum(x1[:, None], x1[None, :]), 0, None)
+    ih = np.clip(np.minimum(y2[:, None], y2[None, :]) - np.maximum(y1[:, None], y1[None, :]), 0, None)
+    area = b[:, 2] * b[:, 3]
+    smaller = np.minimum(area[:, None], area[None, :])
+    return np.where(smaller > 0, iw * ih / np.maximum(smaller, 1e-9), 0.0).astype(np.float32)
+
+
+def merge_detections(
+    detections: List[Dict],
+    method: str = "nms",
+    threshold: float = 0.5,
+    metric: str = "ios",
+) -> List[Dict]:
+    # Junta detecções vindas de tiles sobrepostos, por classe.
+    # - nms: mantém a de maior confiança em cada grupo
+    # - wbf: funde o grupo em um box médio ponderado pela confiança (weighted box fusion)
+    if method not in MERGE_METHODS:
+        raise ValueError(f"Método de fusão desconhecido: {method} (opções: {', '.join(MERGE_METHODS)})")
+    if len(detections) < 2:
+        return [{k: v for k, v in d.items() if k != "_truncated"} for d in detections]
+    merged: List[Dict] = []
+    class_ids = np.array([d["class_id"] for d in detections])
+    for cls in np.unique(class_ids):
+        idx = np.flatnonzero(class_ids == cls)
+        # Boxes cortados na borda interna de um tile (marcados com "_truncated") só representam o
+        # grupo se não houver um box inteiro de outro tile
+        idx = idx[sorted(range(len(idx)), key=lambda j: (detections[idx[j]].get("_truncated", False),
+                                                         -detections[idx[j]]["confidence"]))]
+        boxes = np.array([detections[i]["box"] for i in idx], dtype=np.float32)
+        conf = np.array([detections[i]["confidence"] for i in idx], dtype=np.float32)
+        truncated = np.array([detections[i].get("_truncated", False) for i in idx], dtype=bool)
+        overlaps = _overlap_matrix(boxes, metric)
+        used = np.zeros(len(idx), dtype=bool)
+        for k in range(len(idx)):
+            if used[k]:
+                continue
+            # Boxes anteriores já foram agrupados: o grupo é k + os ainda livres que se sobrepõem a ele
+            group = np.union1d([k], np.flatnonzero(~used & (overlaps[k] >= threshold)))
+            used[group] = True
+            det = dict(detections[idx[k]])
+            det.pop("_truncated", None)
+            if method == "wbf" and not truncated[k]:
+                group = group[~truncated[group]]
+            if method == "wbf" and len(group) > 1:
+                w = conf[group][:, None]
+                # Média ponderada dos cantos (x1, y1, x2, y2)
+                corners = np.concatenate([boxes[group, :2], boxes[group, :2] + boxes[group, 2:]], axis=1)
+                x1, y1, x2, y2 = (corners * w).sum(axis=0) / w.sum()
+                det["box"] = (int(x1), int(y1), int(x2 - x1), int(y2 - y1))
+                det["confidence"] = float(conf[group].mean())
+            merged.append(det)
+    merged.sort(key=lambda d: -d["confidence"])
+    return merged
+
+
+class TiledDetector:
+    # Inferência fatiada para frames de alta resolução: recorta tiles sobrepostos (em resolução
+    # nativa), roda todos em um único forward via detect_batch, mapeia os boxes de volta para o
+    # frame e funde as duplicatas entre tiles. Opcionalmente inclui o frame inteiro reduzido no
+    # mesmo lote (objetos grandes que não cabem em um tile) e restringe tudo a uma máscara de ROI.
+    def __init__(
+        self,
+        detector,
+        tile_size: int = 416,
+        overlap: float = 0.2,
+        merge: str = "nms",
+        merge_threshold: float = 0.5,
+        merge_metric: str = "ios",
+        include_full_frame: bool = True,
+        roi_mask: Optional[np.ndarray] = None,
+        min_roi_fraction: float = 0.01,
+    ):
+        if merge not in MERGE_METHODS:
+            raise ValueError(f"Método de fusão desconhecido: {merge} (opções: {', '.join(MERGE_METHODS)})")
+        if not 0.0 <= overlap < 1.0:
+            raise ValueError("overlap deve estar em [0, 1)")
+        self.detector = detector
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.merge = merge
+        self.merge_threshold = merge_threshold
+        self.merge_metric = merge_metric
+        self.include_full_frame = include_full_frame
+        self.roi_mask = roi_mask
+        self.min_roi_fraction = min_roi_fraction
+        self._grid_key: Optional[Tuple[int, int]] = None
+        self._tiles: List[Tile] = []
+
+    def tiles_for(self, frame_w: int, frame_h: int) -> List[Tile]:
+        # A grade só muda com a resolução do frame: calcula uma vez e reaproveita
+        if self._grid_key != (frame_w, frame_h):
+            mask = self.roi_mask
+            if mask is not None and mask.shape[:2] != (frame_h, frame_w):
+                mask = self.roi_mask = cv2.resize(mask, (frame_w, frame_h), interpolation=cv2.INTER_NEAREST)
+            self._tiles = tile_grid(frame_w, frame_h, self.tile_size, self.overlap, mask, self.min_roi_fraction)
+            self._grid_key = (frame_w, frame_h)
+        return self._tiles
+
+    def detect(self, frame_bgr: np.ndarray, input_size: Optional[Tuple[int, int]] = None) -> List[Dict]:
+        # input_size: entrada da rede para cada tile (default: tile_size, sem reescala)
+        if frame_bgr is None or frame_bgr.size == 0:
+            raise ValueError("Imagem inválida para detecção")
+        h, w = frame_bgr.shape[:2]
+        size = input_size or (self.tile_size, self.tile_size)
+        tiles = self.tiles_for(w, h)
+        crops = [frame_bgr[y:y + th, x:x + tw] for x, y, tw, th in tiles]
+        offsets = [(x, y) for x, y, _, _ in tiles]
+        if self.include_full_frame and (w > self.tile_size or h > self.tile_size):
+            crops.append(frame_bgr)
+            offsets.append((0, 0))
+        if not crops:
+            return []
+        results = self.detector.detect_batch(crops, input_size=size)
+
+        t0 = time.perf_counter()
+        detections: List[Dict] = []
+        for (ox, oy), crop, dets in zip(offsets, crops, results):
+            ch, cw = crop.shape[:2]
+            for det in dets:
+                bx, by, bw, bh = det["box"]
+                det["box"] = (bx + ox, by + oy, bw, bh)
+                # Encosta em uma borda do tile que não é borda do frame?
+                det["_truncated"] = ((bx <= 1 and ox > 0) or (by <= 1 and oy > 0)
+                                     or (bx + bw >= cw - 1 and ox + cw < w) or (by + bh >= ch - 1 and oy + ch < h))
+                detections.append(det)
+        if self.roi_mask is not None:
+            detections = [d for d in detections if self._in_roi(d["box"], w, h)]
+        merged = merge_detections(detections, self.merge, self.merge_threshold, self.merge_metric)
+        inst = getattr(self.detector, "instrumentation", None)
+        if inst is not None:
+            inst.observe("tile_merge", (time.perf_counter() - t0) * 1000.0)
+            inst.count("tiles", len(crops))
+        return merged
+
+    def _in_roi(self, box, frame_w: int, frame_h: int) -> bool:
+        # Mantém o box se o centro estiver dentro da máscara
+        x, y, bw, bh = box
+        cx = min(max(x + bw // 2, 0), frame_w - 1)
+        cy = min(max(y + bh // 2, 0), frame_h - 1)
+        return bool(self.roi_mask[cy, cx])
@@ -0,0 +1,208 @@
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def iou_matrix(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    # IoU vetorizado entre boxes (x, y, w, h): retorna matriz (len(a), len(b))
+    if len(boxes_a) == 0 or len(boxes_b) == 0:
+        return np.zeros((len(boxes_a), len(boxes_b)), dtype=np.float32)
+    a = np.asarray(boxes_a, dtype=np.float32)
+    b = np.asarray(boxes_b, dtype=np.float32)
+    ax1, ay1, ax2, ay2 = a[:, 0:1], a[:, 1:2], a[:, 0:1] + a[:, 2:3], a[:, 1:2] + a[:, 3:4]
+    bx1, by1, bx2, by2 = b[:, 0], b[:, 1], b[:, 0] + b[:, 2], b[:, 1] + b[:, 3]
+    iw = np.clip(np.minimum(ax2, bx2) - np.maximum(ax1, bx1), 0, None)
+    ih = np.clip(np.minimum(ay2, by2) - np.maximum(ay1, by1), 0, None)
+    inter = iw * ih
+    union = a[:, 2:3] * a[:, 3:4] + b[:, 2] * b[:, 3] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0).astype(np.float32)
+
+
+def _box_to_z(box) -> np.ndarray:
+    # (x, y, w, h) -> [cx, cy, área, razão de aspecto]
+    x, y, w, h = (float(v) for v in box)
+    w, h = max(w, 1.0), max(h, 1.0)
+    return np.array([x + w / 2.0, y + h / 2.0, w * h, w / h], dtype=np.float64)
+
+
+def _x_to_box(x: np.ndarray) -> Tuple[int, int, int, int]:
+    # Estado do filtro -> (x, y, w, h) inteiros
+    area = max(float(x[2]), 1.0)
+    ratio = max(float(x[3]), 1e-3)
+    w = np.sqrt(area * ratio)
+    h = area / w
+    return (int(x[0] - w / 2.0), int(x[1] - h / 2.0), int(w), int(h))
+
+
+class KalmanBoxTracker:
+    # Filtro de Kalman de velocidade constante no estilo SORT.
+    # Estado: [cx, cy, área, razão, vx, vy, v_área]; a razão de aspecto é considerada constante.
+    _F = np.eye(7)
+    _F[0, 4] = _F[1, 5] = _F[2, 6] = 1.0
+    _H = np.eye(4, 7)
+
+    def __init__(self, detection: Dict, track_id: int):
+        self.id = track_id
+        self.class_id = detection["class_id"]
+        self.class_name = detection["class_name"]
+        self.confidence = float(detection["confidence"])
+        self.x = np.zeros(7)
+        self.x[:4] = _box_to_z(detection["box"])
+        self.P = np.diag([10.0, 10.0, 10.0, 10.0, 1e4, 1e4, 1e4])
+        self.Q = np.diag([1.0, 1.0, 1.0, 1e-2, 1e-2, 1e-2, 1e-4])
+        self.R = np.diag([1.0, 1.0, 10.0, 10.0])
+        self.hits = 1
+        self.time_since_update = 0
+        self.age = 0
+
+    def predict(self) -> Tuple[int, int, int, int]:
+        # Propaga o estado um frame à frente (área nunca negativa)
+        if self.x[2] + self.x[6] <= 0:
+            self.x[6] = 0.0
+        self.x = self._F @ self.x
+        self.P = self._F @ self.P @ self._F.T + self.Q
+        self.age += 1
+        self.time_since_update += 1
+        return _x_to_box(self.x)
+
+    def update(self, detection: Dict) -> None:
+        z = _box_to_z(detection["box"])
+        y = z - self._H @ self.x
+        S = self._H @ self.P @ self._H.T + self.R
+        K = self.P @ self._H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ y
+        self.P = (np.eye(7) - K @ self._H) @ self.P
+        self.confidence = float(detection["confidence"])
+        self.hits += 1
+        self.time_since_update = 0
+
+    @property
+    def box(self) -> Tuple[int, int, int, int]:
+        return _x_to_box(self.x)
+
+
+class MultiObjectTracker:
+    # Rastreador multi-objeto (SORT): predição por Kalman + associação gulosa por IoU, por classe.
+    def __init__(self, max_age: int = 30, min_hits: int = 3, iou_threshold: float = 0.3):
+        self.max_age = max_age
+        self.min_hits = min_hits
+        self.iou_threshold = iou_threshold
+        self.tracks: List[KalmanBoxTracker] = []
+        self._next_id = 1
+        # IDs confirmados por classe, para contagem de objetos únicos
+        self._counted: Dict[str, set] = {}
+
+    def predict(self) -> None:
+        for t in self.tracks:
+            t.predict()
+
+    def update(self, detections: List[Dict]) -> List[Dict]:
+        # Associa detecções aos tracks já preditos neste frame; cria/remove tracks e devolve as
+        # detecções deste frame anotadas com "track_id"
+        matched_tracks = set()
+        matched_dets = set()
+        if self.tracks and detections:
+            ious = iou_matrix(np.array([t.box for t in self.tracks]), np.array([d["box"] for d in detections]))
+            same_class = (np.array([t.class_id for t in self.tracks])[:, None]
+                          == np.array([d["class_id"] for d in detections])[None, :])
+            ious = np.where(same_class, ious, 0.0)
+            # Associação gulosa: maiores IoUs primeiro
+            order = np.dstack(np.unravel_index(np.argsort(-ious, axis=None), ious.shape))[0]
+            for ti, di in order:
+                if ious[ti, di] < self.iou_threshold:
+                    break
+                if ti in matched_tracks or di in matched_dets:
+                    continue
+                self.tracks[ti].update(detections[di])
+                matched_tracks.add(ti)
+                matched_dets.add(di)
+        for di, det in enumerate(detections):
+            if di not in matched_dets:
+                self.tracks.append(KalmanBoxTracker(det, self._next_id))
+                self._next_id += 1
+        self.tracks = [t for t in self.tracks if t.time_since_update <= self.max_age]
+        self._update_counts()
+        return [self._as_detection(t) for t in self.tracks if t.time_since_update == 0]
+
+    def propagated(self, confidence_decay: float = 1.0, max_staleness: Optional[int] = None) -> List[Dict]:
+        # Saída para frames sem detecção: boxes preditos dos tracks confirmados atualizados
+        # há no máximo `max_staleness` frames. A confiança decai a cada frame sem atualização.
+        limit = self.max_age if max_staleness is None else min(self.max_age, max_staleness)
+        out = []
+        for t in self.tracks:
+            if self._confirmed(t) and t.time_since_update <= limit:
+                det = self._as_detection(t)
+                det["confidence"] = t.confidence * (confidence_decay ** t.time_since_update)
+                out.append(det)
+        return out
+
+    def _confirmed(self, t: KalmanBoxTracker) -> bool:
+        return t.hits >= self.min_hits
+
+    def _update_counts(self) -> None:
+        for t in self.tracks:
+            if self._confirmed(t):
+                self._counted.setdefault(t.class_name, set()).add(t.id)
+
+    def counts(self) -> Dict[str, int]:
+        # Número de objetos únicos (tracks confirmados) vistos por classe
+        return {name: len(ids) for name, ids in sorted(self._counted.items())}
+
+    @staticmethod
+    def _as_detection(t: KalmanBoxTracker) -> Dict:
+        x, y, w, h = t.box
+        return {
+            "class_id": t.class_id,
+            "class_name": t.class_name,
+            "confidence": t.confidence,
+            "box": (max(0, x), max(0, y), max(0, w), max(0, h)),
+            "track_id": t.id,
+        }
+
+
+class TrackingDetector:
+    # Roda o detector completo a cada N frames (ou quando a confiança dos tracks cai) e
+    # propaga as boxes com o Kalman nos frames intermediários.
+    def __init__(
+        self,
+        detect_fn: Callable[[np.ndarray], List[Dict]],
+        detect_every: int = 3,
+        min_track_confidence: float = 0.3,
+        confidence_decay: float = 0.95,
+        tracker: Optional[MultiObjectTracker] = None,
+    ):
+        self.detect_fn = detect_fn
+        self.detect_every = max(1, detect_every)
+        self.min_track_confidence = min_track_confidence
+        self.confidence_decay = confidence_decay
+        self.tracker = tracker or MultiObjectTracker(max_age=max(30, 3 * self.detect_every), min_hits=2)
+        self.frame_idx = 0
+        self.detected_frames = 0
+        self._since_detect = 0
+
+    def _needs_detection(self, propagated: List[Dict]) -> bool:
+        if self._since_detect >= self.detect_every or self.frame_idx == 0:
+            return True
+        # Algum track confirmado com confiança decaída abaixo do limite força nova detecção
+        return any(d["confidence"] < self.min_track_confidence for d in propagated)
+
+    def process(self, frame: np.ndarray) -> List[Dict]:
+        self.tracker.predict()
+        # Só propaga tracks casados na última detecção (evita boxes "fantasmas" de objetos que saíram)
+        propagated = self.tracker.propagated(self.confidence_decay, max_staleness=self._since_detect)
+        if self._needs_detection(propagated):
+            detections = self.tracker.update(self.detect_fn(frame))
+            self.detected_frames += 1
+            self._since_detect = 1
+        else:
+            detections = propagated
+            self._since_detect += 1
+        self.frame_idx += 1
+        return detections
+
+    def counts(self) -> Dict[str, int]:
+        return self.tracker.counts()
+
+    def detect_ratio(self) -> float:
+        # Fração de frames que passaram pelo detector completo
+        return self.detected_frames / self.frame_idx if self.frame_idx else 0.0